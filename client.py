@@ -12,13 +12,20 @@
 
 import os
 import sys
-import json
-import pathlib
+import argparse
 
 import comp_viz
 import client_helper
 
 if __name__ == "__main__":
+  # options for directories of images, e.g. --shard 0/4 on the first of four hosts splitting a dataset
+  parser = argparse.ArgumentParser(description="Interactive object detection on images and videos.")
+  parser.add_argument("--shard", type=comp_viz.utils.Tools.parse_shard, default=None, help="only predict for shard i/N of a directory's images")
+  parser.add_argument("--include", nargs="+", default=None, help="glob patterns of the images to predict for in a directory")
+  parser.add_argument("--exclude", nargs="+", default=None, help="glob patterns of the images and subdirectories to skip in a directory")
+  parser.add_argument("--recursive", action="store_true", help="also predict for images in subdirectories of a directory")
+  args = parser.parse_args()
+
   print("===========================================")
   print("Welcome to Lucas' computer vision detector!")
   print("===========================================")
@@ -29,8 +36,12 @@ if __name__ == "__main__":
   # show all models and acquire user's choice
   model_name = client_helper.get_model_choice(available_models)
 
+  # cache of finished predictions, so repeated or interrupted runs skip images already predicted for
+  cache = comp_viz.results.PredictionCache()
+
   # instantiate the detection model
-  model = comp_viz.object_detection.Model(model_name)
+  model = comp_viz.object_detection.get_model(model_name)
+  model.set_cache(cache)
   print(f"{model_name} initialized!")
 
   print("-------------------------------------------")
@@ -49,7 +60,8 @@ if __name__ == "__main__":
     # user wants to pick a new model
     if input_char == str(0):
       model_name = client_helper.get_model_choice(available_models)
-      model = comp_viz.object_detection.Model(model_name)
+      model = comp_viz.object_detection.get_model(model_name)
+      model.set_cache(cache)
       continue
 
     # user wants to predict with chosen model and an image
@@ -59,8 +71,8 @@ if __name__ == "__main__":
         object_classes = input("Ex: bicycle, cell phone, chair ... > ")
         object_classes = comp_viz.utils.ObjectDetection.format_object_classes(object_classes.split(","))
         if client_helper.is_valid_object_classes(model, object_classes):
-          model.set_classes(object_classes)
-          print(f"Object classes: {model.get_classes()} initialized.")
+          # classes are passed per call, since the model is shared with every other user of the registry
+          print(f"Object classes: {object_classes} initialized.")
           break
 
       # prepare output directory
@@ -76,7 +88,6 @@ if __name__ == "__main__":
       # determine if boundbox images should be produced for each image inferred
       while 1:
         print("Create image with bounding box for each inference performed? (y/n).")
-        print("(WARNING: Will SIGNIFICANTLY increase the time required to complete operation if y is chosen.")
         produce_images = input("> ")
         produce_images = produce_images.lower()
         if produce_images == 'y' or produce_images == 'n':
@@ -89,26 +100,57 @@ if __name__ == "__main__":
           break
         print(f"Invalid input: {produce_images}.")
       
+      # determine the format the results are saved in
+      results_formats = comp_viz.results.get_formats()
+      while 1:
+        print("Please choose the format to save results in:")
+        client_helper.print_enum(results_formats)
+        results_format = input("> ")
+        if client_helper.is_valid_input(results_format,[str(num) for num in range(len(results_formats))]):
+          results_format = results_formats[int(results_format)]
+          break
+        print(f"Invalid input: {results_format}.")
+      if results_format == "files":
+        results_path = out_dir_path
+      else:
+        results_path = os.path.join(out_dir_path,f"predictions.{results_format}")
+
       # get image path and perform inference
-      print("Please enter the path to your image(s).")
+      print("Please enter the path to your image(s) or video.")
       in_path = input("> ")
+      if comp_viz.utils.Tools.is_video_fname(in_path):
+        with comp_viz.results.get_writer(results_format,results_path) as writer:
+          report = model.predict_video(in_path,writer,.5,classes=object_classes)
+        print(f"Complete! {report['frames']} frames at {report['fps']} frames/sec. Check directory: {out_dir_path}")
+        continue
       if os.path.isdir(in_path):
-        images = client_helper.get_dir_images(in_path)
+        images = client_helper.get_dir_images(in_path,args.recursive,args.include,args.exclude,args.shard)
+        in_dir_path = in_path
       else:
         images = [client_helper.get_image(in_path)]
-      print(f"Image count: {len(images)}.")
-      for img_fname in images:
+        in_dir_path = os.path.dirname(in_path)
+      # images are discovered while predicting, so results arrive before a large tree is fully listed
+      image_count = 0
+      with comp_viz.results.get_writer(results_format,results_path) as writer:
         if produce_images:
-          img, pred = model.get_image_prediction(img_fname,.5)
-          comp_viz.utils.Tools.save_image(img,os.path.join(out_dir_path_images,os.path.basename(img_fname)))
+          with comp_viz.utils.Renderer(object_classes) as renderer:
+            for img, pred in model.stream_image_predictions(images,.5,classes=object_classes):
+              # mirror the input tree so images with the same name in different directories stay apart
+              out_image_path = os.path.join(out_dir_path_images,os.path.relpath(pred["image"],in_dir_path))
+              os.makedirs(os.path.dirname(out_image_path),exist_ok=True)
+              renderer.save(img,pred["bounding_boxes"],pred["class_ids"],pred["confidence_scores"],out_image_path)
+              writer.write(pred)
+              image_count += 1
         else:
-          pred = model.get_prediction(img_fname)
-        with open(f"{os.path.join(out_dir_path,pathlib.Path(img_fname).stem)}.txt", "w") as f:
-          f.write(json.dumps(pred,indent=2))
-      print(f"Complete! Check directory: {out_dir_path}")
+          for pred in model.stream_predictions(images,classes=object_classes):
+            writer.write(pred)
+            image_count += 1
+      cache.flush()
+      print(f"Complete! Image count: {image_count}. Check directory: {out_dir_path}")
         
     # user wants to end program
     elif input_char == termination_char:
+      cache.close()
       print("Goodbye!") 
       sys.exit(0)
     
@@ -9,9 +9,10 @@
 #   - Getter and setter functions for image retrieval.
 
 import comp_viz
-import os
 
 def get_model_choice(models: list) -> str:
+  # order models by the speed measured on this machine by the autotuner, if it has been run
+  models = comp_viz.object_detection.TunedProfile.get_speed_order(models)
   print("Please choose from the following models:")
   print("Models are in order from fastest (lowest number) to most precise (highest num).")
   print_enum(models)
@@ -51,32 +52,25 @@ def describe_model(name: str) -> tuple:
   model["yolo3_darknet53_coco"] = "Gold standard for balance between precision and speed. Commonly used in real-time inference applications."
   model["faster_rcnn_fpn_syncbn_resnest269_coco"] = "As precise as it gets. Comes with a large cost in speed. Not recommended for real-time inference."
   model["ssd_512_resnet50_v1_coco"]  = "Third fastest network. Slightly faster than YOLO3 darkent, but comes with a cost in accuracy."
-  if name not in model:
-    return name, "No model description available at this time."
-  return name, model[name]
+  description = model.get(name, "No model description available at this time.")
+  tuned = comp_viz.object_detection.TunedProfile.get(name)
+  if tuned is not None:
+    description += (f" Measured on this machine: {tuned['ms_per_image']} ms per image ({tuned['images_per_sec']} images/sec)"
+                    f" at resolution {tuned['resolution']} with batch size {tuned['batch_size']}.")
+  return name, description
 
 def is_valid_object_classes(model, object_classes) -> bool:
-  model_classes = model.get_classes()
+  # models are shared through the registry, so check against every class of the network rather than those set
+  model_classes = model.get_default_classes()
   for object_class in object_classes:
     if object_class not in model_classes:
       print(f"Object class \"{object_class}\" is not available for chosen model.")
       return False
   return True
 
-def get_dir_images(dir):
-  valid_extensions = ["jpg","png","jpeg"]
-  dir_contents = os.listdir(dir)
-  image_paths = []
-  i = 0
-  while i < len(dir_contents):
-    file_path = dir_contents[i]
-    if file_path.split(".")[-1] in valid_extensions:
-      image_paths.append(os.path.join(dir,file_path))
-    i += 1
-  return image_paths
+def get_dir_images(dir, recursive=False, include=None, exclude=None, shard=None):
+  return comp_viz.utils.Tools.iter_dir_images(dir, recursive, include, exclude, shard)
 
 def get_image(path):
-  valid_extensions = ["jpg","png","jpeg"]
-  fname = os.path.basename(path)
-  if fname.split(".")[-1] in valid_extensions:
+  if comp_viz.utils.Tools.is_image_fname(path):
     return path
\ No newline at end of file
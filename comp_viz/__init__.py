@@ -1,2 +1,12 @@
-from . import utils
-from . import object_detection
\ No newline at end of file
+import importlib
+
+# Subpackages are imported on first use, so importing comp_viz costs nothing for the ones a program never touches.
+_subpackages = ["utils", "object_detection", "results"]
+
+def __getattr__(name):
+  if name in _subpackages:
+    return importlib.import_module(f".{name}", __name__)
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+  return sorted(list(globals()) + _subpackages)
\ No newline at end of file
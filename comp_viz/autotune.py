@@ -0,0 +1,75 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+# Autotuner picking the inference resolution and batch size of each object detection network for the current
+# machine. Every network is benchmarked across a grid of resolutions and batch sizes (see comp_viz.bench), the
+# best operating point meeting a latency or throughput target is picked, and the picks are written with the
+# measured numbers to a tuned profile that object detection models load automatically.
+# Usage:
+#   python -m comp_viz.autotune --latency-ms 50
+#   python -m comp_viz.autotune --images-per-sec 30 --networks yolo3_mobilenet1.0_coco yolo3_darknet53_coco
+
+import sys
+import argparse
+
+from . import bench
+from . import utils
+from .object_detection import TunedProfile
+from .config import Autotune as autotune_config
+
+def run(networks=None,latency_ms=None,images_per_sec=None,resolutions=None,batch_sizes=None,
+        iterations=autotune_config.iterations,warmup=autotune_config.warmup,path=None) -> dict:
+  """Sweep resolutions and batch sizes for each network, pick each network's operating point and save the
+  tuned profile of the current machine. Networks tuned in a previous run but not in this one keep their
+  previous operating point.
+
+  :param networks: Networks to tune. Defaults to every network in config.ObjectDetection.networks.
+  :type networks: List[string]
+  :param latency_ms: Maximum milliseconds to predict for one batch. Defaults to config.Autotune.latency_ms when no throughput target is given.
+  :type latency_ms: float
+  :param images_per_sec: Minimum images predicted for per second.
+  :type images_per_sec: float
+  :param resolutions: Inference resolutions to sweep. Defaults to config.Autotune.resolutions.
+  :type resolutions: List[int]
+  :param batch_sizes: Batch sizes to sweep. Defaults to config.Autotune.batch_sizes.
+  :type batch_sizes: List[int]
+  :param iterations: Number of timed batches for each combination.
+  :type iterations: int
+  :param warmup: Number of untimed batches run before the timed batches.
+  :type warmup: int
+  :param path: Path of the profile. Defaults to config.Autotune.profile_path.
+  :type path: string
+  :return: The tuned profile.
+  :rtype: dict
+  """
+  if latency_ms is not None and images_per_sec is not None:
+    raise ValueError("Only one of a latency and a throughput target can be given.")
+  report = bench.run(networks, resolutions or autotune_config.resolutions, batch_sizes or autotune_config.batch_sizes, iterations, warmup)
+  profile = TunedProfile.build(report, latency_ms, images_per_sec)
+  previous = TunedProfile.load(path)
+  if previous is not None:
+    profile["networks"] = dict(previous["networks"], **profile["networks"])
+  TunedProfile.save(profile, path)
+  return profile
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Tune the inference resolution and batch size of the comp_viz object detection networks to this machine.")
+  parser.add_argument("--networks", nargs="+", choices=utils.ObjectDetection.get_networks(), help="networks to tune (default: all)")
+  target = parser.add_mutually_exclusive_group()
+  target.add_argument("--latency-ms", type=float, help=f"maximum milliseconds per batch (default: {autotune_config.latency_ms})")
+  target.add_argument("--images-per-sec", type=float, help="minimum images per second")
+  parser.add_argument("--resolutions", nargs="+", type=int, help=f"inference resolutions (default: {autotune_config.resolutions})")
+  parser.add_argument("--batch-sizes", nargs="+", type=int, help=f"batch sizes (default: {autotune_config.batch_sizes})")
+  parser.add_argument("--iterations", type=int, default=autotune_config.iterations, help="timed batches per combination")
+  parser.add_argument("--warmup", type=int, default=autotune_config.warmup, help="untimed batches per combination")
+  parser.add_argument("--profile", help="path to write the tuned profile to (default: per host under ~/.comp_viz/tuned)")
+  args = parser.parse_args(argv)
+  profile = run(args.networks, args.latency_ms, args.images_per_sec, args.resolutions, args.batch_sizes, args.iterations, args.warmup, args.profile)
+  for network, point in profile["networks"].items():
+    status = "" if point["target_met"] else " (target not met)"
+    print(f"{network}: resolution {point['resolution']}, batch size {point['batch_size']}, "
+          f"{point['latency_ms']} ms/batch, {point['images_per_sec']} images/sec{status}")
+  print(f"Tuned profile saved to: {TunedProfile.get_path(args.profile)}")
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
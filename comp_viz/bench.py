@@ -0,0 +1,251 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+# Offline benchmark of the object detection networks supported by comp_viz. Every network is run with
+# randomly initialized weights on synthetic images, so no downloads or datasets are needed, across a grid
+# of inference resolutions and batch sizes. Latency of each stage of a prediction is measured and the
+# results are written as JSON that can be compared against a previous run to catch regressions. The time a
+# fresh process takes to import comp_viz is checked too, so heavy imports creeping back into startup are caught.
+# Usage:
+#   python -m comp_viz.bench --output bench.json
+#   python -m comp_viz.bench --networks yolo3_mobilenet1.0_coco --baseline old_bench.json
+#   python -m comp_viz.bench --startup-only
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+
+import numpy
+
+from . import utils
+from . import object_detection
+from .config import CompViz as comp_viz_config
+from .config import Bench as bench_config
+
+cv2 = utils.lazy_import("cv2")
+mxnet = utils.lazy_import("mxnet")
+
+# Directory holding the comp_viz package, so timed processes import this copy of it.
+_package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stages of a prediction that are timed, in the order they run.
+stages = ["decode", "preprocess", "forward", "postprocess", "draw", "write"]
+
+def run(networks=None,resolutions=None,batch_sizes=None,iterations=bench_config.iterations,warmup=bench_config.warmup,seed=0) -> dict:
+  """Benchmark networks across a grid of inference resolutions and batch sizes.
+
+  :param networks: Networks to benchmark. Defaults to every network in config.ObjectDetection.networks.
+  :type networks: List[string]
+  :param resolutions: Inference resolutions to benchmark. Defaults to config.Bench.resolutions.
+  :type resolutions: List[int]
+  :param batch_sizes: Batch sizes to benchmark. Defaults to config.Bench.batch_sizes.
+  :type batch_sizes: List[int]
+  :param iterations: Number of timed batches for each combination.
+  :type iterations: int
+  :param warmup: Number of untimed batches run before the timed batches.
+  :type warmup: int
+  :param seed: Seed for the synthetic images and network weights.
+  :type seed: int
+  :return: Dict holding information about the machine under "meta" and one entry per combination under "results".
+  :rtype: dict
+  """
+  networks = networks or utils.ObjectDetection.get_networks()
+  resolutions = resolutions or bench_config.resolutions
+  batch_sizes = batch_sizes or bench_config.batch_sizes
+  if iterations < 1:
+    raise ValueError(f"{iterations} is an invalid number of iterations.")
+  images = get_synthetic_images(max(batch_sizes), seed)
+  results = []
+  for network in networks:
+    mxnet.random.seed(seed)
+    model = object_detection.Model(network, pretrained=False, artifact=False)
+    for resolution in resolutions:
+      model.set_inference_resolution(resolution)
+      for batch_size in batch_sizes:
+        results.append(_run_config(model, images[:batch_size], iterations, warmup))
+        print(f"{network} @ {resolution} x{batch_size}: {results[-1]['images_per_sec']} images/sec")
+  return {"meta": _get_meta(iterations, warmup, seed), "startup_ms": get_startup_time(), "results": results}
+
+def get_startup_time(repeats=bench_config.startup_repeats) -> float:
+  """Get the milliseconds a fresh python process takes to import comp_viz and list its networks, the best of
+  several runs. None of mxnet, gluoncv, cv2 or numpy should be imported by then.
+
+  :param repeats: Number of processes timed.
+  :type repeats: int
+  :rtype: float
+  """
+  code = ("import time; start = time.perf_counter(); import comp_viz; "
+          "comp_viz.utils.ObjectDetection.get_networks(); print(time.perf_counter() - start)")
+  env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_package_root, os.environ.get("PYTHONPATH")])))
+  times = []
+  for _ in range(repeats):
+    process = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    times.append(float(process.stdout))
+  return round(min(times) * 1000, 3)
+
+def get_synthetic_images(count: int, seed=0) -> list:
+  """Get a list of JPEG encoded images of random noise, cycling through the shapes in config.Bench.image_shapes.
+
+  :param count: Number of images.
+  :type count: int
+  :param seed: Seed for the random noise.
+  :type seed: int
+  :rtype: List[bytes]
+  """
+  rng = numpy.random.default_rng(seed)
+  images = []
+  for i in range(count):
+    height, width = bench_config.image_shapes[i % len(bench_config.image_shapes)]
+    img = rng.integers(0, 256, size=(height, width, 3), dtype=numpy.uint8)
+    images.append(cv2.imencode(".jpg", img)[1].tobytes())
+  return images
+
+def compare(baseline: dict, current: dict, tolerance=bench_config.tolerance) -> list:
+  """Compare two benchmark runs and get the combinations whose median latency regressed by more than the tolerance.
+
+  :param baseline: Benchmark results from run() to compare against.
+  :type baseline: dict
+  :param current: Benchmark results from run().
+  :type current: dict
+  :param tolerance: Relative slowdown that counts as a regression. Ex. 0.1 for 10%.
+  :type tolerance: float
+  :return: List of dicts describing each regressed combination.
+  :rtype: List[dict]
+  """
+  base = {_get_key(result): result for result in baseline["results"]}
+  regressions = []
+  before, after = baseline.get("startup_ms"), current.get("startup_ms")
+  if before and after and (after - before) / before > tolerance:
+    regressions.append({"startup_ms": after, "baseline_startup_ms": before, "slowdown": round((after - before) / before, 4)})
+  for result in current["results"]:
+    key = _get_key(result)
+    if key not in base:
+      continue
+    before = base[key]["latency_ms"]["p50"]
+    after = result["latency_ms"]["p50"]
+    if before > 0 and (after - before) / before > tolerance:
+      regressions.append({"network": key[0], "resolution": key[1], "batch_size": key[2],
+                          "baseline_p50_ms": before, "p50_ms": after,
+                          "slowdown": round((after - before) / before, 4)})
+  return regressions
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Offline benchmark of the comp_viz object detection networks.")
+  parser.add_argument("--networks", nargs="+", choices=utils.ObjectDetection.get_networks(), help="networks to benchmark (default: all)")
+  parser.add_argument("--resolutions", nargs="+", type=int, help=f"inference resolutions (default: {bench_config.resolutions})")
+  parser.add_argument("--batch-sizes", nargs="+", type=int, help=f"batch sizes (default: {bench_config.batch_sizes})")
+  parser.add_argument("--iterations", type=int, default=bench_config.iterations, help="timed batches per combination")
+  parser.add_argument("--warmup", type=int, default=bench_config.warmup, help="untimed batches per combination")
+  parser.add_argument("--seed", type=int, default=0, help="seed for synthetic images and weights")
+  parser.add_argument("--output", default="bench.json", help="path to write the JSON results to")
+  parser.add_argument("--baseline", help="JSON results of a previous run to check for regressions")
+  parser.add_argument("--tolerance", type=float, default=bench_config.tolerance, help="relative slowdown that counts as a regression")
+  parser.add_argument("--startup-only", action="store_true", help=f"only check that startup takes under {bench_config.max_startup_ms} ms")
+  args = parser.parse_args(argv)
+  if args.startup_only:
+    startup_ms = get_startup_time()
+    print(f"Startup: {startup_ms} ms")
+    if startup_ms > bench_config.max_startup_ms:
+      print(f"Regression: startup took over {bench_config.max_startup_ms} ms")
+      return 1
+    return 0
+  report = run(args.networks, args.resolutions, args.batch_sizes, args.iterations, args.warmup, args.seed)
+  with open(args.output, "w") as f:
+    f.write(json.dumps(report, indent=2))
+  print(f"Results saved to: {args.output}")
+  if args.baseline:
+    with open(args.baseline) as f:
+      regressions = compare(json.load(f), report, args.tolerance)
+    for regression in regressions:
+      print(f"Regression: {regression}")
+    if regressions:
+      return 1
+  return 0
+
+# Time every stage of predicting for a batch of encoded images, iterations times after warming up.
+def _run_config(model,images: list,iterations: int,warmup: int) -> dict:
+  stage_times = {stage: [] for stage in stages}
+  totals = []
+  for i in range(warmup + iterations):
+    times = _time_batch(model, images)
+    if i < warmup:
+      continue
+    for stage in stages:
+      stage_times[stage].append(times[stage])
+    totals.append(sum(times.values()))
+  return {"network": model.net_name,
+          "resolution": model.inference_resolution,
+          "batch_size": len(images),
+          "latency_ms": _get_percentiles(totals),
+          "stages_ms": {stage: _get_percentiles(stage_times[stage]) for stage in stages},
+          "images_per_sec": round(len(images) / float(numpy.mean(totals)), 2),
+          "peak_rss_mb": _get_peak_rss_mb()}
+
+# Run one batch through the model's own prediction pipeline, then draw and write out its predictions,
+# timing every stage with the instrumentation the model and utils helpers report to. Stages wait on
+# MXNet's asynchronous engine so each one is timed on its own. Returns the seconds taken by each stage.
+def _time_batch(model,images: list) -> dict:
+  previous = utils.Instrument.get()
+  instrumentation = utils.Instrument.enable(utils.Instrumentation(sync=True))
+  try:
+    classes = model._resolve_classes(None)
+    base_imgs = [model._load_image(img) for img in images]
+    detections = model._predict_batch([base_img for base_img, _ in base_imgs],0.,classes,base_shapes=[base_shape for _, base_shape in base_imgs],batch_size=len(images))
+    with instrumentation.stage("postprocess"):
+      preds = [model._build_prediction(None, dets, 0., 0., classes) for dets in detections]
+    # images may have been decoded at reduced resolution, so boxes are drawn scaled to the decoded image
+    drawn = []
+    for (base_img, base_shape), dets in zip(base_imgs, detections):
+      dets = dets.rescale(base_shape, base_img.shape)
+      drawn.append(utils.ObjectDetection.get_pred_bboxes_image(base_img, dets.bboxes, dets.class_ids, classes, dets.scores))
+    with instrumentation.stage("write"):
+      for img, prediction in zip(drawn, preds):
+        cv2.imencode(".jpg", img)
+        json.dumps(prediction)
+  finally:
+    if previous is None:
+      utils.Instrument.disable()
+    else:
+      utils.Instrument.enable(previous)
+  return {stage: sum(instrumentation.stage_times.get(stage, [])) for stage in stages}
+
+# Get percentiles, in milliseconds, of a list of durations in seconds.
+def _get_percentiles(durations: list) -> dict:
+  durations = numpy.asarray(durations) * 1000
+  return {"p50": round(float(numpy.percentile(durations, 50)), 3),
+          "p95": round(float(numpy.percentile(durations, 95)), 3),
+          "p99": round(float(numpy.percentile(durations, 99)), 3),
+          "mean": round(float(numpy.mean(durations)), 3)}
+
+# Get the peak resident set size of the process so far, in megabytes. Since it never decreases, the
+# value for a combination covers every combination benchmarked before it in the same run.
+def _get_peak_rss_mb() -> float:
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+  if sys.platform == "darwin":
+    return round(peak / 2**20, 1)
+  return round(peak / 2**10, 1)
+
+# Get the key identifying a benchmark combination across runs.
+def _get_key(result: dict) -> tuple:
+  return (result["network"], result["resolution"], result["batch_size"])
+
+# Get information about the machine and software the benchmark ran on.
+def _get_meta(iterations: int, warmup: int, seed: int) -> dict:
+  return {"comp_viz": comp_viz_config.version,
+          "mxnet": mxnet.__version__,
+          "python": platform.python_version(),
+          "platform": platform.platform(),
+          "processor": platform.processor(),
+          "cpu_count": os.cpu_count(),
+          "iterations": iterations,
+          "warmup": warmup,
+          "seed": seed,
+          "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+if __name__ == "__main__":
+  sys.exit(main())
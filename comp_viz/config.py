@@ -19,6 +19,17 @@ class ObjectDetection(CompViz):
   """Configuration class for the object detection task for the comp_viz package.
 
   :ivar networks: Dictionary of supported networks for object detection for the comp viz package. Each network has an associated inference resolution.
+  :ivar max_loaded_networks: Maximum number of networks kept loaded in memory by the model registry at once.
+  :ivar max_loaded_bytes: Maximum combined parameter size in bytes of the networks kept loaded by the model registry. 0 means no limit.
+  :ivar bucket_aspect_ratios: Aspect ratios (long side / short side) of the input shape buckets a compiled model letterboxes images into. Each ratio gives a landscape and a portrait bucket derived from the inference resolution.
+  :ivar bucket_multiple: Bucket heights and widths are rounded up to a multiple of this value.
+  :ivar nms_iou: Intersection over union above which the lower scoring of two overlapping detections of the same class is suppressed. 0 disables non-maximal suppression.
+  :ivar nms_top_k: Maximum number of detections kept per image after non-maximal suppression. 0 means no limit.
+  :ivar soft_nms: Whether non-maximal suppression decays the confidence scores of overlapping detections rather than dropping them.
+  :ivar soft_nms_sigma: Spread of the Gaussian score decay of soft non-maximal suppression.
+  :ivar tile_overlap: Default share of a tile's side overlapping the next tile in tiled inference.
+  :ivar tile_merge_iou: Intersection over union above which overlapping detections of the same class from different tiles are merged in tiled inference, keeping the highest scoring one.
+  :ivar reduced_decode: Whether JPEG images larger than needed for the inference resolution are decoded at reduced resolution when predicting for them. Images are still decoded at full resolution for drawing annotated images.
   """
   networks = {
       "yolo3_mobilenet1.0_coco": { "resolution": 416 },
@@ -27,4 +38,157 @@ class ObjectDetection(CompViz):
       "center_net_resnet101_v1b_dcnv2_coco": { "resolution": 416 },
       "faster_rcnn_fpn_resnet50_v1b_coco": { "resolution": 416 },
       "faster_rcnn_fpn_syncbn_resnest269_coco": { "resolution": 416 }
-  }
\ No newline at end of file
+  }
+  max_loaded_networks = 2
+  max_loaded_bytes = 0
+  bucket_aspect_ratios = [1.0, 4 / 3, 16 / 9]
+  bucket_multiple = 32
+  nms_iou = 0.45
+  nms_top_k = 100
+  soft_nms = False
+  soft_nms_sigma = 0.5
+  reduced_decode = True
+  tile_overlap = 0.2
+  tile_merge_iou = 0.5
+
+class Quantization(CompViz):
+  """Configuration class for INT8 quantized inference for the comp_viz package.
+
+  :ivar cache_dir: Directory calibrated INT8 networks are cached in.
+  :ivar num_calib_images: Maximum number of images from the calibration directory used for calibration.
+  :ivar calib_mode: MXNet calibration mode, "naive" (min/max) or "entropy" (KL divergence).
+  :ivar report_thresh: Minimum confidence score of the detections compared in the accuracy report.
+  :ivar report_iou: Minimum intersection over union for an INT8 detection to agree with an FP32 detection in the accuracy report.
+  """
+  cache_dir = "~/.comp_viz/quantized"
+  num_calib_images = 64
+  calib_mode = "naive"
+  report_thresh = 0.5
+  report_iou = 0.5
+
+class Results(CompViz):
+  """Configuration class for writing prediction results for the comp_viz package.
+
+  :ivar formats: List of supported formats results can be written in.
+  :ivar flush_every: Number of predictions a results writer buffers before writing them out in bulk.
+  :ivar flush_interval: Maximum seconds a results writer buffers a prediction before writing it out.
+  """
+  formats = ["jsonl", "npz", "parquet", "files"]
+  flush_every = 256
+  flush_interval = 5.
+
+class Bench(CompViz):
+  """Configuration class for the offline benchmark of the comp_viz package.
+
+  :ivar resolutions: Inference resolutions benchmarked for each network.
+  :ivar batch_sizes: Batch sizes benchmarked for each network and resolution.
+  :ivar image_shapes: Shapes (height, width) of the synthetic images benchmarked, cycled through.
+  :ivar iterations: Number of timed batches for each network, resolution and batch size.
+  :ivar warmup: Number of untimed batches run before the timed batches.
+  :ivar tolerance: Relative slowdown of a benchmark against a baseline that counts as a regression.
+  :ivar startup_repeats: Number of fresh processes timed importing comp_viz.
+  :ivar max_startup_ms: Maximum milliseconds a fresh process may take to import comp_viz and list its networks.
+  """
+  resolutions = [320, 416, 608]
+  batch_sizes = [1, 4, 8]
+  image_shapes = [(480, 640), (720, 1280), (1080, 1920)]
+  iterations = 20
+  warmup = 3
+  tolerance = 0.1
+  startup_repeats = 5
+  max_startup_ms = 200
+
+class Render(CompViz):
+  """Configuration class for drawing and saving annotated images for the comp_viz package.
+
+  :ivar workers: Number of threads encoding and saving annotated images.
+  :ivar jpeg_quality: JPEG quality (0-100) of saved annotated images.
+  :ivar png_compression: PNG compression level (0-9) of saved annotated images.
+  :ivar preview_size: Longest side in pixels of the downscaled preview saved next to each annotated image. 0 disables previews.
+  :ivar thickness: Line thickness in pixels of bounding boxes.
+  :ivar font_scale: Scale of the label text drawn above bounding boxes.
+  """
+  workers = 2
+  jpeg_quality = 90
+  png_compression = 1
+  preview_size = 0
+  thickness = 2
+  font_scale = 0.5
+
+class Cache(CompViz):
+  """Configuration class for the persistent prediction cache for the comp_viz package.
+
+  :ivar path: Path of the SQLite file predictions are cached in.
+  :ivar max_bytes: Maximum combined size in bytes of the cached predictions. Least recently used predictions are evicted past it. 0 means no limit.
+  :ivar max_age: Maximum age in seconds of cached predictions. 0 means no limit.
+  :ivar commit_every: Number of new predictions cached before they are committed to disk.
+  """
+  path = "~/.comp_viz/predictions.sqlite"
+  max_bytes = 2**30
+  max_age = 30 * 24 * 60 * 60
+  commit_every = 32
+
+class Server(CompViz):
+  """Configuration class for the local HTTP inference server for the comp_viz package.
+
+  :ivar host: Address the server listens on.
+  :ivar port: Port the server listens on.
+  :ivar max_batch_size: Maximum number of requests gathered into one micro-batch.
+  :ivar max_wait_ms: Maximum milliseconds the first request of a micro-batch waits for more requests to join it.
+  :ivar max_queue: Maximum number of requests waiting per network before new requests are turned away with 503.
+  :ivar max_body_bytes: Maximum size in bytes of a request body.
+  :ivar latency_window: Number of most recent requests latency percentiles are computed over.
+  """
+  host = "127.0.0.1"
+  port = 8080
+  max_batch_size = 8
+  max_wait_ms = 5
+  max_queue = 256
+  max_body_bytes = 32 * 2**20
+  latency_window = 4096
+
+class Evaluation(CompViz):
+  """Configuration class for evaluating detections against ground truth for the comp_viz package.
+
+  :ivar iou_thresholds: Intersection over union thresholds a detection must reach to match a ground truth box. mAP averages over them.
+  :ivar ap_points: Number of evenly spaced recall points average precision is interpolated at, 101 as in COCO. 0 computes the exact area under the interpolated curve, as in VOC 2010 and later.
+  """
+  iou_thresholds = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+  ap_points = 101
+
+class Autotune(CompViz):
+  """Configuration class for tuning the inference resolution and batch size of each network to the current machine for the comp_viz package.
+
+  :ivar profile_path: Path of the tuned profile written by the autotuner and loaded by object detection models. "{host}" is replaced by the machine's host name, so machines sharing a home directory keep their own profiles.
+  :ivar resolutions: Inference resolutions swept for each network.
+  :ivar batch_sizes: Batch sizes swept for each network and resolution.
+  :ivar iterations: Number of timed batches for each network, resolution and batch size.
+  :ivar warmup: Number of untimed batches run before the timed batches.
+  :ivar latency_ms: Default target, in milliseconds, for the time taken to predict for one batch when no target is given.
+  """
+  profile_path = "~/.comp_viz/tuned/{host}.json"
+  resolutions = [320, 416, 512, 608]
+  batch_sizes = [1, 2, 4, 8, 16]
+  iterations = 10
+  warmup = 2
+  latency_ms = 100.
+
+class Artifact(CompViz):
+  """Configuration class for exported network artifacts for the comp_viz package.
+
+  :ivar dir: Directory network artifacts are exported to. Object detection models load their network from the artifact exported here, if any, instead of building it with the gluoncv model zoo.
+  :ivar alignment: Alignment in bytes of each parameter within the parameter file of an artifact.
+  """
+  dir = "~/.comp_viz/artifacts"
+  alignment = 64
+
+class Cascade(CompViz):
+  """Configuration class for cascades of object detection networks, from fastest to most precise, for the comp_viz package.
+
+  :ivar networks: Networks of the default cascade, from fastest to most precise.
+  :ivar score_bands: (low, high) confidence score band of each stage but the last. Images with a detection scoring within the band are escalated to the next stage.
+  :ivar escalate_empty: Whether images with no detection scoring at least the low end of the band are escalated to the next stage.
+  """
+  networks = ["yolo3_mobilenet1.0_coco", "yolo3_darknet53_coco"]
+  score_bands = [(0.3, 0.7)]
+  escalate_empty = True
@@ -0,0 +1,370 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+# Evaluation of the predictions of a run against COCO or VOC style ground truth. Predictions are streamed
+# from the results the run saved, matched against the ground truth boxes of their image as they arrive, and
+# only a score and match flags are kept per detection, so memory stays flat however many images a run has.
+# Matching is vectorized over every IoU threshold at once, and precision/recall curves and average precision
+# are computed with cumulative sums over all detections of a class.
+# Usage:
+#   python -m comp_viz.evaluation --ground-truth instances_val2017.json --results inference/run/predictions.jsonl
+#   python -m comp_viz.evaluation --ground-truth VOC2012/Annotations --results inference/run --output metrics.json
+
+import os
+import sys
+import json
+import argparse
+import collections
+import xml.etree.ElementTree
+import numpy
+
+from . import utils
+from . import results
+from .config import Evaluation as eval_config
+
+class GroundTruth:
+  """Ground truth bounding boxes of a dataset, looked up by image file name without its extension, so
+  predictions made for the images find their boxes wherever the images were stored.
+
+  :ivar classes: Sorted list of the object classes with at least one ground truth box.
+  """
+
+  def __init__(self,boxes: dict):
+    """Constructor method
+
+    :param boxes: Dictionary mapping each image name to a tuple of its boxes of shape (N,4) in
+                  [x_min,y_min,x_max,y_max] form, the object class of each box, and whether each box is
+                  ignored (crowd or difficult), in which case detecting it is neither rewarded nor punished.
+    :type boxes: dict
+    """
+    self._boxes = boxes
+    classes = set()
+    for _, names, _ in boxes.values():
+      classes.update(names.tolist())
+    self.classes = sorted(classes)
+
+  @classmethod
+  def load(cls,path: str):
+    """Load ground truth from a COCO annotation file, or from a directory of VOC annotation files.
+
+    :param path: Path to a COCO style JSON file, or a directory of VOC style XML files.
+    :type path: string
+    :rtype: GroundTruth
+    """
+    utils.Tools.verify_exists(path)
+    if os.path.isdir(path):
+      return cls.from_voc(path)
+    return cls.from_coco(path)
+
+  @classmethod
+  def from_coco(cls,path: str):
+    """Load ground truth from a COCO style annotation file, with boxes in [x,y,width,height] form.
+
+    :param path: Path to the JSON annotation file.
+    :type path: string
+    :rtype: GroundTruth
+    """
+    utils.Tools.verify_exists(path)
+    with open(path) as f:
+      data = json.load(f)
+    categories = {category["id"]: category["name"].lower() for category in data.get("categories", [])}
+    image_names = {image["id"]: _get_image_name(image["file_name"]) for image in data["images"]}
+    annotations = data.get("annotations", [])
+    image_ids = numpy.array([ann["image_id"] for ann in annotations], dtype=numpy.int64)
+    bboxes = numpy.array([ann["bbox"] for ann in annotations], dtype=numpy.float64).reshape(-1, 4)
+    bboxes[:, 2:] += bboxes[:, :2]
+    names = numpy.array([categories.get(ann["category_id"], str(ann["category_id"])) for ann in annotations], dtype=object)
+    ignore = numpy.array([bool(ann.get("iscrowd", 0)) for ann in annotations], dtype=bool)
+    # group the annotations of each image with one sort rather than a dictionary of lists
+    order = numpy.argsort(image_ids, kind="stable")
+    image_ids, bboxes, names, ignore = image_ids[order], bboxes[order], names[order], ignore[order]
+    unique_ids, starts = numpy.unique(image_ids, return_index=True)
+    ends = numpy.append(starts[1:], image_ids.shape[0])
+    empty = (numpy.zeros((0, 4)), numpy.zeros(0, dtype=object), numpy.zeros(0, dtype=bool))
+    boxes = {name: empty for name in image_names.values()}
+    for image_id, start, end in zip(unique_ids.tolist(), starts.tolist(), ends.tolist()):
+      if image_id in image_names:
+        boxes[image_names[image_id]] = (bboxes[start:end], names[start:end], ignore[start:end])
+    return cls(boxes)
+
+  @classmethod
+  def from_voc(cls,path: str):
+    """Load ground truth from a directory of VOC style XML annotation files, one per image. Boxes marked
+    difficult are ignored.
+
+    :param path: Path to the directory of annotation files.
+    :type path: string
+    :rtype: GroundTruth
+    """
+    utils.Tools.verify_exists(path)
+    with os.scandir(path) as entries:
+      fnames = sorted(entry.path for entry in entries if entry.is_file() and entry.name.lower().endswith(".xml"))
+    boxes = {}
+    for fname in fnames:
+      root = xml.etree.ElementTree.parse(fname).getroot()
+      image_name = _get_image_name(root.findtext("filename") or os.path.basename(fname))
+      bboxes, names, ignore = [], [], []
+      for obj in root.iter("object"):
+        bndbox = obj.find("bndbox")
+        # VOC coordinates are 1-based
+        bboxes.append([float(bndbox.findtext(key)) - 1 for key in ["xmin", "ymin", "xmax", "ymax"]])
+        names.append(obj.findtext("name").strip().lower())
+        ignore.append(obj.findtext("difficult", "0").strip() == "1")
+      boxes[image_name] = (numpy.array(bboxes, dtype=numpy.float64).reshape(-1, 4), numpy.array(names, dtype=object), numpy.array(ignore, dtype=bool))
+    return cls(boxes)
+
+  def get(self,image: str):
+    """Get the ground truth of an image, or None if the image is not part of the ground truth.
+
+    :param image: Path or file name of the image.
+    :type image: string
+    :return: A tuple of the boxes of shape (N,4), the object class of each box, and whether each box is ignored.
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    return self._boxes.get(_get_image_name(image))
+
+  def __len__(self):
+    return len(self._boxes)
+
+
+class Evaluator:
+  """Streaming evaluator of predictions against ground truth. Each prediction handed to add() is matched
+  against the ground truth boxes of its image, greedily in descending score order as in COCO, and reduced
+  to a score and one match flag per IoU threshold per detection. Only images seen by add() contribute
+  ground truth, so a shard of a dataset or an interrupted run is evaluated on what it covers.
+
+  :param ground_truth: Ground truth to evaluate against.
+  :type ground_truth: GroundTruth
+  :param iou_thresholds: IoU thresholds a detection must reach to match a ground truth box.
+  :type iou_thresholds: List[float]
+  :param classes: Object classes to evaluate. Defaults to every class with ground truth boxes or detections.
+  :type classes: List[string]
+  :param ap_points: Number of evenly spaced recall points average precision is interpolated at. 0 computes the exact area.
+  :type ap_points: int
+  :ivar images: Number of predictions evaluated.
+  :ivar unmatched_images: Number of predictions skipped because their image is not part of the ground truth.
+  :ivar failed_images: Number of predictions skipped because they hold the "error" of an image that could not be predicted for.
+  """
+
+  def __init__(self,ground_truth: GroundTruth,iou_thresholds=None,classes=None,ap_points=eval_config.ap_points):
+    """Constructor method
+    """
+    self.ground_truth = ground_truth
+    self.iou_thresholds = numpy.asarray(iou_thresholds or eval_config.iou_thresholds, dtype=numpy.float64)
+    if self.iou_thresholds.ndim != 1 or not ((self.iou_thresholds > 0) & (self.iou_thresholds <= 1)).all():
+      raise ValueError(f"{list(self.iou_thresholds)} are invalid IoU thresholds.")
+    if ap_points < 0:
+      raise ValueError(f"{ap_points} is an invalid number of recall points.")
+    self.ap_points = ap_points
+    self.images = 0
+    self.unmatched_images = 0
+    self.failed_images = 0
+    self._classes = None if classes is None else set(obj_class.lower() for obj_class in classes)
+    self._num_positives = collections.Counter()
+    self._scores = collections.defaultdict(list)
+    self._matches = collections.defaultdict(list)
+    self._ignored = collections.defaultdict(list)
+
+  def add(self,prediction: dict) -> bool:
+    """Match the detections of a prediction against the ground truth of its image.
+
+    :param prediction: Prediction dict, as returned by Model.get_prediction() or results.read_predictions().
+    :type prediction: dict
+    :return: Whether the prediction's image is part of the ground truth and was evaluated.
+    :rtype: boolean
+    """
+    if prediction.get("error"):
+      self.failed_images += 1
+      return False
+    truth = self.ground_truth.get(prediction["image"]) if prediction.get("image") else None
+    if truth is None:
+      self.unmatched_images += 1
+      return False
+    self.images += 1
+    gt_bboxes, gt_names, gt_ignore = truth
+    class_map = {int(cid): name for cid, name in prediction["class_map"].items()}
+    names = numpy.array([class_map[cid] for cid in prediction["class_ids"]], dtype=object)
+    scores = numpy.asarray(prediction["confidence_scores"], dtype=numpy.float32).reshape(-1)
+    bboxes = numpy.asarray(prediction["bounding_boxes"], dtype=numpy.float64).reshape(-1, 4)
+    for name, count in zip(*numpy.unique(gt_names[~gt_ignore], return_counts=True)):
+      if self._classes is None or name in self._classes:
+        self._num_positives[name] += int(count)
+    for name in numpy.unique(names).tolist():
+      if self._classes is not None and name not in self._classes:
+        continue
+      det = names == name
+      gt = gt_names == name
+      matches, ignored = self._match(bboxes[det], scores[det], gt_bboxes[gt], gt_ignore[gt])
+      self._scores[name].append(scores[det])
+      self._matches[name].append(matches)
+      self._ignored[name].append(ignored)
+    return True
+
+  def add_all(self,predictions):
+    """Match the detections of every prediction of an iterable, such as results.read_predictions().
+
+    :param predictions: Iterable of prediction dicts.
+    :type predictions: Iterable[dict]
+    :rtype: void
+    """
+    for prediction in predictions:
+      self.add(prediction)
+
+  def get_pr_curve(self,obj_class: str,iou_threshold=0.5) -> dict:
+    """Get the precision/recall curve of an object class at one of the evaluator's IoU thresholds, with one
+    point per detection in descending score order.
+
+    :param obj_class: Object class.
+    :type obj_class: string
+    :param iou_threshold: One of the evaluator's IoU thresholds.
+    :type iou_threshold: float
+    :return: Dict of arrays "precision", "recall" and "scores", where precision and recall are taken over the detections scoring at least that score.
+    :rtype: dict
+    """
+    index = numpy.flatnonzero(numpy.isclose(self.iou_thresholds, iou_threshold))
+    if not index.shape[0]:
+      raise ValueError(f"{iou_threshold} is not one of the evaluator's IoU thresholds.")
+    scores, precision, recall = self._get_curves(obj_class.lower())
+    return {"precision": precision[:, index[0]], "recall": recall[:, index[0]], "scores": scores}
+
+  def get_results(self) -> dict:
+    """Get average precision of every object class at every IoU threshold, and mAP over the classes with
+    ground truth boxes. Average precision is None for classes without ground truth boxes.
+
+    :rtype: dict
+    """
+    classes = set(self._num_positives) | set(self._scores)
+    per_class = {}
+    aps = []
+    for name in sorted(classes):
+      scores, precision, recall = self._get_curves(name)
+      num_positives = self._num_positives[name]
+      entry = {"ground_truth": num_positives, "detections": int(scores.shape[0])}
+      if num_positives:
+        ap = self._get_average_precision(precision, recall)
+        aps.append(ap)
+        entry["ap"] = round(float(ap.mean()), 4)
+        entry["ap_per_iou"] = {str(round(float(t), 2)): round(float(a), 4) for t, a in zip(self.iou_thresholds, ap)}
+        entry["recall"] = round(float(recall[-1, 0]), 4) if scores.shape[0] else 0.
+        entry["precision"] = round(float(precision[-1, 0]), 4) if scores.shape[0] else 0.
+      else:
+        entry["ap"] = None
+      per_class[name] = entry
+    summary = {"images": self.images,
+               "unmatched_images": self.unmatched_images,
+               "failed_images": self.failed_images,
+               "iou_thresholds": [round(float(t), 2) for t in self.iou_thresholds],
+               "mAP": round(float(numpy.mean(aps)), 4) if aps else None}
+    for t in (0.5, 0.75):
+      index = numpy.flatnonzero(numpy.isclose(self.iou_thresholds, t))
+      if index.shape[0] and aps:
+        summary[f"AP{int(t * 100)}"] = round(float(numpy.mean([ap[index[0]] for ap in aps])), 4)
+    summary["classes"] = per_class
+    return summary
+
+  # Greedily match detections of one class in one image to ground truth boxes at every IoU threshold at once.
+  # Returns boolean arrays of shape (detections, thresholds) of whether each detection matched a box, and
+  # whether it only overlaps ignored boxes and so does not count.
+  def _match(self,bboxes,scores,gt_bboxes,gt_ignore) -> tuple:
+    num_thresholds = self.iou_thresholds.shape[0]
+    matches = numpy.zeros((bboxes.shape[0], num_thresholds), dtype=bool)
+    ignored = numpy.zeros((bboxes.shape[0], num_thresholds), dtype=bool)
+    if not gt_bboxes.shape[0] or not bboxes.shape[0]:
+      return matches, ignored
+    iou = utils.ObjectDetection.get_iou_matrix(bboxes, gt_bboxes)
+    # (detections, thresholds, boxes) mask of the boxes each detection overlaps enough at each threshold
+    overlaps = iou[:, None, :] >= self.iou_thresholds[None, :, None]
+    taken = numpy.zeros((num_thresholds, gt_bboxes.shape[0]), dtype=bool)
+    thresholds = numpy.arange(num_thresholds)
+    for i in numpy.argsort(-scores, kind="stable").tolist():
+      candidates = overlaps[i] & ~taken & ~gt_ignore[None, :]
+      best = numpy.where(candidates, iou[i][None, :], -1.).argmax(axis=1)
+      found = candidates[thresholds, best]
+      taken[thresholds[found], best[found]] = True
+      matches[i] = found
+      # ignored boxes may absorb any number of detections
+      ignored[i] = ~found & (overlaps[i] & gt_ignore[None, :]).any(axis=1)
+    return matches, ignored
+
+  # Get the scores of every detection of a class in descending order, and the precision and recall of shape
+  # (detections, thresholds) after each of them.
+  def _get_curves(self,name) -> tuple:
+    num_thresholds = self.iou_thresholds.shape[0]
+    if not self._scores.get(name):
+      return numpy.zeros(0, dtype=numpy.float32), numpy.zeros((0, num_thresholds)), numpy.zeros((0, num_thresholds))
+    scores = numpy.concatenate(self._scores[name])
+    order = numpy.argsort(-scores, kind="stable")
+    matches = numpy.concatenate(self._matches[name])[order]
+    counted = ~numpy.concatenate(self._ignored[name])[order]
+    # ignored detections add to neither count, leaving the curve unchanged at their position
+    true_positives = numpy.cumsum(matches & counted, axis=0)
+    false_positives = numpy.cumsum(~matches & counted, axis=0)
+    precision = true_positives / numpy.maximum(true_positives + false_positives, 1)
+    recall = true_positives / max(self._num_positives[name], 1)
+    return scores[order], precision, recall
+
+  # Get the average precision at every threshold from precision and recall curves of shape (detections, thresholds).
+  def _get_average_precision(self,precision,recall) -> numpy.ndarray:
+    num_thresholds = self.iou_thresholds.shape[0]
+    if not precision.shape[0]:
+      return numpy.zeros(num_thresholds)
+    # make precision monotonically decreasing, the best precision reachable at that recall or beyond
+    envelope = numpy.maximum.accumulate(precision[::-1], axis=0)[::-1]
+    if not self.ap_points:
+      steps = numpy.diff(numpy.vstack([numpy.zeros((1, num_thresholds)), recall]), axis=0)
+      return (steps * envelope).sum(axis=0)
+    points = numpy.linspace(0, 1, self.ap_points)
+    ap = numpy.zeros(num_thresholds)
+    for t in range(num_thresholds):
+      index = numpy.searchsorted(recall[:, t], points, side="left")
+      reached = index < recall.shape[0]
+      ap[t] = envelope[index[reached], t].sum() / self.ap_points
+    return ap
+
+def evaluate(ground_truth_path: str, results_path: str, fmt=None, iou_thresholds=None, classes=None, ap_points=eval_config.ap_points) -> dict:
+  """Evaluate the results saved by a run against ground truth.
+
+  :param ground_truth_path: Path to a COCO style JSON file, or a directory of VOC style XML files.
+  :type ground_truth_path: string
+  :param results_path: Path of the file, or directory for the "files" format, the run's results were written to.
+  :type results_path: string
+  :param fmt: Results format. Defaults to the format given by the results path.
+  :type fmt: string
+  :param iou_thresholds: IoU thresholds a detection must reach to match a ground truth box. Defaults to config.Evaluation.iou_thresholds.
+  :type iou_thresholds: List[float]
+  :param classes: Object classes to evaluate. Defaults to every class with ground truth boxes or detections.
+  :type classes: List[string]
+  :param ap_points: Number of evenly spaced recall points average precision is interpolated at. 0 computes the exact area.
+  :type ap_points: int
+  :rtype: dict
+  """
+  evaluator = Evaluator(GroundTruth.load(ground_truth_path), iou_thresholds, classes, ap_points)
+  evaluator.add_all(results.read_predictions(results_path, fmt))
+  return evaluator.get_results()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Evaluate the predictions of a comp_viz run against ground truth.")
+  parser.add_argument("--ground-truth", required=True, help="COCO style JSON file or directory of VOC style XML files")
+  parser.add_argument("--results", required=True, help="results file, or directory for the files format, of a run")
+  parser.add_argument("--format", choices=results.get_formats(), help="results format (default: from the results path)")
+  parser.add_argument("--iou-thresholds", nargs="+", type=float, help=f"IoU thresholds (default: {eval_config.iou_thresholds})")
+  parser.add_argument("--classes", nargs="+", help="object classes to evaluate (default: all)")
+  parser.add_argument("--ap-points", type=int, default=eval_config.ap_points, help="recall points AP is interpolated at, 0 for the exact area")
+  parser.add_argument("--output", help="path to write the JSON metrics to")
+  args = parser.parse_args(argv)
+  report = evaluate(args.ground_truth, args.results, args.format, args.iou_thresholds, args.classes, args.ap_points)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(json.dumps(report, indent=2))
+    print(f"Metrics saved to: {args.output}")
+  print(f"Images: {report['images']} ({report['unmatched_images']} without ground truth, {report['failed_images']} failed)")
+  print(f"mAP: {report['mAP']}")
+  for name, entry in report["classes"].items():
+    print(f"  {name}: AP {entry['ap']} ({entry['ground_truth']} boxes, {entry['detections']} detections)")
+  return 0
+
+# Get the name an image is looked up by in ground truth, its file name without extension.
+def _get_image_name(image: str) -> str:
+  return os.path.splitext(os.path.basename(str(image)))[0]
+
+if __name__ == "__main__":
+  sys.exit(main())
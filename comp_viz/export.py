@@ -0,0 +1,57 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+# Exporter writing each object detection network to a self-contained artifact (see
+# comp_viz.object_detection.Artifact) that object detection models load from instead of the gluoncv model zoo.
+# Each artifact is loaded back once exported, and the time taken to build the network with the model zoo is
+# reported next to the time taken to load it from the artifact. Randomly initialized networks can be exported
+# to check the round trip offline.
+# Usage:
+#   python -m comp_viz.export
+#   python -m comp_viz.export --networks yolo3_mobilenet1.0_coco --random --dir /tmp/artifacts
+
+import sys
+import time
+import argparse
+
+from . import utils
+from . import object_detection
+from .config import Artifact as artifact_config
+
+def run(networks=None,pretrained=True,artifact_dir=None) -> dict:
+  """Export networks to artifacts and load each artifact back.
+
+  :param networks: Networks to export. Defaults to every network in config.ObjectDetection.networks.
+  :type networks: List[string]
+  :param pretrained: Whether to export the pretrained weights of the networks, rather than random ones.
+  :type pretrained: boolean
+  :param artifact_dir: Directory to export to. Defaults to config.Artifact.dir.
+  :type artifact_dir: string
+  :return: Dict with an entry per network holding the "path" of its artifact and the seconds taken to build
+           the network with the model zoo ("build_s") and to load it from the artifact ("load_s").
+  :rtype: dict
+  """
+  report = {}
+  for network in networks or utils.ObjectDetection.get_networks():
+    start = time.time()
+    model = object_detection.Model(network, pretrained, artifact=False)
+    build_time = float(time.time() - start)
+    path = model.export(object_detection.Artifact.get_path(network, artifact_dir))
+    start = time.time()
+    object_detection.Model(network, pretrained, artifact=path)
+    load_time = float(time.time() - start)
+    report[network] = {"path": path, "build_s": round(build_time,4), "load_s": round(load_time,4)}
+  return report
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Export the comp_viz object detection networks to artifacts that load fast.")
+  parser.add_argument("--networks", nargs="+", choices=utils.ObjectDetection.get_networks(), help="networks to export (default: all)")
+  parser.add_argument("--random", action="store_true", help="export randomly initialized networks, which needs no download")
+  parser.add_argument("--dir", help=f"directory to export to (default: {artifact_config.dir})")
+  args = parser.parse_args(argv)
+  report = run(args.networks, not args.random, args.dir)
+  for network, result in report.items():
+    print(f"{network}: exported to {result['path']}, built in {result['build_s']} s, loaded in {result['load_s']} s")
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1 +1,9 @@
-from .model import *
\ No newline at end of file
+from .model import *
+from .detections import *
+from .registry import *
+from .pool import *
+from .cascade import *
+from .quantization import *
+from .tuning import *
+from .artifact import *
+from .video import *
\ No newline at end of file
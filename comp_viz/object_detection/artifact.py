@@ -0,0 +1,208 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import os
+import json
+import shutil
+
+from .. import utils
+from ..config import CompViz
+from ..config import Artifact as artifact_config
+
+mxnet = utils.lazy_import("mxnet")
+numpy = utils.lazy_import("numpy")
+
+# Version of the artifact layout, bumped whenever files written by an older version can no longer be loaded.
+artifact_format = 1
+
+# MXNet versions whose Parameter internals the zero copy loading of memory-mapped parameters relies on. Other
+# versions copy the parameters through the public API instead.
+_zero_copy_versions = ("1.6.", "1.7.", "1.8.", "1.9.")
+
+class Artifact:
+  """Utility class centered around exporting object detection networks to self-contained artifacts and loading
+  them back. An artifact is a directory holding the network's symbol graph, its parameters packed into one flat
+  file and a manifest with the object classes, preprocessing and parameter layout. Loading an artifact skips
+  rebuilding the network with the gluoncv model zoo and deserializing its parameters. On the CPU the parameters
+  are memory-mapped, so worker processes on one host share their pages.
+  """
+
+  def get_path(network_name: str, artifact_dir=None) -> str:
+    """Get the path of the artifact of a network.
+
+    :param network_name: Name of the network.
+    :type network_name: string
+    :param artifact_dir: Directory artifacts are exported to. Defaults to config.Artifact.dir.
+    :type artifact_dir: string
+    :rtype: string
+    """
+    return os.path.join(os.path.expanduser(artifact_dir or artifact_config.dir), network_name)
+
+  def find(network_name: str, pretrained=True, artifact_dir=None):
+    """Get the path of the artifact exported for a network, or None if there is none or it was exported with
+    other weights (pretrained or randomly initialized) than asked for.
+
+    :param network_name: Name of the network.
+    :type network_name: string
+    :param pretrained: Whether the artifact must hold the pretrained weights of the network.
+    :type pretrained: boolean
+    :param artifact_dir: Directory artifacts are exported to. Defaults to config.Artifact.dir.
+    :type artifact_dir: string
+    :rtype: string
+    """
+    path = Artifact.get_path(network_name, artifact_dir)
+    manifest_fname = Artifact._get_fnames(path)[0]
+    if not os.path.isfile(manifest_fname):
+      return None
+    manifest = Artifact.get_manifest(path)
+    if manifest.get("format") != artifact_format or manifest["pretrained"] != pretrained:
+      return None
+    return path
+
+  def get_manifest(path: str) -> dict:
+    """Get the manifest of an artifact.
+
+    :param path: Path of the artifact.
+    :type path: string
+    :return: Dict holding the "network" name, whether it is "pretrained", its object "classes", the
+             "preprocess" settings from get_preprocess() and the layout of its "params".
+    :rtype: dict
+    """
+    manifest_fname = Artifact._get_fnames(path)[0]
+    if not os.path.isfile(manifest_fname):
+      raise OSError(f"\"{path}\" is not an exported artifact.")
+    with open(manifest_fname) as f:
+      return json.load(f)
+
+  def get_preprocess(network_name: str, resolution: int) -> dict:
+    """Get the preprocessing settings of a network: the gluoncv transform preset images are prepared with, the
+    resolution of their short side, the maximum resolution of their long side and the normalization.
+
+    :param network_name: Name of the network.
+    :type network_name: string
+    :param resolution: Inference resolution of the network.
+    :type resolution: int
+    :rtype: dict
+    """
+    for transform in ["yolo", "rcnn", "ssd", "center_net"]:
+      if transform in network_name:
+        return {"transform": transform,
+                "resolution": resolution,
+                "max_size": 1000 if transform == "rcnn" else 1024,
+                "mean": [0.485, 0.456, 0.406],
+                "std": [0.229, 0.224, 0.225]}
+    raise ValueError(f"{network_name} is an invalid network.")
+
+  def export(net, network_name: str, classes: list, preprocess: dict, ctx, pretrained=True, path=None) -> str:
+    """Export a network to an artifact, replacing any artifact previously exported to path.
+
+    :param net: Network to export.
+    :type net: mxnet.gluon.HybridBlock
+    :param network_name: Name of the network.
+    :type network_name: string
+    :param classes: Object classes the network detects for, in class id order.
+    :type classes: List[string]
+    :param preprocess: Preprocessing settings of the network, see get_preprocess().
+    :type preprocess: dict
+    :param ctx: MXNet context the network runs on.
+    :type ctx: mxnet.Context
+    :param pretrained: Whether net holds the pretrained weights of the network, rather than random ones.
+    :type pretrained: boolean
+    :param path: Path of the artifact. Defaults to the network's path under config.Artifact.dir.
+    :type path: string
+    :return: Path the artifact was exported to.
+    :rtype: string
+    """
+    path = path or Artifact.get_path(network_name)
+    staging = f"{path}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    manifest_fname, symbol_fname, params_fname = Artifact._get_fnames(staging)
+    # trace the graph with one forward pass, then let MXNet write the symbol and a regular parameter file
+    net.hybridize()
+    net(mxnet.nd.zeros((1, 3, preprocess["resolution"], preprocess["resolution"]), ctx=ctx))
+    prefix = os.path.join(staging, "export")
+    net.export(prefix, epoch=0)
+    os.replace(f"{prefix}-symbol.json", symbol_fname)
+    params = mxnet.nd.load(f"{prefix}-0000.params")
+    os.remove(f"{prefix}-0000.params")
+    # pack the parameters back to back, each aligned for memory-mapped, zero copy loading
+    layout = []
+    offset = 0
+    with open(params_fname, "wb") as f:
+      for name in sorted(params):
+        array = numpy.ascontiguousarray(params[name].asnumpy())
+        padding = -offset % artifact_config.alignment
+        f.write(b"\0" * padding)
+        offset += padding
+        f.write(array.tobytes())
+        layout.append({"name": name.split(":", 1)[1],
+                       "dtype": array.dtype.str,
+                       "shape": list(array.shape),
+                       "offset": offset})
+        offset += array.nbytes
+    manifest = {"format": artifact_format,
+                "version": CompViz.version,
+                "network": network_name,
+                "pretrained": pretrained,
+                "classes": list(classes),
+                "preprocess": preprocess,
+                "params": layout}
+    with open(manifest_fname, "w") as f:
+      f.write(json.dumps(manifest,indent=2))
+    # swap the finished artifact in whole, so models starting meanwhile never load a partial one
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(staging, path)
+    return path
+
+  def load(path: str, ctx):
+    """Load the network of an artifact. Parameters are memory-mapped and used in place when the network runs
+    on the CPU with an MXNet version known to support it, and copied from the mapped file otherwise.
+
+    :param path: Path of the artifact.
+    :type path: string
+    :param ctx: MXNet contexts to load the network on.
+    :type ctx: List[mxnet.Context]
+    :return: A pair of values, the network and the manifest of the artifact.
+    :rtype: (mxnet.gluon.SymbolBlock, dict)
+    """
+    manifest = Artifact.get_manifest(path)
+    if manifest.get("format") != artifact_format:
+      raise ValueError(f"\"{path}\" is an artifact of unsupported format {manifest.get('format')}.")
+    _, symbol_fname, params_fname = Artifact._get_fnames(path)
+    net = mxnet.gluon.SymbolBlock(mxnet.sym.load(symbol_fname), mxnet.sym.var("data"))
+    params = net.collect_params()
+    params.setattr("grad_req", "null")
+    mapped = numpy.memmap(params_fname, dtype=numpy.uint8, mode="r")
+    missing = set(params.keys()) - {entry["name"] for entry in manifest["params"]}
+    if missing:
+      raise ValueError(f"\"{path}\" is missing parameters {sorted(missing)}.")
+    in_place = all(context.device_type == "cpu" for context in ctx)
+    for entry in manifest["params"]:
+      if entry["name"] not in params:
+        continue
+      dtype = numpy.dtype(entry["dtype"])
+      count = int(numpy.prod(entry["shape"]))
+      array = mapped[entry["offset"]:entry["offset"] + count * dtype.itemsize].view(dtype).reshape(entry["shape"])
+      Artifact._set_param(params[entry["name"]], array, ctx, in_place)
+    return net, manifest
+
+  # Get the manifest, symbol and parameter file paths of an artifact.
+  def _get_fnames(path: str) -> tuple:
+    return (os.path.join(path, "manifest.json"), os.path.join(path, "symbol.json"), os.path.join(path, "params.bin"))
+
+  # Give a parameter its values from a memory-mapped array, through the public initialize() and set_data(). In
+  # place, the parameter is then pointed at the mapped pages themselves, which are read-only and shared with every
+  # other process mapping the artifact. Gluon has no public way to adopt an array without copying it, so this swaps
+  # out the parameter's private data list, and is only done on the MXNet versions it was checked against.
+  def _set_param(param, array, ctx, in_place):
+    param.initialize(init=mxnet.init.Zero(), ctx=ctx, force_reinit=True)
+    if in_place and Artifact._can_zero_copy(param):
+      data = mxnet.nd.from_numpy(array, zero_copy=True)
+      param._data = [data for _ in ctx]
+    else:
+      param.set_data(mxnet.nd.array(array, dtype=array.dtype))
+
+  # Boolean function to determine if a parameter can be pointed at a memory-mapped array without copying it.
+  def _can_zero_copy(param) -> bool:
+    return mxnet.__version__.startswith(_zero_copy_versions) and isinstance(getattr(param, "_data", None), list)
@@ -0,0 +1,189 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import time
+import itertools
+
+from .. import utils
+from .model import Model
+from .detections import Detections
+from ..config import ObjectDetection as obj_det_config
+from ..config import Cascade as cascade_config
+
+numpy = utils.lazy_import("numpy")
+
+class Cascade:
+  """Cascade of object detection networks from fastest to most precise. Every image is predicted for by the
+  first network, and only images whose detections are uncertain are escalated to the next one: images with a
+  detection scoring within the stage's score band, or with no detection scoring above it. Each image gets one
+  prediction, from the last stage it reached, so easy images cost as much as the fast network and hard images
+  get the precision of the heavy one.
+
+  :param networks: Networks or already loaded models of the stages, from fastest to most precise. Defaults to
+                   config.Cascade.networks.
+  :type networks: List[string or Model]
+  :param score_bands: (low, high) confidence score band of each stage but the last. Images with a detection
+                      scoring within [low, high) are escalated. The last band is reused for stages past the end
+                      of the list. Defaults to config.Cascade.score_bands.
+  :type score_bands: List[Tuple]
+  :param escalate_empty: Whether images with no detection scoring at least the low end of the band are escalated.
+  :type escalate_empty: boolean
+  :ivar models: Models of the stages, from fastest to most precise.
+  :ivar score_bands: (low, high) confidence score band of each stage but the last.
+  :ivar escalate_empty: Whether images with no detection scoring at least the low end of the band are escalated.
+  :ivar _stats: Number of images each stage predicted for and escalated, and the seconds it took.
+  """
+
+  def __init__(self,networks=None,score_bands=None,escalate_empty=cascade_config.escalate_empty):
+    """Constructor method
+    """
+    networks = networks or cascade_config.networks
+    if len(networks) < 2:
+      raise ValueError(f"{networks} are too few networks for a cascade.")
+    score_bands = [tuple(band) for band in (score_bands or cascade_config.score_bands)]
+    if not score_bands or any(not 0 <= low <= high <= 1 for low, high in score_bands):
+      raise ValueError(f"{score_bands} are invalid score bands.")
+    self.models = [network if isinstance(network, Model) else Model(network) for network in networks]
+    self.score_bands = (score_bands + score_bands[-1:] * len(self.models))[:len(self.models) - 1]
+    self.escalate_empty = escalate_empty
+    self.reset_stats()
+
+  def get_prediction(self,fname,nms=0.,classes=None) -> dict:
+    """Get prediction made for an image by the cascade. Works like get_predictions().
+
+    :param fname: Path to an image file, encoded image file bytes, or an already decoded RGB image.
+    :type fname: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an
+                object in the image with a confidence value less than the nms value, it
+                will not include it in the returned results.
+    :type nms: float
+    :param classes: Object classes to detect for. Defaults to the classes set for the first stage's model.
+    :type classes: List
+    :rtype: dict
+    """
+    return self.get_predictions([fname],nms,classes=classes)[0]
+
+  def get_predictions(self,fnames: list,nms=0.,batch_size=None,classes=None) -> list:
+    """Get predictions made for many images by the cascade, in the same order as fnames. Works like
+    stream_predictions().
+
+    :param fnames: List of paths to image files, encoded image file bytes, or already decoded RGB images.
+    :type fnames: List
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an
+                object in the image with a confidence value less than the nms value, it
+                will not include it in the returned results.
+    :type nms: float
+    :param batch_size: Number of images predicted for together by the first stage. Defaults to the first stage's model's batch_size.
+    :type batch_size: int
+    :param classes: Object classes to detect for. Defaults to the classes set for the first stage's model.
+    :type classes: List
+    :rtype: List[dict]
+    """
+    return list(self.stream_predictions(fnames,nms,batch_size,classes))
+
+  def stream_predictions(self,fnames,nms=0.,batch_size=None,classes=None):
+    """Lazily get predictions made for many images by the cascade, in the same order as fnames. Images are
+    decoded once, in batches, and each stage runs the images still escalated through its network in one
+    forward pass. Besides the usual fields, each prediction dict holds the "stage" that produced it and the
+    networks it went through under "cascade". Its network is the network of that stage and its time covers
+    every stage it went through.
+
+    :param fnames: Iterable of paths to image files, encoded image file bytes, or already decoded RGB images.
+    :type fnames: Iterable
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an
+                object in the image with a confidence value less than the nms value, it
+                will not include it in the returned results.
+    :type nms: float
+    :param batch_size: Number of images predicted for together by the first stage. Defaults to the first stage's model's batch_size.
+    :type batch_size: int
+    :param classes: Object classes to detect for. Defaults to the classes set for the first stage's model.
+    :type classes: List
+    :rtype: Iterator[dict]
+    """
+    batch_size = batch_size or self.models[0].batch_size
+    if batch_size < 1:
+      raise ValueError(f"{batch_size} is an invalid batch size.")
+    classes = self.models[0]._resolve_classes(classes)
+    sources = iter(fnames)
+    while True:
+      batch = list(itertools.islice(sources, batch_size))
+      if not batch:
+        break
+      yield from self._predict_batch(batch,nms,classes,batch_size)
+
+  def get_stats(self) -> dict:
+    """Get stats on the images predicted for by the cascade since it was built or its stats were reset.
+
+    :return: Dict with the number of "images" predicted for, the share of them escalated past the first stage
+             ("escalation_rate"), and per stage the number of images it predicted for, produced the prediction
+             of and escalated, its escalation rate and the seconds it took.
+    :rtype: dict
+    """
+    images = self._stats[0]["images"]
+    stages = []
+    for model, stats in zip(self.models, self._stats):
+      stages.append(dict(stats,
+                         network=model.net_name,
+                         produced=stats["images"] - stats["escalated"],
+                         escalation_rate=round(stats["escalated"] / stats["images"], 4) if stats["images"] else 0.,
+                         seconds=round(stats["seconds"], 4)))
+    return {"images": images,
+            "escalation_rate": stages[0]["escalation_rate"],
+            "stages": stages}
+
+  def reset_stats(self):
+    """Reset the stats returned by get_stats().
+
+    :rtype: void
+    """
+    self._stats = [{"images": 0, "escalated": 0, "seconds": 0.} for _ in self.models]
+
+  # Get the predictions for a batch of images. Each image is decoded once, large enough for the stage with
+  # the highest inference resolution, and handed on to the next stage while its detections are uncertain.
+  def _predict_batch(self,sources: list,nms,classes,batch_size) -> list:
+    start = time.time()
+    loaded = [self._load_image(source) for source in sources]
+    elapsed = [float(time.time() - start) / len(sources)] * len(sources)
+    pending = list(range(len(sources)))
+    results = [None] * len(sources)
+    for stage, model in enumerate(self.models):
+      start = time.time()
+      detections = model._predict_batch([loaded[i][0] for i in pending],0.,classes,base_shapes=[loaded[i][1] for i in pending],batch_size=batch_size)
+      stage_time = float(time.time() - start)
+      self._stats[stage]["images"] += len(pending)
+      self._stats[stage]["seconds"] += stage_time
+      escalated = []
+      for i, dets in zip(pending, detections):
+        elapsed[i] += stage_time / len(pending)
+        results[i] = (stage, dets)
+        if stage < len(self.score_bands) and self._is_uncertain(dets, self.score_bands[stage]):
+          escalated.append(i)
+      self._stats[stage]["escalated"] += len(escalated)
+      pending = escalated
+      if not pending:
+        break
+    predictions = []
+    for source, (stage, dets), seconds in zip(sources, results, elapsed):
+      prediction = self.models[stage]._build_prediction(source,dets.threshold(nms) if nms != 0 else dets,nms,seconds,classes)
+      prediction["stage"] = stage
+      prediction["cascade"] = [model.net_name for model in self.models[:stage + 1]]
+      predictions.append(prediction)
+    return predictions
+
+  # Decode an image, returning it along with its shape at full resolution. Large JPEG images are decoded at
+  # reduced resolution, just large enough for the stage with the highest inference resolution, unless a
+  # stage predicts for tiles of the full resolution image.
+  def _load_image(self,source) -> tuple:
+    if not obj_det_config.reduced_decode or any(model.is_tiled() for model in self.models):
+      base_img = utils.Tools.load_image(source)
+      return base_img, base_img.shape
+    return utils.Tools.load_reduced_image(source, max(model.inference_resolution for model in self.models))
+
+  # Boolean function to determine if detections are uncertain enough to escalate their image to the next stage:
+  # a detection scores within the score band, or no detection scores at least the low end of it.
+  def _is_uncertain(self,detections: Detections,band: tuple) -> bool:
+    low, high = band
+    scores = detections.scores
+    if bool(numpy.any((scores >= low) & (scores < high))):
+      return True
+    return self.escalate_empty and not bool(numpy.any(scores >= low))
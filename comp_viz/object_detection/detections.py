@@ -0,0 +1,174 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import json
+
+from .. import utils
+
+numpy = utils.lazy_import("numpy")
+
+class Detections:
+  """Object detections made by a computer vision model for a single image, backed by numpy arrays.
+
+  :param class_ids: Class id of each detection.
+  :type class_ids: numpy.ndarray or List[int]
+  :param scores: Confidence score of each detection.
+  :type scores: numpy.ndarray or List[float]
+  :param bboxes: Bounding boxes of form [[x_min,y_min,x_max,y_max],...], one row per detection.
+  :type bboxes: numpy.ndarray or List[List]
+  :ivar class_ids: Array of shape (N,) holding the class id of each detection.
+  :ivar scores: Array of shape (N,) holding the confidence score of each detection.
+  :ivar bboxes: Array of shape (N,4) holding the bounding box of each detection.
+  """
+  __slots__ = ("class_ids", "scores", "bboxes")
+
+  def __init__(self,class_ids,scores,bboxes):
+    """Constructor method
+    """
+    self.class_ids = numpy.asarray(class_ids, dtype=numpy.int64).reshape(-1)
+    self.scores = numpy.asarray(scores, dtype=numpy.float32).reshape(-1)
+    self.bboxes = numpy.asarray(bboxes, dtype=numpy.float32).reshape(-1, 4)
+
+  @classmethod
+  def from_network_output(cls,pred) -> list:
+    """Build detections for every image of a batched network output. Each output tensor is
+    transferred to host memory once for the whole batch, and padding rows (class id of -1) are masked out.
+
+    :param pred: Network output of the form (class ids, confidence scores, bounding boxes), each with a leading batch axis.
+    :type pred: Tuple[mxnet.ndarray.ndarray.NDArray]
+    :rtype: List[Detections]
+    """
+    cids = pred[0].asnumpy()
+    scores = pred[1].asnumpy()
+    bboxes = pred[2].asnumpy()
+    detections = []
+    for i in range(cids.shape[0]):
+      mask = cids[i, :, 0] != -1
+      detections.append(cls(cids[i, mask, 0], scores[i, mask, 0], bboxes[i, mask]))
+    return detections
+
+  @classmethod
+  def concatenate(cls,detections: list):
+    """Get one set of detections holding every detection of several sets, in order.
+
+    :param detections: Sets of detections to join.
+    :type detections: List[Detections]
+    :rtype: Detections
+    """
+    if not detections:
+      return cls([], [], [])
+    return cls(numpy.concatenate([dets.class_ids for dets in detections]),
+               numpy.concatenate([dets.scores for dets in detections]),
+               numpy.concatenate([dets.bboxes for dets in detections]))
+
+  def __len__(self):
+    return self.class_ids.shape[0]
+
+  def __repr__(self):
+    return f"Detections(count={len(self)})"
+
+  def select(self,index):
+    """Get a new set of detections holding only the detections picked by a boolean mask or index array.
+
+    :param index: Boolean mask of shape (N,) or array of integer indices.
+    :type index: numpy.ndarray
+    :rtype: Detections
+    """
+    return Detections(self.class_ids[index], self.scores[index], self.bboxes[index])
+
+  def threshold(self,min_score: float):
+    """Get a new set of detections without the detections whose confidence score is less than min_score.
+
+    :param min_score: Minimum confidence score for a detection to be kept.
+    :type min_score: float
+    :rtype: Detections
+    """
+    return self.select(self.scores >= min_score)
+
+  def suppress(self,iou_thresh: float,top_k=0,soft=False,sigma=0.5):
+    """Get a new set of detections after class-aware non-maximal suppression, in descending score order. A
+    detection is suppressed when it overlaps a higher scoring kept detection of the same class by more than
+    iou_thresh. Greedy suppression is computed exactly from one IoU matrix of every pair of detections,
+    repeating a vectorized pass over it until the kept set stops changing, which takes a few passes as only
+    chains of overlapping boxes need more than one.
+
+    :param iou_thresh: Intersection over union above which the lower scoring of two detections of the same class is suppressed. Unused by soft-NMS.
+    :type iou_thresh: float
+    :param top_k: Maximum number of detections kept. 0 keeps every detection that is not suppressed.
+    :type top_k: int
+    :param soft: Whether to decay the confidence scores of overlapping detections rather than dropping them
+                 (Gaussian soft-NMS, computed in a single pass as in Matrix NMS). Detections are then dropped
+                 by score thresholding afterwards rather than here.
+    :type soft: boolean
+    :param sigma: Spread of the Gaussian decay of soft-NMS. Smaller values decay overlapping scores faster.
+    :type sigma: float
+    :rtype: Detections
+    """
+    order = numpy.argsort(-self.scores, kind="stable")
+    detections = self.select(order)
+    if len(detections) > 1:
+      iou = utils.ObjectDetection.get_iou_matrix(detections.bboxes, detections.bboxes)
+      # only count overlaps with a higher scoring detection of the same class
+      iou *= detections.class_ids[:, None] == detections.class_ids[None, :]
+      iou = numpy.triu(iou, k=1)
+      if soft:
+        # each detection decays by its overlap with every higher scoring one, compensated by how much
+        # that one was itself overlapped
+        compensation = iou.max(axis=0)
+        decay = numpy.exp(-(iou ** 2 - compensation[:, None] ** 2) / sigma).min(axis=0)
+        scores = detections.scores * decay.astype(numpy.float32)
+        order = numpy.argsort(-scores, kind="stable")
+        detections = Detections(detections.class_ids, scores, detections.bboxes).select(order)
+      else:
+        overlaps = iou > iou_thresh
+        keep = numpy.ones(len(detections), dtype=bool)
+        while True:
+          updated = ~(overlaps & keep[:, None]).any(axis=0)
+          if (updated == keep).all():
+            break
+          keep = updated
+        detections = detections.select(keep)
+    if top_k and len(detections) > top_k:
+      detections = detections.select(slice(0, top_k))
+    return detections
+
+  def rescale(self,orig: tuple, dest: tuple):
+    """Get a new set of detections with the bounding boxes resized from the orig image resolution to the dest image resolution.
+
+    :param orig: Original image resolution of form (height, width, shape). Ex. (500,800,3)
+    :type orig: Tuple or ndarray.shape
+    :param dest: Image to resize resolution of form (height, width, shape). Ex. (600,900,3)
+    :type dest: Tuple or ndarray.shape
+    :rtype: Detections
+    """
+    return Detections(self.class_ids, self.scores, utils.ObjectDetection.resize_bboxes(self.bboxes,orig,dest))
+
+  def translate(self,x: float,y: float):
+    """Get a new set of detections with the bounding boxes shifted by x pixels to the right and y pixels down,
+    such as from the coordinates of a crop of an image to the coordinates of the whole image.
+
+    :param x: Horizontal shift in pixels.
+    :type x: float
+    :param y: Vertical shift in pixels.
+    :type y: float
+    :rtype: Detections
+    """
+    return Detections(self.class_ids, self.scores, self.bboxes + numpy.array([x, y, x, y], dtype=numpy.float32))
+
+  def to_dict(self) -> dict:
+    """Get the detections in the form of plain python lists, as used in the prediction dict.
+
+    :rtype: dict
+    """
+    detections = {}
+    detections['class_ids'] = self.class_ids.tolist()
+    detections['confidence_scores'] = numpy.round(self.scores.astype(numpy.float64),3).tolist()
+    detections['bounding_boxes'] = self.bboxes.astype(numpy.float64).tolist()
+    return detections
+
+  def to_json(self,**kwargs) -> str:
+    """Get the detections serialized as a JSON string. Keyword arguments are passed to json.dumps.
+
+    :rtype: string
+    """
+    return json.dumps(self.to_dict(),**kwargs)
@@ -1,18 +1,56 @@
 # Author(s): Lucas Hirt
 # Date Modified: 11/27/2022
 
-import mxnet
-import gluoncv
-import numpy
+from __future__ import annotations
+
+import os
 import time
+import itertools
+import functools
+import collections
+import concurrent.futures
 
 from .. import utils
+from .detections import Detections
+from .video import VideoReader
+from ..results import PredictionCache
+from .quantization import Quantization
+from .tuning import TunedProfile
+from .artifact import Artifact
+from ..config import ObjectDetection as obj_det_config
+from ..config import Quantization as quant_config
+
+mxnet = utils.lazy_import("mxnet")
+numpy = utils.lazy_import("numpy")
+gluoncv = utils.lazy_import("gluoncv")
+
+# MXNet contexts new models run on, probed the first time a model is built unless set with set_context().
+_ctx = None
+
+def get_context() -> list:
+  """Get the MXNet contexts new models run on. The first call probes for a GPU, falling back to the CPU,
+  unless contexts were chosen with set_context().
+
+  :rtype: List[mxnet.Context]
+  """
+  global _ctx
+  if _ctx is None:
+    try:
+      mxnet.nd.zeros((1,), ctx=mxnet.gpu()).wait_to_read()
+      _ctx = [mxnet.gpu()]
+    except Exception:
+      _ctx = [mxnet.cpu()]
+  return _ctx
+
+def set_context(ctx):
+  """Choose the MXNet contexts new models run on, skipping the GPU probe. Models already built keep their contexts.
 
-try:
-    a = mxnet.nd.zeros((1,), ctx=mxnet.gpu())
-    ctx = [mxnet.gpu()]
-except:
-    ctx = [mxnet.cpu()]
+  :param ctx: MXNet context, or list of contexts. Ex. mxnet.cpu()
+  :type ctx: mxnet.Context or List[mxnet.Context]
+  :rtype: void
+  """
+  global _ctx
+  _ctx = list(ctx) if isinstance(ctx, (list, tuple)) else [ctx]
 
 class Model:
   """Computer vision object detection model.
@@ -20,23 +58,73 @@ class Model:
   :param network_name: A string representing the computer vision network that will be used
                        for detection.
   :type network_name: string
+  :param pretrained: Whether to load the pretrained weights of the network. If False the network is
+                     randomly initialized, which needs no download and is useful for offline benchmarks.
+  :type pretrained: boolean
+  :param artifact: Path of an artifact exported with export() to load the network from, instead of building it with the
+                   gluoncv model zoo. Defaults to the artifact exported for the network under config.Artifact.dir, if
+                   it holds the weights asked for with pretrained. False always builds the network with the model zoo.
+  :type artifact: string
   :ivar net_name: Holds the string literal for the chosen computer vision network.
+  :ivar ctx: MXNet contexts the network runs on, from get_context() when the model was built.
   :ivar net: Holds the crucial mxnet-gluoncv instantiated computer vision model for which
              our package aims to provides a layer of abstraction over.
-  :ivar inference_resolution: Stores the resolution of images we are to perform inference on.
+  :ivar inference_resolution: Stores the resolution of images we are to perform inference on. Loaded from the
+                              tuned profile of the current machine if the network has been tuned, see TunedProfile.
+  :ivar batch_size: Default batch size of the batched prediction methods, loaded from the tuned profile like inference_resolution.
+  :ivar artifact: Path of the artifact the network was loaded from, or None if it was built with the gluoncv model zoo.
+  :ivar tuned: Operating point of the network in the tuned profile of the current machine, or None if it has not been tuned.
   :ivar _default_object_classes: Stores the default object classes that come with chosen network:
+  :ivar _preprocess: Preprocessing settings of the network, see Artifact.get_preprocess().
+  :ivar _pretrained: Whether the network holds its pretrained weights rather than random ones.
+  :ivar _classes: Stores the object classes currently detected for, as a tuple.
+  :ivar _compiled: Whether the network runs as a hybridized static graph.
+  :ivar _tiling: (tile_size, overlap, full_image) settings of tiled inference, or None if images are predicted for whole.
+  :ivar _buckets: Input shape buckets set for the compiled network, or None to derive them from the inference resolution.
+  :ivar _float_net: Holds the FP32 network while net holds its INT8 quantized version, otherwise None.
+  :ivar _quant_key: Name the INT8 quantized network is cached under, identifying its calibration, or None.
+  :ivar _cache: Prediction cache consulted before predicting for an image, or None.
   """
 
-  def __init__(self,network_name):
+  def __init__(self,network_name,pretrained=True,artifact=None):
     """Constructor method
     """
-    print(ctx)
     if network_name not in utils.ObjectDetection.get_networks():
       raise ValueError(f"{network_name} is an invalid network.")
     self.net_name = network_name
-    self.net = gluoncv.model_zoo.get_model(network_name, pretrained=True, ctx=ctx)
-    self.inference_resolution = utils.ObjectDetection.get_network_resolution(network_name)
-    self._default_object_classes = gluoncv.model_zoo.get_model(network_name, pretrained=True).classes
+    self.ctx = get_context()
+    self.artifact = Artifact.find(network_name, pretrained) if artifact is None else (artifact or None)
+    if self.artifact is not None:
+      self.net, manifest = Artifact.load(self.artifact, self.ctx)
+      if manifest["network"] != network_name:
+        raise ValueError(f"\"{self.artifact}\" is an artifact of {manifest['network']}, not {network_name}.")
+      self._preprocess = manifest["preprocess"]
+      self._default_object_classes = list(manifest["classes"])
+      self._pretrained = manifest["pretrained"]
+    else:
+      if pretrained:
+        self.net = gluoncv.model_zoo.get_model(network_name, pretrained=True, ctx=self.ctx)
+      else:
+        self.net = gluoncv.model_zoo.get_model(network_name, pretrained=False, pretrained_base=False, ctx=self.ctx)
+        self.net.initialize(ctx=self.ctx)
+      self._preprocess = Artifact.get_preprocess(network_name, utils.ObjectDetection.get_network_resolution(network_name))
+      self._default_object_classes = list(self.net.classes)
+      self._pretrained = pretrained
+    self.tuned = TunedProfile.get(network_name)
+    if self.tuned is not None:
+      self.inference_resolution = self.tuned["resolution"]
+      self.batch_size = self.tuned["batch_size"]
+    else:
+      self.inference_resolution = self._preprocess["resolution"]
+      self.batch_size = 8
+    self._classes = tuple(self._default_object_classes)
+    self._compiled = False
+    self._buckets = None
+    self._tiling = None
+    self._float_net = None
+    self._quant_key = None
+    self._cache = None
+    self._suppression = (obj_det_config.nms_iou, obj_det_config.nms_top_k, obj_det_config.soft_nms)
     print("Model successfully initialized.")
 
   def list_classes(self):
@@ -53,58 +141,273 @@ class Model:
     """
     return (self._get_classes())
 
-  def get_prediction(self,fname,nms=0.) -> dict:
+  def get_default_classes(self):
+    """Get list of every object class the network can detect for, whichever classes are set with set_classes().
+
+    :rtype: List
+    """
+    return list(self._default_object_classes)
+
+  def get_prediction(self,fname,nms=0.,classes=None,nms_iou=None) -> dict:
     """Get prediction made for an image by computer vision model.
     
-    :param fname: Path to an image file.
-    :type fname: string
+    :param fname: Path to an image file, encoded image file bytes, or an already decoded RGB image.
+    :type fname: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
     :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
                 object in the image with a confidence value less than the nms value, it 
                 will not include it in the returned results. 
     :type nms: float
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :param nms_iou: Intersection over union above which overlapping detections of the same class are suppressed
+                    in this call only. 0 disables suppression. Defaults to the threshold set with set_nms().
+    :type nms_iou: float
     :rtype: dict            
     """
-    utils.Tools.verify_exists(fname)
+    classes = self._resolve_classes(classes)
+    suppression = self._resolve_suppression(nms_iou)
     start = time.time()
-    cids, scores, bboxes = self._predict(fname,nms)
+    base_img, base_shape, key, cached = self._load_cached(fname,nms,classes,suppression=suppression)
+    if cached is not None:
+      return cached
+    detections = self._predict(base_img,nms,classes,suppression,base_shape)
     end = time.time()
-    prediction = {}
-    prediction["image"] = str(fname)
-    prediction['class_ids'] = cids
-    prediction['confidence_scores'] = scores
-    prediction['bounding_boxes'] = bboxes
-    prediction['nms_thresh'] = nms
-    prediction['class_map'] = {cid: self.get_classes()[cid] for cid in set(cids)}
-    prediction['time'] = round(float(end - start),4)
-    prediction['network'] = self.net_name
-    prediction['resolution'] = self.inference_resolution
+    prediction = self._build_prediction(fname,detections,nms,float(end - start),classes)
+    self._cache_prediction(key,prediction)
     return prediction
 
-  def get_image_prediction(self,fname,nms=0.):
+  def get_detections(self,fname,nms=0.,classes=None,nms_iou=None) -> Detections:
+    """Get the array backed detections made for an image by computer vision model, without
+    converting them to the prediction dict.
+
+    :param fname: Path to an image file, encoded image file bytes, or an already decoded RGB image.
+    :type fname: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
+                object in the image with a confidence value less than the nms value, it 
+                will not include it in the returned results. 
+    :type nms: float
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :param nms_iou: Intersection over union above which overlapping detections of the same class are suppressed
+                    in this call only. 0 disables suppression. Defaults to the threshold set with set_nms().
+    :type nms_iou: float
+    :rtype: Detections
+    """
+    base_img, base_shape = self._load_image(fname)
+    return self._predict(base_img,nms,self._resolve_classes(classes),self._resolve_suppression(nms_iou),base_shape)
+
+  def get_predictions(self,fnames: list,nms=0.,batch_size=None,classes=None,nms_iou=None) -> list:
+    """Get predictions made for many images by computer vision model, running the images through the
+    network in batches rather than one at a time.
+
+    :param fnames: List of paths to image files, encoded image file bytes, or already decoded RGB images.
+    :type fnames: List
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
+                object in the image with a confidence value less than the nms value, it 
+                will not include it in the returned results. 
+    :type nms: float
+    :param batch_size: Number of images stacked into a single forward pass of the network. Defaults to the model's batch_size.
+    :type batch_size: int
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :param nms_iou: Intersection over union above which overlapping detections of the same class are suppressed
+                    in this call only. 0 disables suppression. Defaults to the threshold set with set_nms().
+    :type nms_iou: float
+    :return: List of prediction dicts, in the same order as fnames. The time of each prediction is
+             its share of the time taken for the batch it was part of.
+    :rtype: List[dict]
+    """
+    if batch_size is None:
+      batch_size = self.batch_size
+    if batch_size < 1:
+      raise ValueError(f"{batch_size} is an invalid batch size.")
+    classes = self._resolve_classes(classes)
+    suppression = self._resolve_suppression(nms_iou)
+    for fname in fnames:
+      if utils.Tools.is_path(fname):
+        utils.Tools.verify_exists(fname)
+    predictions = []
+    for i in range(0, len(fnames), batch_size):
+      batch_fnames = fnames[i:i + batch_size]
+      start = time.time()
+      loaded = [self._load_cached(fname,nms,classes,verify=False,suppression=suppression) for fname in batch_fnames]
+      misses = [(base_img, base_shape) for base_img, base_shape, _, cached in loaded if cached is None]
+      results = iter(self._predict_batch([base_img for base_img, _ in misses],nms,classes,suppression,[base_shape for _, base_shape in misses],batch_size) if misses else [])
+      end = time.time()
+      batch_time = float(end - start) / max(len(misses), 1)
+      for fname, (_, _, key, cached) in zip(batch_fnames, loaded):
+        if cached is not None:
+          predictions.append(cached)
+          continue
+        prediction = self._build_prediction(fname,next(results),nms,batch_time,classes)
+        self._cache_prediction(key,prediction)
+        predictions.append(prediction)
+    return predictions
+
+  def stream_predictions(self,fnames,nms=0.,batch_size=None,prefetch=16,workers=4,classes=None,nms_iou=None):
+    """Lazily get predictions made for many images by computer vision model. Upcoming images are decoded
+    and prepared on a pool of threads while the current batch runs through the network, and predictions
+    are yielded in the same order as fnames.
+
+    :param fnames: Iterable of paths to image files, encoded image file bytes, or already decoded RGB images.
+    :type fnames: Iterable
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
+                object in the image with a confidence value less than the nms value, it 
+                will not include it in the returned results. 
+    :type nms: float
+    :param batch_size: Number of images stacked into a single forward pass of the network. Defaults to the model's batch_size.
+    :type batch_size: int
+    :param prefetch: Maximum number of images decoded and prepared ahead of the network. Raised to batch_size if smaller.
+    :type prefetch: int
+    :param workers: Number of threads decoding and preparing images.
+    :type workers: int
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :param nms_iou: Intersection over union above which overlapping detections of the same class are suppressed
+                    in this call only. 0 disables suppression. Defaults to the threshold set with set_nms().
+    :type nms_iou: float
+    :rtype: Iterator[dict]
+    """
+    for _, prediction in self._stream(fnames,nms,batch_size,prefetch,workers,classes,nms_iou,False):
+      yield prediction
+
+  def stream_image_predictions(self,fnames,nms=0.,batch_size=None,prefetch=16,workers=4,classes=None,nms_iou=None):
+    """Lazily get predictions made for many images by computer vision model along with the decoded images,
+    for drawing bounding boxes without decoding the images again. Works like stream_predictions().
+
+    :param fnames: Iterable of paths to image files, encoded image file bytes, or already decoded RGB images.
+    :type fnames: Iterable
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
+                object in the image with a confidence value less than the nms value, it 
+                will not include it in the returned results. 
+    :type nms: float
+    :param batch_size: Number of images stacked into a single forward pass of the network. Defaults to the model's batch_size.
+    :type batch_size: int
+    :param prefetch: Maximum number of images decoded and prepared ahead of the network. Raised to batch_size if smaller.
+    :type prefetch: int
+    :param workers: Number of threads decoding and preparing images.
+    :type workers: int
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :param nms_iou: Intersection over union above which overlapping detections of the same class are suppressed
+                    in this call only. 0 disables suppression. Defaults to the threshold set with set_nms().
+    :type nms_iou: float
+    :return: Iterator of pairs of values, the decoded RGB image and the prediction dict.
+    :rtype: Iterator[(mxnet.ndarray.ndarray.NDArray, dict)]
+    """
+    return self._stream(fnames,nms,batch_size,prefetch,workers,classes,nms_iou,True)
+
+  def stream_video_predictions(self,source,nms=0.,batch_size=1,stride=1,realtime=False,classes=None):
+    """Lazily get predictions made for the frames of a video by computer vision model. Frames are decoded on
+    a background thread while the network runs. Each prediction dict also holds the "frame" index and the
+    "timestamp_ms" of its frame.
+
+    :param source: Path or URL of a video, or index of a camera device.
+    :type source: string or int
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
+                object in the image with a confidence value less than the nms value, it 
+                will not include it in the returned results. 
+    :type nms: float
+    :param batch_size: Number of frames stacked into a single forward pass of the network.
+    :type batch_size: int
+    :param stride: Only every stride-th frame is decoded and predicted for.
+    :type stride: int
+    :param realtime: Whether to drop frames that went stale while the network was busy, so predictions keep up
+                     with a live stream. Otherwise every strided frame is predicted for.
+    :type realtime: boolean
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :rtype: Iterator[dict]
+    """
+    for _, prediction in self._stream_video(source,nms,batch_size,stride,realtime,classes,None):
+      yield prediction
+
+  def predict_video(self,source,writer,nms=0.,batch_size=1,stride=1,realtime=False,classes=None) -> dict:
+    """Predict for the frames of a video, handing each frame's prediction dict to a results writer, and get
+    a report of how many frames were predicted for and how fast.
+
+    :param source: Path or URL of a video, or index of a camera device.
+    :type source: string or int
+    :param writer: Results writer the predictions are written to, see comp_viz.results.get_writer().
+    :type writer: comp_viz.results.ResultsWriter
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
+                object in the image with a confidence value less than the nms value, it 
+                will not include it in the returned results. 
+    :type nms: float
+    :param batch_size: Number of frames stacked into a single forward pass of the network.
+    :type batch_size: int
+    :param stride: Only every stride-th frame is decoded and predicted for.
+    :type stride: int
+    :param realtime: Whether to drop frames that went stale while the network was busy, so predictions keep up
+                     with a live stream. Otherwise every strided frame is predicted for.
+    :type realtime: boolean
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :return: Dict with the number of frames predicted for and dropped, the seconds taken, the frames per
+             second predicted for, and the frame rate of the video.
+    :rtype: dict
+    """
+    report = {}
+    start = time.time()
+    frames = 0
+    for prediction in self._stream_video(source,nms,batch_size,stride,realtime,classes,report):
+      writer.write(prediction[1])
+      frames += 1
+    seconds = float(time.time() - start)
+    report["frames"] = frames
+    report["seconds"] = round(seconds,4)
+    report["fps"] = round(frames / seconds,2) if seconds > 0 else 0.
+    return report
+
+  def get_image_prediction(self,fname,nms=0.,classes=None,nms_iou=None):
     """Get image with the bounding box detections and the prediction made by the computer vision model.
     
-    :param fname: Path to an image file.
-    :type fname: string
+    :param fname: Path to an image file, encoded image file bytes, or an already decoded RGB image.
+    :type fname: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
     :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
                 object in the image with a confidence value less than the nms value, it 
                 will not include it in the returned results.
     :type nms: float
+    :param classes: Object classes to detect for in this call only, without changing the classes set for
+                    the model. Defaults to the classes set with set_classes().
+    :type classes: List
+    :param nms_iou: Intersection over union above which overlapping detections of the same class are suppressed
+                    in this call only. 0 disables suppression. Defaults to the threshold set with set_nms().
+    :type nms_iou: float
     :return: A pair of values, an image in the form of a numpy array, and the prediction dict.
     :rtype: (numpy.array, dict)
     """
-    pred = self.get_prediction(fname,nms)
-    pred_img = utils.ObjectDetection.get_pred_bboxes_image(fname,
-                                                           pred["bounding_boxes"],
-                                                           pred["class_ids"],
-                                                           [val for val in pred["class_map"].values()],
-                                                           pred["confidence_scores"])
+    classes = self._resolve_classes(classes)
+    suppression = self._resolve_suppression(nms_iou)
+    start = time.time()
+    base_img, _, key, pred = self._load_cached(fname,nms,classes,need_image=True,suppression=suppression)
+    if pred is not None:
+      detections = Detections(pred["class_ids"], pred["confidence_scores"], pred["bounding_boxes"])
+    else:
+      detections = self._predict(base_img,nms,classes,suppression)
+      end = time.time()
+      pred = self._build_prediction(fname,detections,nms,float(end - start),classes)
+      self._cache_prediction(key,pred)
+    # draw onto the frame that was already decoded for the prediction instead of reading the file again
+    pred_img = utils.ObjectDetection.get_pred_bboxes_image(base_img,
+                                                           detections.bboxes,
+                                                           detections.class_ids,
+                                                           list(classes),
+                                                           detections.scores)
     return pred_img, pred
 
   def show_image_prediction(self,fname,nms=0.):
     """Print image with the bounding box detections and the prediction made by the computer vision model.
     
-    :param fname: Path to an image file.
-    :type fname: string
+    :param fname: Path to an image file, encoded image file bytes, or an already decoded RGB image.
+    :type fname: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
     :param nms: Stands for non-maximal suppresion. If computer vision model detects and an 
                 object in the image with a confidence value less than the nms value, it 
                 will not include it in the returned results.
@@ -117,18 +420,13 @@ class Model:
 
   def set_classes(self,object_classes: list):
     """Change the object classes that the computer vision model is detecting for in images. Ensures validity by referencing the original list of available object classes when model was first instantiatied.
+    The network itself is left unchanged; detections of other classes are filtered out of its results, so changing classes is free.
     
     :param object_classes: List of new object classes to detect for. Ex. "person", "bicycle", "banana".
     :type object_classes: List
     :rtype: void
     """
-    unsupported = []
-    for obj_class in object_classes:
-      if obj_class not in self._default_object_classes:
-        unsupported.append(obj_class)
-    if unsupported:    
-      raise ValueError(f"Object class(es) \"{unsupported}\" are not supported for object detection.")
-    self.net.reset_class(object_classes, reuse_weights=object_classes)
+    self._classes = self._resolve_classes(object_classes)
     print(f"Complete. Model set to detect for object classes: {self.get_classes()}.")
 
   def reset_classes(self):
@@ -136,7 +434,7 @@ class Model:
 
     :rtype: void
     """
-    self.net.reset_class(self._default_object_classes,reuse_weights=self._default_object_classes)
+    self._classes = tuple(self._default_object_classes)
     print("Object classes for detection restored to defaults.")
 
   def set_inference_resolution(self,res):
@@ -150,85 +448,585 @@ class Model:
       raise ValueError(f"{res} is too small or too large of value.")
     self._set_inference_resolution(res)
 
+  def set_nms(self,iou_thresh=obj_det_config.nms_iou,top_k=obj_det_config.nms_top_k,soft=obj_det_config.soft_nms):
+    """Alter the non-maximal suppression applied to the detections of every image, which removes duplicate
+    detections of the same object. Applied after dropping detections of other classes and before dropping
+    detections with a confidence score less than the nms value passed to the prediction methods.
+
+    :param iou_thresh: Intersection over union above which the lower scoring of two overlapping detections of
+                       the same class is suppressed. 0 disables non-maximal suppression.
+    :type iou_thresh: float
+    :param top_k: Maximum number of detections kept per image. 0 means no limit.
+    :type top_k: int
+    :param soft: Whether to decay the confidence scores of overlapping detections rather than dropping them.
+    :type soft: boolean
+    :rtype: void
+    """
+    if not 0 <= iou_thresh <= 1:
+      raise ValueError(f"{iou_thresh} is an invalid IoU threshold.")
+    if top_k < 0:
+      raise ValueError(f"{top_k} is an invalid number of detections.")
+    self._suppression = (iou_thresh, top_k, soft)
+
+  def reset_nms(self):
+    """Restore the non-maximal suppression to the defaults in config.ObjectDetection.
+
+    :rtype: void
+    """
+    self._suppression = (obj_det_config.nms_iou, obj_det_config.nms_top_k, obj_det_config.soft_nms)
+
+  def set_compiled(self,buckets=None):
+    """Run the network as a hybridized graph with static memory allocation and static input shapes. Images
+    are letterboxed into a small set of input shape buckets so the cached graphs are reused across images.
+
+    :param buckets: List of (height, width) input shapes. Defaults to buckets derived from the inference
+                    resolution, see utils.ObjectDetection.get_shape_buckets().
+    :type buckets: List[Tuple]
+    :rtype: void
+    """
+    if buckets is not None:
+      if not buckets or any(height < 1 or width < 1 for height, width in buckets):
+        raise ValueError(f"{buckets} are invalid shape buckets.")
+      buckets = sorted({(int(height), int(width)) for height, width in buckets}, key=lambda bucket: (bucket[0] * bucket[1], bucket))
+    self._buckets = buckets
+    self._compiled = True
+    self._hybridize(self.net)
+    print(f"Model compiled with shape buckets: {self._get_buckets()}.")
+
+  def reset_compiled(self):
+    """Run the network imperatively again, as it is run by default.
+
+    :rtype: void
+    """
+    self._compiled = False
+    self._buckets = None
+    self._hybridize(self.net)
+    print("Model restored to imperative execution.")
+
+  def is_compiled(self) -> bool:
+    """Boolean function to determine if the network runs as a hybridized static graph.
+
+    :rtype: boolean
+    """
+    return self._compiled
+
+  def export(self,path=None) -> str:
+    """Export the network to a self-contained artifact holding its symbol graph, its parameters in a
+    memory-mappable layout, its object classes and its preprocessing at the CURRENT inference resolution.
+    Models of the network load from the artifact from then on, which starts them much faster, see Artifact.
+    A quantized model exports its FP32 network.
+
+    :param path: Path of the artifact. Defaults to the network's path under config.Artifact.dir.
+    :type path: string
+    :return: Path the artifact was exported to.
+    :rtype: string
+    """
+    net = self._float_net or self.net
+    preprocess = dict(self._preprocess, resolution=self.inference_resolution)
+    path = Artifact.export(net, self.net_name, self._default_object_classes, preprocess, self.ctx[0], self._pretrained, path)
+    # exporting hybridizes the network, so restore how it was run before
+    self._hybridize(net)
+    print(f"Model exported to: {path}")
+    return path
+
+  def set_tiled(self,tile_size=None,overlap=obj_det_config.tile_overlap,full_image=True):
+    """Predict for images as overlapping square tiles, so small objects in very large images, such as aerial
+    and panorama images, are not lost to shrinking the whole image down to the inference resolution. Images
+    are decoded at full resolution and cut into tiles, the tiles of every image in a call run through the
+    network in batches of the call's batch size, and the detections of all tiles are mapped back to image
+    coordinates and merged across tile seams with non-maximal suppression. The compute spent on an image
+    grows with its number of tiles, see utils.ObjectDetection.get_tiles().
+
+    :param tile_size: Side length in pixels of the tiles, which are resized to the inference resolution. Defaults to the CURRENT inference resolution.
+    :type tile_size: int
+    :param overlap: Share of a tile's side overlapping the next tile, so objects on a seam are whole in some tile.
+    :type overlap: float
+    :param full_image: Whether the whole image is also predicted for as usual, so objects larger than a tile are still detected.
+    :type full_image: boolean
+    :rtype: void
+    """
+    tile_size = tile_size or self.inference_resolution
+    if tile_size < 32:
+      raise ValueError(f"{tile_size} is an invalid tile size.")
+    if not 0 <= overlap < 1:
+      raise ValueError(f"{overlap} is an invalid tile overlap.")
+    self._tiling = (int(tile_size), overlap, full_image)
+    print(f"Model set to predict for tiles of {tile_size} pixels with {overlap} overlap.")
+
+  def reset_tiled(self):
+    """Predict for images whole again, as is done by default.
+
+    :rtype: void
+    """
+    self._tiling = None
+    print("Model restored to predicting for whole images.")
+
+  def is_tiled(self) -> bool:
+    """Boolean function to determine if images are predicted for as tiles.
+
+    :rtype: boolean
+    """
+    return self._tiling is not None
+
+  def set_cache(self,cache: PredictionCache):
+    """Consult a persistent prediction cache before predicting for an image, and save new predictions to it.
+    Images whose content was already predicted for with the same network, inference resolution, object
+    classes and nms threshold are not run through the network again.
+
+    :param cache: Prediction cache to use.
+    :type cache: comp_viz.results.PredictionCache
+    :rtype: void
+    """
+    self._cache = cache
+
+  def reset_cache(self):
+    """Stop consulting a prediction cache, as is done by default.
+
+    :rtype: void
+    """
+    self._cache = None
+
+  def set_quantized(self,calib_dir,num_images=quant_config.num_calib_images,calib_mode=quant_config.calib_mode,cache_dir=None,exclude_layers_match=None) -> dict:
+    """Run an INT8 quantized version of the network, calibrated on images from a directory at the CURRENT
+    inference resolution. Calibrated networks are cached on disk, so later calls with the same network
+    weights, resolution, calibration settings and calibration images skip calibration.
+
+    :param calib_dir: Path to a directory of calibration images.
+    :type calib_dir: string
+    :param num_images: Maximum number of images from calib_dir used for calibration.
+    :type num_images: int
+    :param calib_mode: MXNet calibration mode, "naive" (min/max) or "entropy" (KL divergence).
+    :type calib_mode: string
+    :param cache_dir: Directory to cache calibrated networks in. Defaults to config.Quantization.cache_dir.
+    :type cache_dir: string
+    :param exclude_layers_match: Patterns of layer names that are kept in FP32.
+    :type exclude_layers_match: List[string]
+    :return: Report comparing the INT8 detections against the FP32 detections on the calibration images,
+             see Quantization.compare_detections().
+    :rtype: dict
+    """
+    if self._float_net is not None:
+      raise ValueError("Model is already quantized.")
+    if calib_mode not in ["naive", "entropy"]:
+      raise ValueError(f"{calib_mode} is an invalid calibration mode.")
+    fnames = utils.Tools.get_dir_images(calib_dir)[:num_images]
+    if not fnames:
+      raise ValueError(f"Directory \"{calib_dir}\" has no calibration images.")
+    prefix = Quantization.get_cache_prefix(self.net_name, self.inference_resolution, fnames, calib_mode, cache_dir, self._get_weights_key(), exclude_layers_match)
+    qnet, report = Quantization.load(prefix, self.ctx)
+    if qnet is None:
+      prepared = [self._prepare(*self._load_image(fname)) for fname in fnames]
+      reference = self._predict_calibration(prepared)
+      calib_data = self._stack_images([x for x, _, _ in prepared])
+      qnet = Quantization.quantize(self.net, calib_data, self.ctx[0], calib_mode, exclude_layers_match)
+      # quantizing hybridizes the FP32 network, so restore how it was run before
+      self._hybridize(self.net)
+      self._float_net, self.net = self.net, qnet
+      report = Quantization.compare_detections(reference, self._predict_calibration(prepared))
+      Quantization.save(qnet, prefix, report)
+    else:
+      self._float_net, self.net = self.net, qnet
+    self._quant_key = os.path.basename(prefix)
+    if self._compiled:
+      self.net.hybridize(static_alloc=True, static_shape=True)
+    print(f"Model quantized to INT8. Agreement with FP32: {report}.")
+    return report
+
+  def reset_quantized(self):
+    """Run the FP32 network again, as it is run by default.
+
+    :rtype: void
+    """
+    if self._float_net is None:
+      return
+    self.net, self._float_net = self._float_net, None
+    self._quant_key = None
+    # compiling or resetting it while quantized only reached the INT8 network
+    self._hybridize(self.net)
+    print("Model restored to FP32 inference.")
+
+  def is_quantized(self) -> bool:
+    """Boolean function to determine if the network runs INT8 quantized.
+
+    :rtype: boolean
+    """
+    return self._float_net is not None
+
+  # Hybridize a network the way the model runs it: as a static graph if compiled, imperatively otherwise.
+  def _hybridize(self,net):
+    if self._compiled:
+      net.hybridize(static_alloc=True, static_shape=True)
+    else:
+      net.hybridize(active=False)
+
+  # Get a key identifying the weights of the network: the artifact they were loaded from, by path, size and
+  # modification time, or whether they are the pretrained or randomly initialized weights of the model zoo.
+  def _get_weights_key(self) -> str:
+    if self.artifact is not None:
+      params_fname = Artifact._get_fnames(self.artifact)[2]
+      stat = os.stat(params_fname)
+      return f"artifact:{os.path.abspath(params_fname)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return "pretrained" if self._pretrained else "random"
+
+  # Get detections for prepared calibration images, a few images per forward pass.
+  def _predict_calibration(self,prepared: list) -> list:
+    detections = []
+    for i in range(0, len(prepared), 8):
+      detections.extend(self._predict_whole(prepared[i:i + 8],0.,self._classes))
+    return detections
+
+  # Generator behind stream_video_predictions and predict_video, yielding pairs of the frame and the
+  # prediction dict. The frame rate of the video and dropped frame count are put into report if given.
+  def _stream_video(self,source,nms,batch_size,stride,realtime,classes,report):
+    if batch_size < 1:
+      raise ValueError(f"{batch_size} is an invalid batch size.")
+    classes = self._resolve_classes(classes)
+    with VideoReader(source, stride=stride, realtime=realtime, buffer=max(batch_size * 2, 2)) as reader:
+      frames = iter(reader)
+      while True:
+        batch = list(itertools.islice(frames, batch_size))
+        if not batch:
+          break
+        start = time.time()
+        base_imgs = [utils.Tools.load_image(frame) for _, _, frame in batch]
+        results = self._predict_batch(base_imgs,nms,classes,batch_size=batch_size)
+        end = time.time()
+        batch_time = float(end - start) / len(batch)
+        for (index, timestamp, frame), detections in zip(batch, results):
+          prediction = self._build_prediction(source,detections,nms,batch_time,classes)
+          prediction["frame"] = index
+          prediction["timestamp_ms"] = round(timestamp,3)
+          yield frame, prediction
+      if report is not None:
+        report["dropped"] = reader.frames_dropped
+        report["video_fps"] = reader.fps
+
+  # Generator behind stream_predictions and stream_image_predictions, yielding pairs of the decoded
+  # image (or None unless keep_images) and the prediction dict.
+  def _stream(self,fnames,nms,batch_size,prefetch,workers,classes,nms_iou,keep_images):
+    if batch_size is None:
+      batch_size = self.batch_size
+    if batch_size < 1:
+      raise ValueError(f"{batch_size} is an invalid batch size.")
+    if prefetch < 1:
+      raise ValueError(f"{prefetch} is an invalid prefetch size.")
+    if workers < 1:
+      raise ValueError(f"{workers} is an invalid number of workers.")
+    classes = self._resolve_classes(classes)
+    suppression = self._resolve_suppression(nms_iou)
+    in_flight = max(prefetch, batch_size)
+    sources = iter(fnames)
+    pending = collections.deque()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+      for source in itertools.islice(sources, in_flight):
+        pending.append((source, executor.submit(self._load_and_prepare, source, nms, classes, suppression, keep_images)))
+      while pending:
+        batch = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+        prepared = [future.result() for _, future in batch]
+        # refill the queue so the next images are prepared while this batch is in the network
+        for source in itertools.islice(sources, in_flight - len(pending)):
+          pending.append((source, executor.submit(self._load_and_prepare, source, nms, classes, suppression, keep_images)))
+        misses = [image for image, _, _, _, cached in prepared if cached is None]
+        start = time.time()
+        results = iter(self._predict_prepared(misses,nms,classes,suppression,batch_size) if misses else [])
+        end = time.time()
+        batch_time = float(end - start) / max(len(misses), 1)
+        for (source, _), (_, prepare_time, base_img, key, cached) in zip(batch, prepared):
+          if cached is not None:
+            yield base_img, cached
+            continue
+          prediction = self._build_prediction(source,next(results),nms,batch_time + prepare_time,classes)
+          self._cache_prediction(key,prediction)
+          yield base_img, prediction
+    finally:
+      for _, future in pending:
+        future.cancel()
+      executor.shutdown(wait=True)
+
+  # Get the shape buckets of the compiled network, derived from the CURRENT inference resolution
+  # unless buckets were given explicitly.
+  def _get_buckets(self) -> list:
+    if self._buckets is not None:
+      return self._buckets
+    return utils.ObjectDetection.get_shape_buckets(self.inference_resolution)
+
+  # Get the smallest bucket that covers an input of the given height and width, or None if no
+  # bucket is large enough.
+  def _get_cover_bucket(self,height,width):
+    for bucket in self._get_buckets():
+      if bucket[0] >= height and bucket[1] >= width:
+        return bucket
+    return None
+
+  # Shrink a prepared image that does not fit any bucket so that it fits the bucket it can fill the
+  # most of. Returns the new tensor along with the shape of the image it now represents, so bounding
+  # boxes still map back to the original image.
+  def _fit_bucket(self,x,img_shape):
+    height, width = x.shape[2], x.shape[3]
+    if self._get_cover_bucket(height,width) is not None:
+      return x, img_shape
+    scale = max(min(bucket[0] / height, bucket[1] / width) for bucket in self._get_buckets())
+    new_height = max(1, int(height * scale))
+    new_width = max(1, int(width * scale))
+    x = mxnet.nd.contrib.BilinearResize2D(x, height=new_height, width=new_width)
+    return x, (int(img_shape[0] * scale), int(img_shape[1] * scale)) + tuple(img_shape[2:])
+
   # Change actual object attribute's inference_resolution value.
   def _set_inference_resolution(self,res):
     self.inference_resolution = res
 
-  # Get tuple containing class ids, confidence scores and bounding boxes for an image prediction,
-  # apply NMS if specified and return the tuple.
-  def _predict(self,fname,nms) -> tuple:
-    base_img = mxnet.image.imread(fname)
-    x, img = self.__prepare_image(base_img)
-    pred = self.net(x.as_in_context(ctx[0]))
-    cids, scores, bboxes = self._extract_cids_scores_bboxes(pred)
-    # resize bounding box from network inference resolution to original image resolution
-    bboxes = [utils.ObjectDetection.resize_bbox(bbox,img.shape,base_img.shape) for bbox in bboxes]
-    if nms == 0:
-      return (cids,scores,bboxes)
-    nms_cids, nms_scores, nms_bboxes = self._apply_nms(cids, scores, bboxes, nms)
-    return (nms_cids,nms_scores,nms_bboxes)
+  # Get the detections for a decoded image, apply NMS if specified and return them. base_shape is the shape of
+  # the image at full resolution, if it was decoded at reduced resolution.
+  def _predict(self,base_img,nms,classes,suppression=None,base_shape=None) -> Detections:
+    return self._predict_prepared([self._prepare_input(base_img,base_shape)],nms,classes,suppression)[0]
+
+  # Get a list of detections for a batch of decoded images. The prepared images are zero padded on
+  # the bottom and right to a common shape and stacked so the network runs a single forward pass for
+  # the whole batch.
+  def _predict_batch(self,base_imgs: list,nms,classes,suppression=None,base_shapes=None,batch_size=None) -> list:
+    base_shapes = base_shapes or [None] * len(base_imgs)
+    return self._predict_prepared([self._prepare_input(base_img,base_shape) for base_img, base_shape in zip(base_imgs, base_shapes)],nms,classes,suppression,batch_size)
+
+  # Get a list of detections for a batch of prepared images, as returned by _prepare_input, whole or tiled.
+  # batch_size is the batch size of the calling method, which tiles are run through the network in.
+  def _predict_prepared(self,prepared: list,nms,classes,suppression=None,batch_size=None) -> list:
+    if self._tiling is not None:
+      return self._predict_tiles(prepared,nms,classes,suppression,batch_size)
+    return self._predict_whole(prepared,nms,classes,suppression)
+
+  # Get a list of detections for a batch of prepared whole images, as returned by _prepare. Only detections
+  # of the given classes are kept, with class ids indexing into classes. suppression is a tuple of
+  # non-maximal suppression settings from _resolve_suppression, defaulting to those set with set_nms.
+  def _predict_whole(self,prepared: list,nms,classes,suppression=None) -> list:
+    suppression = suppression or self._suppression
+    with utils.Instrument.stage("forward"):
+      pred = self.net(self._stack_images([x for x, _, _ in prepared]).as_in_context(self.ctx[0]))
+    with utils.Instrument.stage("postprocess"):
+      results = []
+      for (_, img_shape, base_shape), detections in zip(prepared, self._extract_detections(pred)):
+        detections = self._filter_classes(detections,classes)
+        # resize bounding box from network inference resolution to original image resolution
+        detections = detections.rescale(img_shape,base_shape)
+        detections = self._apply_suppression(detections, suppression)
+        if nms != 0:
+          detections = self._apply_threshold(detections, nms)
+        results.append(detections)
+    utils.Instrument.count("images", len(results))
+    utils.Instrument.count("boxes", sum(len(detections) for detections in results))
+    return results
+
+  # Get a list of detections for a batch of tiled images, as returned by _prepare_tiles. Tiles of the same
+  # shape are stacked together, so the whole images predicted for alongside do not pad every batch, and
+  # each forward pass takes up to batch_size tiles from any of the images, defaulting to the model's batch_size.
+  # The detections of each tile are mapped back to image coordinates, then merged across tile seams with
+  # non-maximal suppression before the usual suppression and thresholding.
+  def _predict_tiles(self,prepared: list,nms,classes,suppression=None,batch_size=None) -> list:
+    suppression = suppression or self._suppression
+    batch_size = batch_size or self.batch_size
+    tiles = sorted(((i, tile) for i, image_tiles in enumerate(prepared) for tile in image_tiles), key=lambda entry: entry[1][0].shape[2:])
+    merged = [[] for _ in prepared]
+    for start in range(0, len(tiles), batch_size):
+      batch = tiles[start:start + batch_size]
+      with utils.Instrument.stage("forward"):
+        pred = self.net(self._stack_images([x for _, (x, _, _, _) in batch]).as_in_context(self.ctx[0]))
+      with utils.Instrument.stage("postprocess"):
+        for (i, (_, img_shape, tile_shape, offset)), detections in zip(batch, self._extract_detections(pred)):
+          detections = self._filter_classes(detections,classes).rescale(img_shape,tile_shape)
+          merged[i].append(detections.translate(offset[1],offset[0]))
+    with utils.Instrument.stage("postprocess"):
+      results = []
+      for image_detections in merged:
+        detections = Detections.concatenate(image_detections).suppress(obj_det_config.tile_merge_iou)
+        detections = self._apply_suppression(detections, suppression)
+        if nms != 0:
+          detections = self._apply_threshold(detections, nms)
+        results.append(detections)
+    utils.Instrument.count("images", len(results))
+    utils.Instrument.count("tiles", len(tiles))
+    utils.Instrument.count("boxes", sum(len(detections) for detections in results))
+    return results
+
+  # Prepare a decoded image for the network, as tiles from _prepare_tiles in tiled mode and whole from
+  # _prepare otherwise.
+  def _prepare_input(self,base_img,base_shape=None):
+    if self._tiling is not None:
+      return self._prepare_tiles(base_img,base_shape)
+    return self._prepare(base_img,base_shape)
+
+  # Get a list of tuples containing the network input tensor of each tile of an image, the shape of the
+  # tile it was made from, the shape of the tile within the original image and the (y, x) offset of the
+  # tile. The whole image is included as a tile at offset (0, 0) if predicted for as well. Images that
+  # fit in a single tile are predicted for whole.
+  def _prepare_tiles(self,base_img,base_shape=None) -> list:
+    tile_size, overlap, full_image = self._tiling
+    bounds = utils.ObjectDetection.get_tiles(base_img.shape, tile_size, overlap)
+    tiles = []
+    if full_image or len(bounds) == 1:
+      x, img_shape, base_shape = self._prepare(base_img,base_shape)
+      tiles.append((x, img_shape, base_shape, (0, 0)))
+    if len(bounds) == 1:
+      return tiles
+    for y_min, x_min, y_max, x_max in bounds.tolist():
+      tile = base_img[y_min:y_max, x_min:x_max]
+      x, img_shape, tile_shape = self._prepare(tile)
+      tiles.append((x, img_shape, tile_shape, (y_min, x_min)))
+    return tiles
+
+  # Get a tuple containing the network input tensor, the shape of the image it was made from and the
+  # shape of the original image. base_shape is the shape of the original image at full resolution, if
+  # base_img was decoded at reduced resolution, so bounding boxes map back to full resolution.
+  def _prepare(self,base_img,base_shape=None) -> tuple:
+    base_shape = base_shape or base_img.shape
+    with utils.Instrument.stage("preprocess"):
+      x, img = self.__prepare_image(base_img)
+      if self._compiled:
+        x, img_shape = self._fit_bucket(x, img.shape)
+        return (x, img_shape, base_shape)
+      return (x, img.shape, base_shape)
+
+  # Decode and prepare an image, returning the prepared tuple, the seconds it took, the decoded image
+  # if keep_image, the cache key and the cached prediction. Nothing is prepared on a cache hit. Runs
+  # on the worker threads of stream_predictions.
+  def _load_and_prepare(self,source,nms,classes,suppression=None,keep_image=False) -> tuple:
+    start = time.time()
+    base_img, base_shape, key, cached = self._load_cached(source,nms,classes,need_image=keep_image,suppression=suppression)
+    prepared = self._prepare_input(base_img,base_shape) if cached is None else None
+    end = time.time()
+    return (prepared, float(end - start), base_img if keep_image else None, key, cached)
+
+  # Load an image, consulting the prediction cache first if one is set. Files are read once, both to
+  # hash their content and to decode them. Returns the decoded image (None on a cache hit unless
+  # need_image), its shape at full resolution, the cache key (None without a cache) and the cached
+  # prediction (None on a miss). The image is decoded at full resolution only if need_image.
+  def _load_cached(self,source,nms,classes,need_image=False,verify=True,suppression=None) -> tuple:
+    if self._cache is None or isinstance(source, mxnet.nd.NDArray):
+      return self._load_image(source,verify,need_image) + (None, None)
+    data = source
+    if utils.Tools.is_path(source):
+      if verify:
+        utils.Tools.verify_exists(source)
+      with open(source, "rb") as f:
+        data = f.read()
+    iou_thresh, top_k, soft = suppression or self._suppression
+    # everything besides the network, resolution, classes and nms that changes the detections made
+    mode = f"{'int8=' + self._quant_key if self._float_net is not None else 'fp32'}|weights={self._get_weights_key()}|nms={iou_thresh},{top_k},{int(soft)}"
+    mode += f"|reduced_decode={int(obj_det_config.reduced_decode)}"
+    if self._compiled:
+      mode += f"|buckets={self._get_buckets()}"
+    if self._tiling is not None:
+      tile_size, overlap, full_image = self._tiling
+      mode += f"|tiles={tile_size},{overlap},{int(full_image)}"
+    key = PredictionCache.get_key(PredictionCache.get_content_hash(data), self.net_name, self.inference_resolution, classes, nms, mode)
+    cached = self._cache.get(key)
+    if cached is not None:
+      cached["image"] = str(source) if utils.Tools.is_path(source) else None
+      return (self._load_image(data,False,True) if need_image else (None, None)) + (key, cached)
+    return self._load_image(data,False,need_image) + (key, None)
+
+  # Decode an image, returning it along with its shape at full resolution. Unless full or tiled, large JPEG
+  # images are decoded at reduced resolution, just large enough for the CURRENT inference resolution.
+  def _load_image(self,source,verify=True,full=False) -> tuple:
+    if full or self._tiling is not None or not obj_det_config.reduced_decode:
+      base_img = utils.Tools.load_image(source, verify=verify)
+      return base_img, base_img.shape
+    return utils.Tools.load_reduced_image(source, self.inference_resolution, verify=verify)
+
+  # Save a new prediction to the prediction cache, if one is set.
+  def _cache_prediction(self,key,prediction: dict):
+    if key is not None:
+      self._cache.put(key,prediction)
+
+  # Stack prepared NCHW image tensors of possibly different heights and widths into one tensor.
+  # Padding only extends the bottom and right edges so box coordinates are left unchanged. A
+  # compiled network is always given inputs padded to one of its shape buckets.
+  def _stack_images(self,xs: list):
+    height = max(x.shape[2] for x in xs)
+    width = max(x.shape[3] for x in xs)
+    if self._compiled:
+      height, width = self._get_cover_bucket(height,width) or (height, width)
+    if len(xs) == 1 and xs[0].shape[2:] == (height, width):
+      return xs[0]
+    batch = mxnet.nd.zeros((len(xs), xs[0].shape[1], height, width), dtype=xs[0].dtype)
+    for i, x in enumerate(xs):
+      batch[i, :, :x.shape[2], :x.shape[3]] = x[0]
+    return batch
+
+  # Assemble the prediction dict returned to the user for a single image.
+  def _build_prediction(self,fname,detections: Detections,nms,elapsed,classes) -> dict:
+    prediction = {}
+    prediction["image"] = str(fname) if utils.Tools.is_path(fname) else None
+    prediction.update(detections.to_dict())
+    prediction['nms_thresh'] = nms
+    prediction['class_map'] = {cid: classes[cid] for cid in set(prediction['class_ids'])}
+    prediction['time'] = round(elapsed,4)
+    prediction['network'] = self.net_name
+    prediction['resolution'] = self.inference_resolution
+    return prediction
 
   # Get the CURRENT object classes for the model.
   def _get_classes(self):
-    return self.net.classes
+    return list(self._classes)
+
+  # Get the object classes to detect for as a tuple, validated against the default object classes.
+  # None stands for the CURRENT object classes.
+  def _resolve_classes(self,classes) -> tuple:
+    if classes is None:
+      return self._classes
+    unsupported = [obj_class for obj_class in classes if obj_class not in self._default_object_classes]
+    if unsupported:
+      raise ValueError(f"Object class(es) \"{unsupported}\" are not supported for object detection.")
+    return tuple(classes)
+
+  # Keep only detections of the given classes, with class ids remapped from the network's default
+  # object classes to indices into classes.
+  def _filter_classes(self,detections: Detections,classes: tuple) -> Detections:
+    if len(classes) == len(self._default_object_classes) and classes == tuple(self._default_object_classes):
+      return detections
+    lookup = _get_class_lookup(tuple(self._default_object_classes), classes)
+    class_ids = lookup[detections.class_ids]
+    keep = class_ids >= 0
+    return Detections(class_ids[keep], detections.scores[keep], detections.bboxes[keep])
     
-  # Return tuple containing only the class ids, confidence scores, and bounding boxes of an MXNet
-  # inference result.
-  def _extract_cids_scores_bboxes(self,pred):
-    cids = self._get_class_ids(pred[0])
-    scores = self._get_scores(pred[1])
-    bboxes = self._get_bboxes(pred[2])
-    return (cids, scores, bboxes)
-
-  # Given an tuple containing class ids, confidence scoers and bounding boxes for an MXNet prediction
-  # filter the results and return them based off the confidence scores of the predictions and the
-  # specified nms value. (If confidence score < NMS, prune that prediction from results to be returned.)
-  def _apply_nms(self,cids: list, scores: list, bboxes: list, nms: float):
-    prune_indexes = []
-    for i, score in enumerate(scores):
-      if score < nms:
-        prune_indexes.append(i)
-    for index in prune_indexes[::-1]:
-      cids.pop(index)
-      scores.pop(index)
-      bboxes.pop(index)
-    return (cids, scores, bboxes)
-
-  # Extract the class ids from an MXNet prediction ndarray to a list.
-  def _get_class_ids(self,cids: numpy.ndarray) -> list:
-    class_ids = []
-    for ndarray in cids[0]:
-      nparray = ndarray.asnumpy()
-      if nparray[0] != -1:
-        class_ids.append(int(nparray[0]))
-    return class_ids
-
-  # Extract the confidence score float values from an MXNet prediction ndarray to a list
-  def _get_scores(self,scores: list):
-    confidence_scores = []
-    for ndarray in scores[0]:
-      nparray = ndarray.asnumpy()
-      if nparray[0] != -1:
-        confidence_scores.append(round(float(nparray[0]),3))
-    return confidence_scores
-
-  # Extract the bounding boxes from an MXNet prediction ndarray to a nested list 
-  def _get_bboxes(self,bboxes):
-    bounding_boxes = []
-    for ndarray in bboxes[0]:
-      nparray = ndarray.asnumpy()
-      if nparray[0] != -1:
-        bb = [float(corner) for corner in nparray.tolist()]
-        bounding_boxes.append(bb)
-    return bounding_boxes
-
-  # Process image such that inference can be performed by the mxnet network.
+  # Return a list containing the detections of each image in an MXNet inference result. Each
+  # output tensor is copied to host memory once.
+  def _extract_detections(self,pred) -> list:
+    return Detections.from_network_output(pred)
+
+  # Filter detections based off their confidence scores and the specified nms value.
+  # (If confidence score < NMS, prune that prediction from results to be returned.)
+  def _apply_threshold(self,detections: Detections, nms: float) -> Detections:
+    return detections.threshold(nms)
+
+  # Remove duplicate detections of the same object with class-aware non-maximal suppression.
+  def _apply_suppression(self,detections: Detections, suppression: tuple) -> Detections:
+    iou_thresh, top_k, soft = suppression
+    if not iou_thresh and not soft:
+      return detections.suppress(1.,top_k) if top_k else detections
+    return detections.suppress(iou_thresh,top_k,soft,obj_det_config.soft_nms_sigma)
+
+  # Get the non-maximal suppression settings for a call as an (iou_thresh, top_k, soft) tuple. None stands
+  # for the settings set with set_nms.
+  def _resolve_suppression(self,nms_iou) -> tuple:
+    if nms_iou is None:
+      return self._suppression
+    if not 0 <= nms_iou <= 1:
+      raise ValueError(f"{nms_iou} is an invalid IoU threshold.")
+    return (nms_iou,) + self._suppression[1:]
+
+  # Process image such that inference can be performed by the mxnet network, with the gluoncv transform
+  # preset and normalization of its preprocessing settings.
   def __prepare_image(self,image):
-    if "yolo" in self.net_name:
-      return gluoncv.data.transforms.presets.yolo.transform_test(image,short=self.inference_resolution)
-    elif "rcnn" in self.net_name:
-      return gluoncv.data.transforms.presets.rcnn.transform_test(image,short=self.inference_resolution)
-    elif "ssd" in self.net_name:
-      return gluoncv.data.transforms.presets.ssd.transform_test(image,short=self.inference_resolution)
-    elif "center_net" in self.net_name:
-      return gluoncv.data.transforms.presets.center_net.transform_test(image,short=self.inference_resolution)
\ No newline at end of file
+    preset = getattr(gluoncv.data.transforms.presets, self._preprocess["transform"])
+    return preset.transform_test(image,
+                                 short=self.inference_resolution,
+                                 max_size=self._preprocess["max_size"],
+                                 mean=tuple(self._preprocess["mean"]),
+                                 std=tuple(self._preprocess["std"]))
+
+# Get an array mapping each class id of the default object classes to its index in classes, or -1 if
+# the class is not among them. Cached so switching between class sets costs a dictionary lookup.
+@functools.lru_cache(maxsize=256)
+def _get_class_lookup(default_classes: tuple, classes: tuple) -> numpy.ndarray:
+  index = {obj_class: i for i, obj_class in enumerate(classes)}
+  return numpy.array([index.get(obj_class, -1) for obj_class in default_classes], dtype=numpy.int64)
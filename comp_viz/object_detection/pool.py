@@ -0,0 +1,227 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import os
+import queue
+import itertools
+import traceback
+import multiprocessing
+
+from .. import utils
+from .model import Model
+
+# Environment variables pinning the number of threads MXNet and the math libraries use in a process.
+_thread_env_vars = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "MXNET_OMP_MAX_THREADS", "MXNET_CPU_WORKER_NTHREADS"]
+
+class InferencePool:
+  """Pool of worker processes that each load their own object detection model and share the work of
+  predicting for a set of images. Each worker is pinned to a fixed number of threads, and predictions
+  are streamed back to the parent in the same order as the images were given.
+
+  :param network_name: A string representing the computer vision network that each worker loads.
+  :type network_name: string
+  :param workers: Number of worker processes. Defaults to the number of CPU cores.
+  :type workers: int
+  :param threads_per_worker: Number of threads each worker may use. Defaults to the CPU cores split evenly between workers.
+  :type threads_per_worker: int
+  :param batch_size: Number of images sent to a worker at a time, and stacked into one forward pass.
+  :type batch_size: int
+  :param compiled: Whether workers run their network as a hybridized static graph, see Model.set_compiled().
+  :type compiled: boolean
+  :param max_retries: Number of times images handled by a crashed worker are handed to a new worker before they are reported as failed.
+  :type max_retries: int
+  :ivar net_name: Holds the string literal for the network the workers load.
+  :ivar workers: Number of worker processes.
+  :ivar threads_per_worker: Number of threads each worker may use.
+  :ivar crashes: Number of worker crashes seen so far.
+  """
+
+  def __init__(self,network_name,workers=None,threads_per_worker=None,batch_size=8,compiled=False,max_retries=1):
+    """Constructor method
+    """
+    if network_name not in utils.ObjectDetection.get_networks():
+      raise ValueError(f"{network_name} is an invalid network.")
+    cpus = os.cpu_count() or 1
+    workers = workers or cpus
+    threads_per_worker = threads_per_worker or max(1, cpus // workers)
+    if workers < 1:
+      raise ValueError(f"{workers} is an invalid number of workers.")
+    if threads_per_worker < 1:
+      raise ValueError(f"{threads_per_worker} is an invalid number of threads per worker.")
+    if batch_size < 1:
+      raise ValueError(f"{batch_size} is an invalid batch size.")
+    if max_retries < 0:
+      raise ValueError(f"{max_retries} is an invalid number of retries.")
+    self.net_name = network_name
+    self.workers = workers
+    self.threads_per_worker = threads_per_worker
+    self.crashes = 0
+    self._batch_size = batch_size
+    self._compiled = compiled
+    self._max_retries = max_retries
+    self._mp = multiprocessing.get_context("spawn")
+    self._results = self._mp.Queue()
+    self._processes = [None] * workers
+    self._tasks = [None] * workers
+    self._closed = False
+    for worker_id in range(workers):
+      self._start_worker(worker_id)
+
+  def get_predictions(self,fnames,nms=0.,classes=None):
+    """Lazily get predictions made for many images by the pool's workers, in the same order as fnames.
+    Images that could not be predicted for, including those lost to a worker crashing more than
+    max_retries times, are given a prediction dict with no detections and an "error" message instead.
+
+    :param fnames: Iterable of image paths, or path to a directory of images.
+    :type fnames: Iterable[string] or string
+    :param nms: Stands for non-maximal suppresion. If computer vision model detects and an
+                object in the image with a confidence value less than the nms value, it
+                will not include it in the returned results.
+    :type nms: float
+    :param classes: Object classes to detect for. Defaults to every object class of the network.
+    :type classes: List
+    :rtype: Iterator[dict]
+    """
+    if self._closed:
+      raise ValueError("Inference pool is closed.")
+    if utils.Tools.is_path(fnames) and os.path.isdir(fnames):
+      fnames = utils.Tools.get_dir_images(fnames)
+    sources = iter(fnames)
+    chunks = iter(lambda: list(itertools.islice(sources, self._batch_size)), [])
+    assigned = [{} for _ in range(self.workers)]
+    backlog = []
+    done = {}
+    retries = {}
+    next_index = 0
+    next_yield = 0
+    exhausted = False
+    while True:
+      # keep every worker busy with up to two chunks. New chunks wait while too many results are waiting on a
+      # slow chunk, but chunks from crashed workers are always handed out again, as the slow chunk may be one of them
+      for worker_id in range(self.workers):
+        while len(assigned[worker_id]) < 2:
+          if backlog:
+            index, chunk = backlog.pop(0)
+          elif not exhausted and len(done) < self.workers * 4:
+            chunk = next(chunks, None)
+            if chunk is None:
+              exhausted = True
+              break
+            index, next_index = next_index, next_index + 1
+          else:
+            break
+          assigned[worker_id][index] = chunk
+          self._tasks[worker_id].put((index, chunk, nms, classes))
+      while next_yield in done:
+        yield from done.pop(next_yield)
+        next_yield += 1
+      if exhausted and not backlog and not any(assigned):
+        break
+      try:
+        worker_id, index, preds = self._results.get(timeout=0.5)
+      except queue.Empty:
+        self._recover_crashed(assigned, backlog, done, retries)
+        continue
+      # results for chunks that were already handed to another worker are dropped
+      if assigned[worker_id].pop(index, None) is not None:
+        done[index] = preds
+
+  def close(self):
+    """Stop every worker process.
+
+    :rtype: void
+    """
+    if self._closed:
+      return
+    self._closed = True
+    for tasks in self._tasks:
+      tasks.put(None)
+    for process in self._processes:
+      process.join(timeout=10)
+      if process.is_alive():
+        process.terminate()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,exc_type,exc_value,traceback):
+    self.close()
+
+  # Start a worker process in the given slot with the thread count environment variables set, so the
+  # worker's MXNet picks them up when it is first imported.
+  def _start_worker(self,worker_id):
+    self._tasks[worker_id] = self._mp.Queue()
+    process = self._mp.Process(target=_worker_main,
+                               args=(worker_id, self.net_name, self._compiled, self._tasks[worker_id], self._results),
+                               daemon=True)
+    saved = {var: os.environ.get(var) for var in _thread_env_vars}
+    try:
+      for var in _thread_env_vars:
+        os.environ[var] = str(self.threads_per_worker)
+      process.start()
+    finally:
+      for var, value in saved.items():
+        if value is None:
+          os.environ.pop(var, None)
+        else:
+          os.environ[var] = value
+    self._processes[worker_id] = process
+
+  # Replace crashed workers and hand their chunks to the backlog, or mark them failed once they have
+  # used up their retries.
+  def _recover_crashed(self,assigned,backlog,done,retries):
+    for worker_id, process in enumerate(self._processes):
+      if process.is_alive():
+        continue
+      self.crashes += 1
+      if self.crashes > self.workers * (self._max_retries + 1):
+        raise RuntimeError(f"Inference pool workers crashed {self.crashes} times, last with exit code {process.exitcode}.")
+      for index, chunk in assigned[worker_id].items():
+        retries[index] = retries.get(index, 0) + 1
+        if retries[index] > self._max_retries:
+          message = f"Worker crashed with exit code {process.exitcode}."
+          done[index] = [_error_prediction(self.net_name, fname, message) for fname in chunk]
+        else:
+          backlog.append((index, chunk))
+      assigned[worker_id] = {}
+      self._start_worker(worker_id)
+
+# Entry point of a worker process: load the model once and predict for chunks until told to stop.
+def _worker_main(worker_id,network_name,compiled,tasks,results):
+  model = Model(network_name)
+  if compiled:
+    model.set_compiled()
+  while True:
+    task = tasks.get()
+    if task is None:
+      break
+    index, chunk, nms, classes = task
+    results.put((worker_id, index, _predict_chunk(model, chunk, nms, classes)))
+
+# Predict for a chunk in one batch, falling back to one image at a time so a bad image only fails itself.
+def _predict_chunk(model,chunk,nms,classes) -> list:
+  try:
+    return model.get_predictions(chunk,nms,batch_size=len(chunk),classes=classes)
+  except Exception:
+    preds = []
+    for fname in chunk:
+      try:
+        preds.append(model.get_prediction(fname,nms,classes))
+      except Exception as e:
+        preds.append(_error_prediction(model.net_name, fname, "".join(traceback.format_exception_only(type(e), e)).strip(), model.inference_resolution, nms))
+    return preds
+
+# Get the dict reported in place of a prediction for an image that could not be predicted for. It has every
+# field of a prediction, with no detections, so results writers take it like any other prediction. The
+# resolution is 0 where the worker's model is unknown.
+def _error_prediction(network_name,fname,message,resolution=0,nms=0.) -> dict:
+  return {"image": str(fname),
+          "network": network_name,
+          "resolution": resolution,
+          "nms_thresh": nms,
+          "time": 0.,
+          "class_map": {},
+          "class_ids": [],
+          "confidence_scores": [],
+          "bounding_boxes": [],
+          "error": message}
@@ -0,0 +1,156 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import os
+import json
+import hashlib
+
+from .. import utils
+from ..config import Quantization as quant_config
+
+mxnet = utils.lazy_import("mxnet")
+numpy = utils.lazy_import("numpy")
+
+class Quantization:
+  """Utility class centered around producing, caching and checking INT8 quantized versions of object detection
+  networks with MXNet's quantization tooling. Quantized networks run fastest on an MKL-DNN enabled MXNet build.
+  """
+
+  def get_cache_prefix(network_name: str, resolution: int, calib_fnames: list, calib_mode: str, cache_dir=None, weights="pretrained", exclude_layers_match=None) -> str:
+    """Get the path prefix a quantized network is cached under. The prefix changes whenever the network, its
+    weights, resolution, calibration mode, layers kept in FP32 or calibration images (by path, size and
+    modification time) change.
+
+    :param network_name: Name of the network.
+    :type network_name: string
+    :param resolution: Inference resolution the network is calibrated at.
+    :type resolution: int
+    :param calib_fnames: Paths to the calibration images.
+    :type calib_fnames: List[string]
+    :param calib_mode: MXNet calibration mode.
+    :type calib_mode: string
+    :param cache_dir: Directory to cache in. Defaults to config.Quantization.cache_dir.
+    :type cache_dir: string
+    :param weights: Key identifying the weights of the network, such as whether they are pretrained or the artifact they were loaded from.
+    :type weights: string
+    :param exclude_layers_match: Patterns of layer names that are kept in FP32.
+    :type exclude_layers_match: List[string]
+    :rtype: string
+    """
+    digest = hashlib.sha1(f"{network_name}|{weights}|{resolution}|{calib_mode}|{json.dumps(list(exclude_layers_match or []))}".encode())
+    for fname in sorted(calib_fnames):
+      stat = os.stat(fname)
+      digest.update(f"|{os.path.abspath(fname)}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    cache_dir = os.path.expanduser(cache_dir or quant_config.cache_dir)
+    return os.path.join(cache_dir, f"{network_name}_{resolution}_{calib_mode}_{digest.hexdigest()[:16]}")
+
+  def load(prefix: str, ctx):
+    """Load a cached quantized network and its accuracy report.
+
+    :param prefix: Path prefix from get_cache_prefix().
+    :type prefix: string
+    :param ctx: MXNet contexts to load the network on.
+    :type ctx: List[mxnet.Context]
+    :return: A pair of values, the quantized network and the report dict, or (None, None) if nothing is cached under prefix.
+    :rtype: (mxnet.gluon.SymbolBlock, dict)
+    """
+    if not all(utils.Tools.exists(fname) for fname in Quantization._get_cache_fnames(prefix)):
+      return None, None
+    symbol_fname, params_fname, report_fname = Quantization._get_cache_fnames(prefix)
+    qnet = mxnet.gluon.SymbolBlock.imports(symbol_fname, ["data"], params_fname, ctx=ctx)
+    with open(report_fname) as f:
+      report = json.load(f)
+    return qnet, report
+
+  def save(qnet, prefix: str, report: dict):
+    """Cache a quantized network and its accuracy report.
+
+    :param qnet: Quantized network.
+    :type qnet: mxnet.gluon.SymbolBlock
+    :param prefix: Path prefix from get_cache_prefix().
+    :type prefix: string
+    :param report: Accuracy report from compare_detections().
+    :type report: dict
+    :rtype: void
+    """
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    qnet.export(prefix, epoch=0)
+    with open(Quantization._get_cache_fnames(prefix)[2], "w") as f:
+      f.write(json.dumps(report,indent=2))
+
+  def quantize(net, calib_data, ctx, calib_mode=quant_config.calib_mode, exclude_layers_match=None):
+    """Get an INT8 quantized version of a network, calibrated on a batch of prepared images. Quantizing
+    hybridizes net, so callers running it imperatively must reset it afterwards.
+
+    :param net: Network to quantize.
+    :type net: mxnet.gluon.HybridBlock
+    :param calib_data: Prepared calibration images stacked into one tensor of shape (N,3,height,width).
+    :type calib_data: mxnet.ndarray.ndarray.NDArray
+    :param ctx: MXNet context to calibrate on.
+    :type ctx: mxnet.Context
+    :param calib_mode: MXNet calibration mode, "naive" or "entropy".
+    :type calib_mode: string
+    :param exclude_layers_match: Patterns of layer names that are kept in FP32.
+    :type exclude_layers_match: List[string]
+    :rtype: mxnet.gluon.SymbolBlock
+    """
+    from mxnet.contrib import quantization as mx_quantization
+    loader = mxnet.gluon.data.DataLoader(mxnet.gluon.data.ArrayDataset(calib_data), batch_size=1)
+    data_shapes = [mxnet.io.DataDesc(name="data", shape=(1,) + tuple(calib_data.shape[1:]))]
+    net.hybridize()
+    return mx_quantization.quantize_net(net,
+                                        quantized_dtype="auto",
+                                        exclude_layers_match=exclude_layers_match,
+                                        calib_data=loader,
+                                        data_shapes=data_shapes,
+                                        calib_mode=calib_mode,
+                                        num_calib_examples=calib_data.shape[0],
+                                        ctx=ctx)
+
+  def compare_detections(reference: list, candidate: list, score_thresh=quant_config.report_thresh, iou_thresh=quant_config.report_iou) -> dict:
+    """Compare the detections of a quantized network against the detections of the network it was made from.
+    A detection agrees with the other network if it has a detection of the same class overlapping it by at
+    least iou_thresh.
+
+    :param reference: Detections of the FP32 network, one per image.
+    :type reference: List[Detections]
+    :param candidate: Detections of the INT8 network, for the same images.
+    :type candidate: List[Detections]
+    :param score_thresh: Minimum confidence score of the detections compared.
+    :type score_thresh: float
+    :param iou_thresh: Minimum intersection over union for two detections to agree.
+    :type iou_thresh: float
+    :return: Dict with the number of images and detections compared, the share of INT8 detections agreeing
+             with FP32 ("precision"), the share of FP32 detections found by INT8 ("recall"), and the mean
+             absolute confidence score change of agreeing detections.
+    :rtype: dict
+    """
+    ref_count = cand_count = ref_found = cand_agree = 0
+    score_deltas = []
+    for ref, cand in zip(reference, candidate):
+      ref = ref.threshold(score_thresh)
+      cand = cand.threshold(score_thresh)
+      ref_count += len(ref)
+      cand_count += len(cand)
+      if not len(ref) or not len(cand):
+        continue
+      iou = utils.ObjectDetection.get_iou_matrix(cand.bboxes, ref.bboxes)
+      iou[cand.class_ids[:, None] != ref.class_ids[None, :]] = 0
+      matches = iou >= iou_thresh
+      cand_agree += int(matches.any(axis=1).sum())
+      ref_found += int(matches.any(axis=0).sum())
+      best = iou.argmax(axis=1)
+      matched = matches.any(axis=1)
+      score_deltas.extend(numpy.abs(cand.scores[matched] - ref.scores[best[matched]]).tolist())
+    return {"images": len(reference),
+            "fp32_detections": ref_count,
+            "int8_detections": cand_count,
+            "precision": round(cand_agree / cand_count, 4) if cand_count else 1.0,
+            "recall": round(ref_found / ref_count, 4) if ref_count else 1.0,
+            "mean_score_delta": round(float(numpy.mean(score_deltas)), 4) if score_deltas else 0.0,
+            "score_thresh": score_thresh,
+            "iou_thresh": iou_thresh}
+
+  # Get the symbol, parameter and report file paths of a cached quantized network.
+  def _get_cache_fnames(prefix: str) -> tuple:
+    return (f"{prefix}-symbol.json", f"{prefix}-0000.params", f"{prefix}-report.json")
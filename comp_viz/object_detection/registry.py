@@ -0,0 +1,135 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import collections
+import threading
+
+from .. import utils
+from .model import Model
+from ..config import ObjectDetection as obj_det_config
+
+numpy = utils.lazy_import("numpy")
+
+class ModelRegistry:
+  """Process-wide cache of loaded object detection models. Each network is loaded at most once while it
+  stays cached, and the least recently used models are dropped once the configured limits are exceeded.
+
+  :param max_models: Maximum number of models kept loaded at once.
+  :type max_models: int
+  :param max_bytes: Maximum combined parameter size in bytes of the models kept loaded. 0 means no limit.
+  :type max_bytes: int
+  :ivar max_models: Maximum number of models kept loaded at once.
+  :ivar max_bytes: Maximum combined parameter size in bytes of the models kept loaded.
+  """
+
+  def __init__(self,max_models=obj_det_config.max_loaded_networks,max_bytes=obj_det_config.max_loaded_bytes):
+    """Constructor method
+    """
+    if max_models < 1:
+      raise ValueError(f"{max_models} is an invalid maximum number of models.")
+    if max_bytes < 0:
+      raise ValueError(f"{max_bytes} is an invalid maximum number of bytes.")
+    self.max_models = max_models
+    self.max_bytes = max_bytes
+    self._models = collections.OrderedDict()
+    self._sizes = {}
+    self._lock = threading.RLock()
+
+  def get(self,network_name: str) -> Model:
+    """Get a ready model for the specified network, loading it only if it is not already cached.
+
+    :param network_name: A valid network name among the results in utils.ObjectDetection.get_networks().
+    :type network_name: string
+    :rtype: Model
+    """
+    with self._lock:
+      if network_name in self._models:
+        self._models.move_to_end(network_name)
+        return self._models[network_name]
+      model = Model(network_name)
+      self._models[network_name] = model
+      self._sizes[network_name] = _parameter_bytes(model)
+      self._enforce_limits()
+      return model
+
+  def is_loaded(self,network_name: str) -> bool:
+    """Boolean function to determine if a network is currently cached.
+
+    :param network_name: Name of the network.
+    :type network_name: string
+    :rtype: boolean
+    """
+    with self._lock:
+      return network_name in self._models
+
+  def get_loaded(self) -> list:
+    """Get list of the currently cached networks, from least to most recently used.
+
+    :rtype: List
+    """
+    with self._lock:
+      return list(self._models.keys())
+
+  def get_loaded_bytes(self) -> int:
+    """Get the combined parameter size in bytes of the currently cached networks.
+
+    :rtype: int
+    """
+    with self._lock:
+      return sum(self._sizes.values())
+
+  def evict(self,network_name: str):
+    """Drop a network from the cache if it is loaded.
+
+    :param network_name: Name of the network.
+    :type network_name: string
+    :rtype: void
+    """
+    with self._lock:
+      self._models.pop(network_name, None)
+      self._sizes.pop(network_name, None)
+
+  def clear(self):
+    """Drop every network from the cache.
+
+    :rtype: void
+    """
+    with self._lock:
+      self._models.clear()
+      self._sizes.clear()
+
+  # Drop least recently used models until the count and byte limits hold. The most recently used
+  # model is always kept, even if it alone exceeds the byte limit.
+  def _enforce_limits(self):
+    while len(self._models) > 1:
+      over_count = len(self._models) > self.max_models
+      over_bytes = self.max_bytes and sum(self._sizes.values()) > self.max_bytes
+      if not (over_count or over_bytes):
+        break
+      network_name, _ = self._models.popitem(last=False)
+      self._sizes.pop(network_name, None)
+
+_default_registry = ModelRegistry()
+
+def get_model(network_name: str) -> Model:
+  """Get a ready model for the specified network from the process-wide model registry.
+
+  :param network_name: A valid network name among the results in utils.ObjectDetection.get_networks().
+  :type network_name: string
+  :rtype: Model
+  """
+  return _default_registry.get(network_name)
+
+def get_registry() -> ModelRegistry:
+  """Get the process-wide model registry.
+
+  :rtype: ModelRegistry
+  """
+  return _default_registry
+
+# Get the combined size in bytes of the parameters of a model's network.
+def _parameter_bytes(model: Model) -> int:
+  total = 0
+  for param in model.net.collect_params().values():
+    total += int(numpy.prod(param.shape)) * numpy.dtype(param.dtype).itemsize
+  return total
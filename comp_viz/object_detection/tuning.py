@@ -0,0 +1,133 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import os
+import json
+import platform
+
+from ..config import Autotune as autotune_config
+
+# Stages of a prediction counted towards the latency of an operating point. Drawing and writing results
+# depend on what the caller does with the predictions, so they are left out.
+inference_stages = ["decode", "preprocess", "forward", "postprocess"]
+
+class TunedProfile:
+  """Utility class centered around the tuned profile of the current machine: the inference resolution and
+  batch size picked for each network by the autotuner (python -m comp_viz.autotune), along with the latency
+  and throughput measured for them. Object detection models load their operating point from it automatically.
+  """
+
+  def get_path(path=None) -> str:
+    """Get the path of the tuned profile of the current machine.
+
+    :param path: Path of the profile. Defaults to config.Autotune.profile_path.
+    :type path: string
+    :rtype: string
+    """
+    path = path or autotune_config.profile_path
+    return os.path.expanduser(path.replace("{host}", platform.node() or "localhost"))
+
+  def load(path=None):
+    """Load the tuned profile of the current machine, or None if the machine has not been tuned.
+
+    :param path: Path of the profile. Defaults to config.Autotune.profile_path.
+    :type path: string
+    :rtype: dict
+    """
+    path = TunedProfile.get_path(path)
+    if not os.path.isfile(path):
+      return None
+    with open(path) as f:
+      return json.load(f)
+
+  def get(network_name: str, path=None):
+    """Get the tuned operating point of a network on the current machine, or None if it has not been tuned.
+
+    :param network_name: Name of the network.
+    :type network_name: string
+    :param path: Path of the profile. Defaults to config.Autotune.profile_path.
+    :type path: string
+    :return: Dict holding the "resolution" and "batch_size" picked, and the "latency_ms", "images_per_sec"
+             and "ms_per_image" measured for them.
+    :rtype: dict
+    """
+    profile = TunedProfile.load(path)
+    if profile is None:
+      return None
+    return profile["networks"].get(network_name)
+
+  def save(profile: dict, path=None) -> str:
+    """Save a tuned profile, replacing the current machine's previous profile.
+
+    :param profile: Tuned profile, as built by build().
+    :type profile: dict
+    :param path: Path of the profile. Defaults to config.Autotune.profile_path.
+    :type path: string
+    :return: Path the profile was saved to.
+    :rtype: string
+    """
+    path = TunedProfile.get_path(path)
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write then rename, so models starting meanwhile never read a partial profile
+    with open(f"{path}.tmp", "w") as f:
+      f.write(json.dumps(profile,indent=2))
+    os.replace(f"{path}.tmp", path)
+    return path
+
+  def build(bench_report: dict, latency_ms=None, images_per_sec=None) -> dict:
+    """Build a tuned profile from the results of a benchmark sweep, picking an operating point for each network.
+    With a latency target, the operating point is the highest resolution predicting for a batch within
+    latency_ms, at the batch size with the highest throughput among those. With a throughput target, it is the
+    highest resolution reaching images_per_sec, at the batch size with the lowest latency among those. When no
+    operating point meets the target, the one closest to it is picked and "target_met" is False.
+
+    :param bench_report: Benchmark results from comp_viz.bench.run().
+    :type bench_report: dict
+    :param latency_ms: Maximum milliseconds to predict for one batch. Defaults to config.Autotune.latency_ms when no throughput target is given.
+    :type latency_ms: float
+    :param images_per_sec: Minimum images predicted for per second.
+    :type images_per_sec: float
+    :rtype: dict
+    """
+    if latency_ms is None and images_per_sec is None:
+      latency_ms = autotune_config.latency_ms
+    points = {}
+    for result in bench_report["results"]:
+      latency = sum(result["stages_ms"][stage]["mean"] for stage in inference_stages)
+      throughput = result["batch_size"] * 1000 / latency if latency > 0 else 0.
+      points.setdefault(result["network"], []).append({"resolution": result["resolution"],
+                                                       "batch_size": result["batch_size"],
+                                                       "latency_ms": round(latency, 3),
+                                                       "images_per_sec": round(throughput, 2),
+                                                       "ms_per_image": round(latency / result["batch_size"], 3)})
+    networks = {}
+    for network, measured in points.items():
+      if latency_ms is not None:
+        met = [point for point in measured if point["latency_ms"] <= latency_ms]
+        best = max(met, key=lambda point: (point["resolution"], point["images_per_sec"])) if met else \
+               min(measured, key=lambda point: point["latency_ms"])
+      else:
+        met = [point for point in measured if point["images_per_sec"] >= images_per_sec]
+        best = max(met, key=lambda point: (point["resolution"], -point["latency_ms"])) if met else \
+               max(measured, key=lambda point: point["images_per_sec"])
+      networks[network] = dict(best, target_met=bool(met), measurements=measured)
+    return {"meta": dict(bench_report["meta"], host=platform.node()),
+            "target": {"latency_ms": latency_ms, "images_per_sec": images_per_sec},
+            "networks": networks}
+
+  def get_speed_order(networks: list, path=None) -> list:
+    """Sort networks from fastest to slowest by the time per image measured on the current machine. Networks
+    that have not been tuned keep their order after the tuned ones.
+
+    :param networks: Names of the networks.
+    :type networks: List[string]
+    :param path: Path of the profile. Defaults to config.Autotune.profile_path.
+    :type path: string
+    :rtype: List[string]
+    """
+    profile = TunedProfile.load(path)
+    if profile is None:
+      return list(networks)
+    measured = profile["networks"]
+    return sorted(networks, key=lambda network: (network not in measured, measured.get(network, {}).get("ms_per_image", 0.)))
@@ -0,0 +1,132 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import queue
+import threading
+
+from .. import utils
+
+cv2 = utils.lazy_import("cv2")
+
+class VideoReader:
+  """Decodes the frames of a video file or stream with OpenCV on a background thread, handing them out
+  in RGB as an iterator of (frame index, timestamp in milliseconds, frame) tuples.
+
+  :param source: Path or URL of a video, or index of a camera device.
+  :type source: string or int
+  :param stride: Only every stride-th frame is decoded; the frames between are skipped without being decoded.
+  :type stride: int
+  :param realtime: Whether to drop the oldest waiting frame when the consumer falls behind, so the frames
+                   handed out are always recent. Otherwise decoding pauses until the consumer catches up.
+  :type realtime: boolean
+  :param buffer: Maximum number of decoded frames waiting to be handed out.
+  :type buffer: int
+  :ivar frames_read: Number of frames decoded so far.
+  :ivar frames_dropped: Number of decoded frames dropped as stale in realtime mode.
+  :ivar fps: Frame rate reported by the video, or 0 if unknown.
+  """
+
+  def __init__(self,source,stride=1,realtime=False,buffer=16):
+    """Constructor method
+    """
+    if stride < 1:
+      raise ValueError(f"{stride} is an invalid frame stride.")
+    if buffer < 1:
+      raise ValueError(f"{buffer} is an invalid buffer size.")
+    if utils.Tools.is_path(source):
+      source = str(source)
+      if "://" not in source:
+        utils.Tools.verify_exists(source)
+    self._capture = cv2.VideoCapture(source)
+    if not self._capture.isOpened():
+      raise OSError(f"Video \"{source}\" could not be opened.")
+    self.source = source
+    self.fps = float(self._capture.get(cv2.CAP_PROP_FPS) or 0.)
+    self.frames_read = 0
+    self.frames_dropped = 0
+    self._stride = stride
+    self._realtime = realtime
+    self._frames = queue.Queue(maxsize=buffer)
+    self._stopped = threading.Event()
+    self._error = None
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def __iter__(self):
+    while True:
+      item = self._frames.get()
+      if item is None:
+        break
+      yield item
+    if self._error is not None:
+      raise OSError(f"Failed to decode video \"{self.source}\".") from self._error
+
+  def close(self):
+    """Stop decoding and release the video.
+
+    :rtype: void
+    """
+    self._stopped.set()
+    # unblock the decoding thread if it is waiting on a full buffer
+    while self._thread.is_alive():
+      try:
+        self._frames.get_nowait()
+      except queue.Empty:
+        pass
+      self._thread.join(timeout=0.05)
+    # end iteration for a consumer still waiting on frames
+    try:
+      self._frames.put_nowait(None)
+    except queue.Full:
+      pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,exc_type,exc_value,traceback):
+    self.close()
+
+  # Background thread loop, decoding frames into the buffer until the video ends or close() is called.
+  def _run(self):
+    index = 0
+    try:
+      while not self._stopped.is_set():
+        if index % self._stride:
+          if not self._capture.grab():
+            break
+          index += 1
+          continue
+        ok, frame = self._capture.read()
+        if not ok:
+          break
+        timestamp = float(self._capture.get(cv2.CAP_PROP_POS_MSEC))
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+        self.frames_read += 1
+        self._put((index, timestamp, frame))
+        index += 1
+    except Exception as e:
+      self._error = e
+    finally:
+      self._capture.release()
+      self._put(None)
+
+  # Hand a frame to the consumer. In realtime mode the oldest waiting frame is dropped if the buffer
+  # is full, otherwise this waits for room until close() is called.
+  def _put(self,item):
+    if self._realtime:
+      while True:
+        try:
+          self._frames.put_nowait(item)
+          return
+        except queue.Full:
+          try:
+            if self._frames.get_nowait() is not None:
+              self.frames_dropped += 1
+          except queue.Empty:
+            pass
+    while not self._stopped.is_set():
+      try:
+        self._frames.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        pass
@@ -0,0 +1,3 @@
+from .writer import *
+from .reader import *
+from .cache import *
\ No newline at end of file
@@ -0,0 +1,193 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from ..config import Cache as cache_config
+
+class PredictionCache:
+  """Persistent cache of prediction dicts stored in a local SQLite file. Predictions are keyed by a hash of the
+  image content along with everything else that changes the prediction (network, inference resolution, object
+  classes, nms threshold), so finished work is skipped when a run is repeated or resumed after a crash.
+
+  :param path: Path of the SQLite file. Defaults to config.Cache.path.
+  :type path: string
+  :param max_bytes: Maximum combined size in bytes of the cached predictions, enforced by evict(). 0 means no limit.
+  :type max_bytes: int
+  :param max_age: Maximum age in seconds of cached predictions, enforced by evict(). 0 means no limit.
+  :type max_age: float
+  :param commit_every: Number of new predictions cached before they are committed to disk.
+  :type commit_every: int
+  :ivar path: Path of the SQLite file.
+  :ivar hits: Number of lookups that found a cached prediction.
+  :ivar misses: Number of lookups that did not.
+  """
+
+  def __init__(self,path=None,max_bytes=cache_config.max_bytes,max_age=cache_config.max_age,commit_every=cache_config.commit_every):
+    """Constructor method
+    """
+    if commit_every < 1:
+      raise ValueError(f"{commit_every} is an invalid commit size.")
+    self.path = os.path.expanduser(path or cache_config.path)
+    self.hits = 0
+    self.misses = 0
+    self._max_bytes = max_bytes
+    self._max_age = max_age
+    self._commit_every = commit_every
+    self._uncommitted = 0
+    self._lock = threading.Lock()
+    if os.path.dirname(self.path):
+      os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    self._db = sqlite3.connect(self.path, check_same_thread=False)
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("CREATE TABLE IF NOT EXISTS predictions "
+                     "(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+    self._db.execute("CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed)")
+    self._db.commit()
+    self.evict()
+
+  def get_key(content_hash: str, network_name: str, resolution: int, classes, nms: float, mode="") -> str:
+    """Get the cache key of a prediction.
+
+    :param content_hash: Hash of the image content, see get_content_hash().
+    :type content_hash: string
+    :param network_name: Name of the network.
+    :type network_name: string
+    :param resolution: Inference resolution.
+    :type resolution: int
+    :param classes: Object classes detected for.
+    :type classes: List[string]
+    :param nms: NMS threshold.
+    :type nms: float
+    :param mode: Anything else that changes the prediction, such as the network running quantized.
+    :type mode: string
+    :rtype: string
+    """
+    parts = [content_hash, network_name, str(resolution), json.dumps(list(classes)), repr(float(nms)), mode]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+  def get_content_hash(data) -> str:
+    """Get the hash of image content, either encoded file bytes or a decoded numpy image.
+
+    :param data: Encoded image file bytes or decoded image.
+    :type data: bytes or numpy.ndarray
+    :rtype: string
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if hasattr(data, "shape"):
+      digest.update(f"{data.shape}|{data.dtype}|".encode())
+      data = data.tobytes() if not data.flags["C_CONTIGUOUS"] else memoryview(data).cast("B")
+    digest.update(data)
+    return digest.hexdigest()
+
+  def get(self,key: str):
+    """Get the cached prediction dict for a key, or None if nothing is cached under it.
+
+    :param key: Cache key from get_key().
+    :type key: string
+    :rtype: dict
+    """
+    with self._lock:
+      row = self._db.execute("SELECT value FROM predictions WHERE key = ?", (key,)).fetchone()
+      if row is None:
+        self.misses += 1
+        return None
+      self.hits += 1
+      self._db.execute("UPDATE predictions SET accessed = ? WHERE key = ?", (time.time(), key))
+      self._count_write()
+    prediction = json.loads(row[0])
+    # JSON object keys are strings, so restore the int class ids of the class map
+    if "class_map" in prediction:
+      prediction["class_map"] = {int(cid): name for cid, name in prediction["class_map"].items()}
+    return prediction
+
+  def put(self,key: str,prediction: dict):
+    """Cache a prediction dict under a key.
+
+    :param key: Cache key from get_key().
+    :type key: string
+    :param prediction: Prediction dict.
+    :type prediction: dict
+    :rtype: void
+    """
+    value = json.dumps(prediction)
+    now = time.time()
+    with self._lock:
+      self._db.execute("INSERT OR REPLACE INTO predictions (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                       (key, value, len(value), now, now))
+      self._count_write()
+
+  def evict(self,max_bytes=None,max_age=None):
+    """Remove cached predictions older than max_age, then the least recently used predictions until the rest fit in max_bytes.
+
+    :param max_bytes: Maximum combined size in bytes. Defaults to the cache's max_bytes. 0 means no limit.
+    :type max_bytes: int
+    :param max_age: Maximum age in seconds. Defaults to the cache's max_age. 0 means no limit.
+    :type max_age: float
+    :rtype: void
+    """
+    max_bytes = self._max_bytes if max_bytes is None else max_bytes
+    max_age = self._max_age if max_age is None else max_age
+    with self._lock:
+      if max_age:
+        self._db.execute("DELETE FROM predictions WHERE created < ?", (time.time() - max_age,))
+      if max_bytes:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM predictions").fetchone()[0]
+        if total > max_bytes:
+          # walk from least to most recently used, finding the access time to evict up to
+          excess = total - max_bytes
+          freed = 0
+          cutoff = None
+          for size, accessed in self._db.execute("SELECT size, accessed FROM predictions ORDER BY accessed"):
+            freed += size
+            cutoff = accessed
+            if freed >= excess:
+              break
+          self._db.execute("DELETE FROM predictions WHERE accessed <= ?", (cutoff,))
+      self._db.commit()
+      self._uncommitted = 0
+
+  def get_size(self) -> tuple:
+    """Get the number of cached predictions and their combined size in bytes.
+
+    :rtype: (int, int)
+    """
+    with self._lock:
+      count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM predictions").fetchone()
+    return count, size
+
+  def flush(self):
+    """Commit every cached prediction to disk.
+
+    :rtype: void
+    """
+    with self._lock:
+      self._db.commit()
+      self._uncommitted = 0
+
+  def close(self):
+    """Commit every cached prediction to disk and close the SQLite file.
+
+    :rtype: void
+    """
+    self.flush()
+    with self._lock:
+      self._db.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,exc_type,exc_value,traceback):
+    self.close()
+
+  # Commit once enough writes have been made since the last commit. Called with the lock held.
+  def _count_write(self):
+    self._uncommitted += 1
+    if self._uncommitted >= self._commit_every:
+      self._db.commit()
+      self._uncommitted = 0
@@ -0,0 +1,109 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import os
+import json
+
+from .. import utils
+from .writer import _get_part_fnames
+from ..config import Results as results_config
+
+numpy = utils.lazy_import("numpy")
+
+def read_predictions(path: str, fmt=None):
+  """Lazily read back the prediction dicts saved by a results writer, one at a time, so runs of any size can be
+  read without holding them all in memory. Class map keys are class ids (ints) whichever format was read. If the
+  writer of a .npz or parquet file never finished, the parts it wrote before stopping are read instead.
+
+  :param path: Path of the file, or directory for the "files" format, results were written to.
+  :type path: string
+  :param fmt: Results format. Defaults to the format given by the path's extension, or "files" for a directory.
+  :type fmt: string
+  :rtype: Iterator[dict]
+  """
+  fnames = [str(path)]
+  if not os.path.exists(path) and _get_part_fnames(path):
+    fnames = _get_part_fnames(path)
+  else:
+    utils.Tools.verify_exists(path)
+  fmt = fmt or get_format(path)
+  if fmt not in results_config.formats:
+    raise ValueError(f"{fmt} is an invalid results format.")
+  for fname in fnames:
+    for prediction in _readers[fmt](fname):
+      prediction["class_map"] = {int(cid): name for cid, name in prediction.get("class_map", {}).items()}
+      yield prediction
+
+def get_format(path: str) -> str:
+  """Get the results format of a path written to by a results writer, from its extension.
+
+  :param path: Path of the file or directory results were written to.
+  :type path: string
+  :rtype: string
+  """
+  if os.path.isdir(path):
+    return "files"
+  fmt = os.path.splitext(str(path))[1][1:].lower()
+  if fmt not in results_config.formats:
+    raise ValueError(f"{path} is not a path to results of a supported format.")
+  return fmt
+
+# Read a file of one JSON prediction per line.
+def _read_jsonl(path: str):
+  with open(path) as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+# Read a columnar .npz file, splitting the concatenated detections back up by image.
+def _read_npz(path: str):
+  with numpy.load(path) as data:
+    columns = {key: data[key] for key in data.files}
+  offsets = columns["offsets"]
+  class_maps = columns.get("class_map")
+  frames = columns.get("frame")
+  for i in range(len(columns["image"])):
+    start, end = offsets[i], offsets[i + 1]
+    image = str(columns["image"][i])
+    prediction = {"image": None if image == "None" else image,
+                  "class_ids": columns["class_ids"][start:end].tolist(),
+                  "confidence_scores": columns["confidence_scores"][start:end].tolist(),
+                  "bounding_boxes": columns["bounding_boxes"][start:end].tolist(),
+                  "nms_thresh": float(columns["nms_thresh"][i]),
+                  "class_map": json.loads(str(class_maps[i])) if class_maps is not None else {},
+                  "time": float(columns["time"][i]),
+                  "network": str(columns["network"][i]),
+                  "resolution": int(columns["resolution"][i])}
+    # predictions of still images have no frame, marked with -1
+    if frames is not None and frames[i] >= 0:
+      prediction["frame"] = int(frames[i])
+      prediction["timestamp_ms"] = float(columns["timestamp_ms"][i])
+    yield prediction
+
+# Read a parquet file of one row per image, in batches of rows when pyarrow is installed.
+def _read_parquet(path: str):
+  try:
+    import pyarrow.parquet
+  except ImportError:
+    pyarrow = None
+  if pyarrow is not None:
+    batches = (batch.to_pylist() for batch in pyarrow.parquet.ParquetFile(path).iter_batches())
+  else:
+    import pandas
+    batches = [pandas.read_parquet(path).to_dict("records")]
+  for rows in batches:
+    for row in rows:
+      row["class_map"] = json.loads(row["class_map"])
+      for key in ["class_ids", "confidence_scores", "bounding_boxes"]:
+        row[key] = [list(value) if key == "bounding_boxes" else value for value in row[key]]
+      yield row
+
+# Read a directory of one indented JSON prediction per ".txt" file, in sorted order.
+def _read_files(path: str):
+  with os.scandir(path) as entries:
+    fnames = sorted(entry.path for entry in entries if entry.is_file() and entry.name.endswith(".txt"))
+  for fname in fnames:
+    with open(fname) as f:
+      yield json.loads(f.read())
+
+_readers = {"jsonl": _read_jsonl, "npz": _read_npz, "parquet": _read_parquet, "files": _read_files}
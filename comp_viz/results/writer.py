@@ -0,0 +1,307 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import os
+import glob
+import json
+import time
+import pathlib
+import queue
+import threading
+
+from .. import utils
+from ..config import Results as results_config
+
+numpy = utils.lazy_import("numpy")
+
+class ResultsWriter:
+  """Base class for writers that save prediction dicts. Predictions handed to write() are buffered and
+  written out in bulk on a background thread, so callers never wait on the file system. A batch is written
+  once flush_every predictions are buffered, flush_interval seconds after its first prediction, or on close.
+
+  :param path: Path of the file or directory results are written to.
+  :type path: string
+  :param flush_every: Number of predictions buffered before they are written out in bulk.
+  :type flush_every: int
+  :param flush_interval: Maximum seconds a prediction stays buffered before it is written out.
+  :type flush_interval: float
+  :ivar path: Path of the file or directory results are written to.
+  :ivar count: Number of predictions handed to the writer so far.
+  """
+
+  def __init__(self,path: str,flush_every=results_config.flush_every,flush_interval=results_config.flush_interval):
+    """Constructor method
+    """
+    if flush_every < 1:
+      raise ValueError(f"{flush_every} is an invalid flush size.")
+    if flush_interval <= 0:
+      raise ValueError(f"{flush_interval} is an invalid flush interval.")
+    self.path = str(path)
+    self.count = 0
+    self._flush_every = flush_every
+    self._flush_interval = flush_interval
+    self._queue = queue.Queue(maxsize=flush_every * 4)
+    self._error = None
+    self._closed = False
+    self._open()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def write(self,prediction: dict):
+    """Queue a prediction dict to be written.
+
+    :param prediction: Prediction dict, as returned by Model.get_prediction().
+    :type prediction: dict
+    :rtype: void
+    """
+    if self._closed:
+      raise ValueError(f"Results writer for \"{self.path}\" is closed.")
+    self._raise_error()
+    self._queue.put(prediction)
+    self.count += 1
+
+  def write_all(self,predictions):
+    """Queue every prediction dict of an iterable to be written.
+
+    :param predictions: Iterable of prediction dicts.
+    :type predictions: Iterable[dict]
+    :rtype: void
+    """
+    for prediction in predictions:
+      self.write(prediction)
+
+  def close(self):
+    """Write out every queued prediction, finish the output and stop the background thread.
+
+    :rtype: void
+    """
+    if self._closed:
+      return
+    self._closed = True
+    self._queue.put(None)
+    self._thread.join()
+    if self._error is None:
+      self._close()
+    self._raise_error()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,exc_type,exc_value,traceback):
+    self.close()
+
+  # Prepare the output before any predictions are written.
+  def _open(self):
+    pass
+
+  # Write out a list of predictions. Runs on the background thread.
+  def _write_batch(self,predictions: list):
+    raise NotImplementedError
+
+  # Finish the output once every prediction has been written.
+  def _close(self):
+    pass
+
+  # Background thread loop, gathering queued predictions into batches of up to flush_every, cut short
+  # flush_interval seconds after their first prediction or on close.
+  def _run(self):
+    done = False
+    while not done:
+      batch = []
+      item = self._queue.get()
+      deadline = time.monotonic() + self._flush_interval
+      while item is not None:
+        batch.append(item)
+        timeout = deadline - time.monotonic()
+        if len(batch) >= self._flush_every or timeout <= 0:
+          break
+        try:
+          item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+          break
+      done = item is None
+      if batch and self._error is None:
+        try:
+          with utils.Instrument.stage("write"):
+            self._write_batch(batch)
+        except Exception as e:
+          self._error = e
+
+  # Re-raise an exception hit on the background thread in the calling thread.
+  def _raise_error(self):
+    if self._error is not None:
+      error, self._error = self._error, None
+      raise OSError(f"Failed to write results to \"{self.path}\".") from error
+
+
+class JsonlWriter(ResultsWriter):
+  """Results writer that appends one compact JSON line per prediction to a single file.
+  """
+
+  def _open(self):
+    self._file = open(self.path, "a")
+
+  def _write_batch(self,predictions: list):
+    self._file.write("".join(json.dumps(prediction) + "\n" for prediction in predictions))
+    self._file.flush()
+
+  def _close(self):
+    self._file.close()
+
+
+class PartWriter(ResultsWriter):
+  """Base class for writers of single file formats that cannot be appended to. Each batch is written to its
+  own numbered part file next to the output as soon as it is flushed, and the parts are merged into the output
+  on close. A run that crashes leaves its parts behind, which comp_viz.results.read_predictions() reads back.
+  """
+
+  def _open(self):
+    for fname in _get_part_fnames(self.path):
+      os.remove(fname)
+    self._parts = 0
+
+  def _write_batch(self,predictions: list):
+    fname = f"{self.path}.part{self._parts:06d}"
+    # write then rename, so a crash never leaves a partial part behind
+    self._write_part(predictions, f"{fname}.tmp")
+    os.replace(f"{fname}.tmp", fname)
+    self._parts += 1
+
+  def _close(self):
+    fnames = _get_part_fnames(self.path)
+    self._merge_parts(fnames)
+    for fname in fnames:
+      os.remove(fname)
+
+  # Write a batch of predictions to a part file.
+  def _write_part(self,predictions: list,fname: str):
+    raise NotImplementedError
+
+  # Merge the part files, in order, into the output.
+  def _merge_parts(self,fnames: list):
+    raise NotImplementedError
+
+
+class NpzWriter(PartWriter):
+  """Results writer that saves predictions as columns in a single compressed numpy .npz file. Detections
+  of every image are concatenated, with offsets marking where each image's detections start. Video frames
+  keep their frame index and timestamp in the frame and timestamp_ms columns, which are -1 and NaN for images.
+  """
+
+  def _write_part(self,predictions: list,fname: str):
+    counts = [len(prediction["class_ids"]) for prediction in predictions]
+    with open(fname, "wb") as f:
+      numpy.savez_compressed(f,
+                             image=numpy.array([str(prediction["image"]) for prediction in predictions]),
+                             network=numpy.array([prediction["network"] for prediction in predictions], dtype=str),
+                             resolution=numpy.array([prediction["resolution"] for prediction in predictions], dtype=numpy.int64),
+                             nms_thresh=numpy.array([prediction["nms_thresh"] for prediction in predictions], dtype=numpy.float32),
+                             time=numpy.array([prediction["time"] for prediction in predictions], dtype=numpy.float32),
+                             frame=numpy.array([prediction.get("frame", -1) for prediction in predictions], dtype=numpy.int64),
+                             timestamp_ms=numpy.array([prediction.get("timestamp_ms", numpy.nan) for prediction in predictions], dtype=numpy.float64),
+                             class_map=numpy.array([json.dumps(prediction["class_map"]) for prediction in predictions], dtype=str),
+                             offsets=numpy.concatenate([[0], numpy.cumsum(counts)]).astype(numpy.int64),
+                             class_ids=numpy.concatenate([numpy.asarray(prediction["class_ids"], dtype=numpy.int64) for prediction in predictions]),
+                             confidence_scores=numpy.concatenate([numpy.asarray(prediction["confidence_scores"], dtype=numpy.float32) for prediction in predictions]),
+                             bounding_boxes=numpy.concatenate([numpy.asarray(prediction["bounding_boxes"], dtype=numpy.float32).reshape(-1, 4) for prediction in predictions]))
+
+  def _merge_parts(self,fnames: list):
+    parts = []
+    for fname in fnames:
+      with numpy.load(fname) as data:
+        parts.append({key: data[key] for key in data.files})
+    keys = ["image", "network", "resolution", "nms_thresh", "time", "frame", "timestamp_ms", "class_map", "class_ids", "confidence_scores", "bounding_boxes"]
+    empty = {"image": numpy.zeros(0, dtype=str), "network": numpy.zeros(0, dtype=str), "resolution": numpy.zeros(0, dtype=numpy.int64),
+             "nms_thresh": numpy.zeros(0, dtype=numpy.float32), "time": numpy.zeros(0, dtype=numpy.float32), "frame": numpy.zeros(0, dtype=numpy.int64),
+             "timestamp_ms": numpy.zeros(0, dtype=numpy.float64), "class_map": numpy.zeros(0, dtype=str),
+             "class_ids": numpy.zeros(0, dtype=numpy.int64), "confidence_scores": numpy.zeros(0, dtype=numpy.float32),
+             "bounding_boxes": numpy.zeros((0, 4), dtype=numpy.float32)}
+    columns = {key: numpy.concatenate([part[key] for part in parts] or [empty[key]]) for key in keys}
+    counts = numpy.concatenate([numpy.diff(part["offsets"]) for part in parts] or [numpy.zeros(0, dtype=numpy.int64)])
+    columns["offsets"] = numpy.concatenate([[0], numpy.cumsum(counts)]).astype(numpy.int64)
+    with open(self.path, "wb") as f:
+      numpy.savez_compressed(f, **columns)
+
+
+class ParquetWriter(PartWriter):
+  """Results writer that saves predictions to a single parquet file with pandas, one row per image. Requires
+  pyarrow or fastparquet to be installed.
+  """
+
+  def _open(self):
+    import pandas
+    try:
+      pandas.io.parquet.get_engine("auto")
+    except ImportError as e:
+      raise ImportError("Writing parquet results requires pyarrow or fastparquet to be installed.") from e
+    self._pandas = pandas
+    super()._open()
+
+  def _write_part(self,predictions: list,fname: str):
+    rows = []
+    for prediction in predictions:
+      row = dict(prediction)
+      row["image"] = None if row["image"] is None else str(row["image"])
+      row["class_map"] = json.dumps(row["class_map"])
+      rows.append(row)
+    self._pandas.DataFrame(rows).to_parquet(fname, index=False)
+
+  def _merge_parts(self,fnames: list):
+    frames = [self._pandas.read_parquet(fname) for fname in fnames]
+    frame = self._pandas.concat(frames, ignore_index=True) if frames else self._pandas.DataFrame()
+    frame.to_parquet(self.path, index=False)
+
+
+class PerFileWriter(ResultsWriter):
+  """Results writer that saves each prediction as indented JSON to its own "<image name>.txt" file in a
+  directory. Images that share a name are given a numbered suffix rather than overwriting each other.
+  """
+
+  def _open(self):
+    if not os.path.isdir(self.path):
+      raise OSError(f"Directory \"{self.path}\" could not be located.")
+    self._used_stems = set()
+
+  def _write_batch(self,predictions: list):
+    for prediction in predictions:
+      stem = self._unique_stem(prediction)
+      with open(f"{os.path.join(self.path,stem)}.txt", "w") as f:
+        f.write(json.dumps(prediction,indent=2))
+
+  # Get a file name stem for a prediction that has not yet been used by this writer.
+  def _unique_stem(self,prediction: dict) -> str:
+    stem = pathlib.Path(prediction["image"]).stem if prediction["image"] else "image"
+    candidate = stem
+    i = 0
+    while candidate in self._used_stems:
+      i += 1
+      candidate = f"{stem}_{i}"
+    self._used_stems.add(candidate)
+    return candidate
+
+
+# Get the sorted paths of the part files a PartWriter has left next to an output path.
+def _get_part_fnames(path: str) -> list:
+  return sorted(fname for fname in glob.glob(f"{glob.escape(str(path))}.part*") if not fname.endswith(".tmp"))
+
+_writers = {"jsonl": JsonlWriter, "npz": NpzWriter, "parquet": ParquetWriter, "files": PerFileWriter}
+
+def get_writer(fmt: str, path: str, **kwargs) -> ResultsWriter:
+  """Get a results writer for one of the supported formats in config.Results.formats.
+
+  :param fmt: Results format. Ex. "jsonl", "npz", "parquet" or "files"
+  :type fmt: string
+  :param path: Path of the file, or directory for the "files" format, results are written to.
+  :type path: string
+  :rtype: ResultsWriter
+  """
+  if fmt not in results_config.formats:
+    raise ValueError(f"{fmt} is an invalid results format.")
+  return _writers[fmt](path, **kwargs)
+
+def get_formats() -> list:
+  """Get list of the supported results formats.
+
+  :rtype: List
+  """
+  return list(results_config.formats)
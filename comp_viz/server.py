@@ -0,0 +1,435 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+# Local HTTP inference server for the object detection networks supported by comp_viz. Networks are loaded
+# once and kept warm, and concurrent requests for the same network are gathered into micro-batches so many
+# producers share a few loaded networks instead of each paying the time to load one.
+# Endpoints:
+#   POST /predict   Body is either encoded image file bytes, or JSON {"path": ...} naming an image file on
+#                   this machine. Query parameters (or JSON keys): network, nms, nms_iou, classes (comma separated).
+#                   Responds with the same prediction dict Model.get_prediction() returns.
+#   GET  /metrics   Queue depths, micro-batch sizes, request latencies and counters as JSON.
+#   GET  /health    Responds with {"status": "ok"} while the server accepts requests.
+# Usage:
+#   python -m comp_viz.server --networks yolo3_mobilenet1.0_coco --port 8080
+#   curl --data-binary @dog.jpg "localhost:8080/predict?nms=0.5&classes=dog,person"
+
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import collections
+import urllib.parse
+import concurrent.futures
+
+import numpy
+
+from . import utils
+from . import object_detection
+from .config import Server as server_config
+
+_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class InferenceServer:
+  """Asyncio based local HTTP server holding warm object detection models and answering prediction requests
+  in micro-batches. A micro-batch starts with the first waiting request and is closed once it holds
+  max_batch_size requests or max_wait_ms have passed. Each network runs on its own thread, so the event loop
+  keeps accepting requests while a batch is in the network. When max_queue requests are already waiting for
+  a network, new requests for it are turned away with 503 rather than queued without bound.
+
+  :param networks: Networks to load before serving. Defaults to the first network in config.ObjectDetection.networks.
+                   Requests may name other networks, which are loaded on first use. Every network served keeps its own
+                   model for the server's lifetime, outside the process-wide model registry, so serving more networks
+                   than the registry holds never reloads them.
+  :type networks: List[string]
+  :param host: Address to listen on.
+  :type host: string
+  :param port: Port to listen on.
+  :type port: int
+  :param max_batch_size: Maximum number of requests gathered into one micro-batch.
+  :type max_batch_size: int
+  :param max_wait_ms: Maximum milliseconds the first request of a micro-batch waits for more requests to join it.
+  :type max_wait_ms: float
+  :param max_queue: Maximum number of requests waiting per network.
+  :type max_queue: int
+  :param max_body_bytes: Maximum size in bytes of a request body.
+  :type max_body_bytes: int
+  """
+
+  def __init__(self,networks=None,host=server_config.host,port=server_config.port,max_batch_size=server_config.max_batch_size,
+               max_wait_ms=server_config.max_wait_ms,max_queue=server_config.max_queue,max_body_bytes=server_config.max_body_bytes):
+    """Constructor method
+    """
+    if max_batch_size < 1:
+      raise ValueError(f"{max_batch_size} is an invalid batch size.")
+    if max_wait_ms < 0:
+      raise ValueError(f"{max_wait_ms} is an invalid wait time.")
+    if max_queue < 1:
+      raise ValueError(f"{max_queue} is an invalid queue size.")
+    self.networks = list(networks or utils.ObjectDetection.get_networks()[:1])
+    for network in self.networks:
+      if network not in utils.ObjectDetection.get_networks():
+        raise ValueError(f"{network} is an invalid network.")
+    self.host = host
+    self.port = port
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait_ms / 1000
+    self.max_queue = max_queue
+    self.max_body_bytes = max_body_bytes
+    self._batchers = {}
+    self._server = None
+    self._connections = set()
+    self._stopping = None
+    self._stopped = None
+    self._in_flight = 0
+    self._latencies = collections.deque(maxlen=server_config.latency_window)
+    self._counters = collections.Counter()
+    self._started = time.time()
+
+  async def start(self):
+    """Load the networks and start listening.
+
+    :rtype: void
+    """
+    self._stopping = asyncio.Event()
+    self._stopped = asyncio.Event()
+    for network in self.networks:
+      await self._get_batcher(network).get_model()
+    self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+    print(f"Serving {', '.join(self.networks)} on http://{self.host}:{self.port}")
+
+  async def shutdown(self):
+    """Stop accepting connections and requests, answer every request already queued, then stop the networks' threads.
+
+    :rtype: void
+    """
+    if self._stopping.is_set():
+      return
+    self._stopping.set()
+    self._server.close()
+    for batcher in list(self._batchers.values()):
+      await batcher.close()
+    # let every answered request send its response before closing the connections left idle
+    while self._in_flight:
+      await asyncio.sleep(0.01)
+    for writer in list(self._connections):
+      writer.close()
+    await self._server.wait_closed()
+    self._stopped.set()
+    print("Server stopped.")
+
+  async def serve(self):
+    """Start the server and serve until SIGINT or SIGTERM, then shut down gracefully.
+
+    :rtype: void
+    """
+    await self.start()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+      try:
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(self.shutdown()))
+      except NotImplementedError:
+        pass
+    await self._stopped.wait()
+
+  def get_metrics(self) -> dict:
+    """Get the queue depth and micro-batch sizes of each network, request latencies in milliseconds and request counters.
+
+    :rtype: dict
+    """
+    latencies = numpy.asarray(self._latencies) * 1000
+    if latencies.shape[0]:
+      latency = {"count": int(latencies.shape[0]),
+                 "mean_ms": round(float(latencies.mean()), 3),
+                 "p50_ms": round(float(numpy.percentile(latencies, 50)), 3),
+                 "p95_ms": round(float(numpy.percentile(latencies, 95)), 3),
+                 "p99_ms": round(float(numpy.percentile(latencies, 99)), 3)}
+    else:
+      latency = {"count": 0}
+    return {"uptime_s": round(time.time() - self._started, 3),
+            "networks": {network: batcher.get_metrics() for network, batcher in self._batchers.items()},
+            "latency": latency,
+            "counters": dict(self._counters)}
+
+  # Get the batcher of a network, creating it, and starting to load its model, the first time the network is requested.
+  def _get_batcher(self,network: str):
+    batcher = self._batchers.get(network)
+    if batcher is None:
+      batcher = _Batcher(network, self.max_batch_size, self.max_wait, self.max_queue)
+      self._batchers[network] = batcher
+    return batcher
+
+  # Serve the requests of one connection until the client closes it, asks to close it, or the server stops.
+  async def _handle_connection(self,reader,writer):
+    self._connections.add(writer)
+    try:
+      while not self._stopping.is_set():
+        request = await _read_request(reader, self.max_body_bytes)
+        if request is None:
+          break
+        if isinstance(request, int):
+          await _write_response(writer, request, {"error": _reasons[request]}, False)
+          break
+        method, target, headers, body = request
+        keep_alive = headers.get("connection", "").lower() != "close"
+        self._in_flight += 1
+        try:
+          status, payload = await self._handle_request(method, target, headers, body)
+          await _write_response(writer, status, payload, keep_alive and not self._stopping.is_set())
+        finally:
+          self._in_flight -= 1
+        if not keep_alive:
+          break
+    except (ConnectionError, asyncio.IncompleteReadError):
+      pass
+    finally:
+      self._connections.discard(writer)
+      writer.close()
+
+  # Route a request, returning the status code and JSON payload of the response.
+  async def _handle_request(self,method,target,headers,body) -> tuple:
+    url = urllib.parse.urlsplit(target)
+    if url.path == "/health" and method == "GET":
+      return 200, {"status": "ok"}
+    if url.path == "/metrics" and method == "GET":
+      return 200, self.get_metrics()
+    if url.path != "/predict":
+      return 404, {"error": f"{url.path} is an invalid endpoint."}
+    if method != "POST":
+      return 405, {"error": f"{method} is an invalid method for /predict."}
+    if self._stopping.is_set():
+      return 503, {"error": "Server is shutting down."}
+    start = time.perf_counter()
+    self._counters["requests"] += 1
+    try:
+      network, source, nms, classes, nms_iou = self._parse_predict(url.query, headers, body)
+    except (ValueError, OSError) as e:
+      self._counters["rejected_invalid"] += 1
+      return 400 if isinstance(e, ValueError) else 404, {"error": str(e)}
+    batcher = self._get_batcher(network)
+    try:
+      model = await batcher.get_model()
+    except Exception as e:
+      self._counters["failed"] += 1
+      return 500, {"error": str(e)}
+    if classes is not None:
+      try:
+        model._resolve_classes(classes)
+      except ValueError as e:
+        self._counters["rejected_invalid"] += 1
+        return 400, {"error": str(e)}
+    try:
+      future = batcher.submit(source, nms, classes, nms_iou)
+    except asyncio.QueueFull:
+      self._counters["rejected_busy"] += 1
+      return 503, {"error": f"Queue for {network} is full."}
+    try:
+      prediction = await future
+    except Exception as e:
+      self._counters["failed"] += 1
+      return 500, {"error": str(e)}
+    self._latencies.append(time.perf_counter() - start)
+    self._counters["predicted"] += 1
+    return 200, prediction
+
+  # Get the network, image source, nms threshold, object classes and suppression IoU threshold of a /predict request. Raises ValueError
+  # for invalid parameters and OSError for a path that does not exist.
+  def _parse_predict(self,query,headers,body) -> tuple:
+    params = {key: values[-1] for key, values in urllib.parse.parse_qs(query).items()}
+    if headers.get("content-type", "").split(";")[0].strip() == "application/json":
+      try:
+        params.update(json.loads(body))
+      except (ValueError, TypeError):
+        raise ValueError("Request body is invalid JSON.") from None
+      if "path" not in params:
+        raise ValueError("JSON requests must name an image file under \"path\".")
+      source = str(params["path"])
+      utils.Tools.verify_exists(source)
+    elif body:
+      source = body
+    else:
+      raise ValueError("Request body is empty.")
+    network = params.get("network") or self.networks[0]
+    if network not in utils.ObjectDetection.get_networks():
+      raise ValueError(f"{network} is an invalid network.")
+    try:
+      nms = float(params.get("nms", 0.))
+    except (ValueError, TypeError):
+      raise ValueError(f"{params.get('nms')} is an invalid nms threshold.") from None
+    nms_iou = params.get("nms_iou")
+    if nms_iou is not None:
+      try:
+        nms_iou = float(nms_iou)
+      except (ValueError, TypeError):
+        raise ValueError(f"{nms_iou} is an invalid IoU threshold.") from None
+      if not 0 <= nms_iou <= 1:
+        raise ValueError(f"{nms_iou} is an invalid IoU threshold.")
+    classes = params.get("classes")
+    if isinstance(classes, str):
+      classes = classes.split(",")
+    if classes is not None:
+      if not isinstance(classes, (list, tuple)) or not all(isinstance(obj_class, str) for obj_class in classes):
+        raise ValueError(f"{classes} are invalid object classes.")
+      classes = tuple(utils.ObjectDetection.format_object_classes(list(classes)))
+    return network, source, nms, classes, nms_iou
+
+
+class _Batcher:
+  """Queue of the requests waiting for one network, and the task gathering them into micro-batches and
+  running them on the network's own thread. The network's model is loaded on that thread when the batcher is
+  created and held by the batcher from then on.
+  """
+
+  def __init__(self,network,max_batch_size,max_wait,max_queue):
+    self.network = network
+    self.model = None
+    self._max_batch_size = max_batch_size
+    self._max_wait = max_wait
+    self._queue = asyncio.Queue(maxsize=max_queue)
+    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    self._batch_sizes = collections.Counter()
+    self._loading = asyncio.get_running_loop().run_in_executor(self._executor, object_detection.Model, network)
+    self._task = asyncio.ensure_future(self._run())
+
+  # Wait for the network's model to be loaded and get it.
+  async def get_model(self):
+    if self.model is None:
+      self.model = await self._loading
+    return self.model
+
+  def submit(self,source,nms,classes,nms_iou=None) -> asyncio.Future:
+    future = asyncio.get_running_loop().create_future()
+    self._queue.put_nowait((source, nms, classes, nms_iou, future))
+    return future
+
+  def get_metrics(self) -> dict:
+    batches = sum(self._batch_sizes.values())
+    images = sum(size * count for size, count in self._batch_sizes.items())
+    return {"queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "mean_batch_size": round(images / batches, 3) if batches else 0.,
+            "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())}}
+
+  # Answer every queued request, then stop.
+  async def close(self):
+    await self._queue.put(None)
+    await self._task
+    self._executor.shutdown(wait=True)
+
+  # Gather queued requests into micro-batches and run them until close() is called.
+  async def _run(self):
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+      item = await self._queue.get()
+      if item is None:
+        break
+      batch = [item]
+      deadline = loop.time() + self._max_wait
+      while len(batch) < self._max_batch_size:
+        timeout = deadline - loop.time()
+        try:
+          item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+        except (asyncio.QueueEmpty, asyncio.TimeoutError):
+          break
+        if item is None:
+          stopping = True
+          break
+        batch.append(item)
+      self._batch_sizes[len(batch)] += 1
+      try:
+        results = await loop.run_in_executor(self._executor, self._predict, [item[:4] for item in batch])
+      except Exception as e:
+        results = [e] * len(batch)
+      for (_, _, _, _, future), result in zip(batch, results):
+        if future.done():
+          continue
+        if isinstance(result, Exception):
+          future.set_exception(result)
+        else:
+          future.set_result(result)
+
+  # Predict for a micro-batch on the network's thread. Requests sharing an nms threshold, object classes and
+  # suppression IoU threshold run through the network together. Returns a prediction dict, or the exception raised, per request.
+  # Requests are only submitted once the model is loaded, see InferenceServer._handle_request.
+  def _predict(self,requests: list) -> list:
+    model = self.model
+    groups = collections.defaultdict(list)
+    for i, (_, nms, classes, nms_iou) in enumerate(requests):
+      groups[(nms, classes, nms_iou)].append(i)
+    results = [None] * len(requests)
+    for (nms, classes, nms_iou), indices in groups.items():
+      sources = [requests[i][0] for i in indices]
+      try:
+        predictions = model.get_predictions(sources,nms,len(sources),classes,nms_iou)
+      except Exception:
+        # one bad image fails its whole group, so retry one at a time to fail only that request
+        predictions = []
+        for source in sources:
+          try:
+            predictions.append(model.get_prediction(source,nms,classes,nms_iou))
+          except Exception as e:
+            predictions.append(e)
+      for i, prediction in zip(indices, predictions):
+        results[i] = prediction
+    return results
+
+# Read one HTTP/1.1 request. Returns (method, target, headers, body), None once the client closes the
+# connection, or the status code of the error response for a malformed or oversized request.
+async def _read_request(reader,max_body_bytes):
+  try:
+    head = await reader.readuntil(b"\r\n\r\n")
+  except asyncio.IncompleteReadError:
+    return None
+  except asyncio.LimitOverrunError:
+    return 413
+  lines = head.decode("latin-1").split("\r\n")
+  try:
+    method, target, _ = lines[0].split(" ", 2)
+  except ValueError:
+    return 400
+  headers = {}
+  for line in lines[1:]:
+    if ":" in line:
+      key, value = line.split(":", 1)
+      headers[key.strip().lower()] = value.strip()
+  try:
+    length = int(headers.get("content-length", 0))
+  except ValueError:
+    return 400
+  if length < 0:
+    return 400
+  if length > max_body_bytes:
+    return 413
+  body = await reader.readexactly(length) if length else b""
+  return method.upper(), target, headers, body
+
+# Write a JSON response.
+async def _write_response(writer,status,payload,keep_alive):
+  body = json.dumps(payload).encode()
+  head = (f"HTTP/1.1 {status} {_reasons[status]}\r\n"
+          f"Content-Type: application/json\r\n"
+          f"Content-Length: {len(body)}\r\n"
+          f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n")
+  if status == 503:
+    head += "Retry-After: 1\r\n"
+  writer.write(head.encode() + b"\r\n" + body)
+  await writer.drain()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Local HTTP inference server for the comp_viz object detection networks.")
+  parser.add_argument("--networks", nargs="+", choices=utils.ObjectDetection.get_networks(), help="networks to load before serving (default: the first)")
+  parser.add_argument("--host", default=server_config.host, help="address to listen on")
+  parser.add_argument("--port", type=int, default=server_config.port, help="port to listen on")
+  parser.add_argument("--max-batch-size", type=int, default=server_config.max_batch_size, help="maximum requests per micro-batch")
+  parser.add_argument("--max-wait-ms", type=float, default=server_config.max_wait_ms, help="maximum milliseconds a micro-batch waits to fill")
+  parser.add_argument("--max-queue", type=int, default=server_config.max_queue, help="maximum requests waiting per network")
+  args = parser.parse_args(argv)
+  server = InferenceServer(args.networks, args.host, args.port, args.max_batch_size, args.max_wait_ms, args.max_queue)
+  asyncio.run(server.serve())
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
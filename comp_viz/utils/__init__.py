@@ -1 +1,4 @@
-from .toolbox import *
\ No newline at end of file
+from .lazy import *
+from .toolbox import *
+from .instrumentation import *
+from .render import *
\ No newline at end of file
@@ -0,0 +1,205 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import json
+import time
+import threading
+import contextlib
+
+from .lazy import lazy_import
+
+numpy = lazy_import("numpy")
+mxnet = lazy_import("mxnet")
+
+class Instrumentation:
+  """Recorder of per-stage timings and counters for the comp_viz package. Once enabled through
+  Instrument.enable(), the object detection model and the utils helpers report the time spent in each
+  stage of a prediction ("decode", "preprocess", "forward", "postprocess", "draw", "write") and counters
+  such as the number of images, boxes and bytes decoded.
+
+  :param sync: Whether to wait on MXNet's asynchronous engine at the end of every stage, so time is
+               attributed to the stage that queued the work rather than the stage that first reads its
+               results. Serializes pipelined work while enabled.
+  :type sync: boolean
+  :param profile: Whether to record mxnet.profiler traces around forward passes.
+  :type profile: boolean
+  :param profile_fname: Path the mxnet.profiler trace is written to by dump_profile().
+  :type profile_fname: string
+  :ivar stage_times: Dictionary mapping each stage to the list of seconds each run of it took.
+  :ivar counters: Dictionary mapping each counter to its value.
+  """
+
+  def __init__(self,sync=True,profile=False,profile_fname="profile.json"):
+    """Constructor method
+    """
+    self.sync = sync
+    self.profile = profile
+    self.profile_fname = profile_fname
+    self.stage_times = {}
+    self.counters = {}
+    self._callbacks = []
+    self._lock = threading.Lock()
+    if profile:
+      mxnet.profiler.set_config(profile_all=True, aggregate_stats=True, filename=profile_fname)
+
+  @contextlib.contextmanager
+  def stage(self,name: str):
+    """Context manager timing the code run inside it as a run of the named stage.
+
+    :param name: Name of the stage.
+    :type name: string
+    """
+    profiling = self.profile and name == "forward"
+    if profiling:
+      mxnet.profiler.set_state("run")
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      if self.sync:
+        mxnet.nd.waitall()
+      elapsed = time.perf_counter() - start
+      if profiling:
+        mxnet.profiler.set_state("stop")
+      with self._lock:
+        self.stage_times.setdefault(name, []).append(elapsed)
+      for callback in self._callbacks:
+        callback("stage", name, elapsed)
+
+  def count(self,name: str,value=1):
+    """Add to the named counter.
+
+    :param name: Name of the counter.
+    :type name: string
+    :param value: Amount to add.
+    :type value: int
+    :rtype: void
+    """
+    with self._lock:
+      self.counters[name] = self.counters.get(name, 0) + value
+    for callback in self._callbacks:
+      callback("count", name, value)
+
+  def add_callback(self,callback):
+    """Register a function called with (kind, name, value) for every recorded event, where kind is
+    "stage" with the seconds taken as value, or "count" with the amount added as value. Useful for
+    exporting to external metrics systems.
+
+    :param callback: Function to call.
+    :type callback: Callable
+    :rtype: void
+    """
+    self._callbacks.append(callback)
+
+  def remove_callback(self,callback):
+    """Unregister a function registered with add_callback().
+
+    :param callback: Function to remove.
+    :type callback: Callable
+    :rtype: void
+    """
+    self._callbacks.remove(callback)
+
+  def get_summary(self) -> dict:
+    """Get a summary of the recorded stage timings, in milliseconds, and counters.
+
+    :rtype: dict
+    """
+    with self._lock:
+      stage_times = {name: list(times) for name, times in self.stage_times.items()}
+      counters = dict(self.counters)
+    stages = {}
+    for name, times in stage_times.items():
+      times = numpy.asarray(times) * 1000
+      stages[name] = {"count": int(times.shape[0]),
+                      "total_ms": round(float(times.sum()), 3),
+                      "mean_ms": round(float(times.mean()), 3),
+                      "p50_ms": round(float(numpy.percentile(times, 50)), 3),
+                      "p95_ms": round(float(numpy.percentile(times, 95)), 3),
+                      "p99_ms": round(float(numpy.percentile(times, 99)), 3)}
+    return {"stages": stages, "counters": counters}
+
+  def write_summary(self,path: str):
+    """Write the summary from get_summary() as JSON to the path specified.
+
+    :param path: Path to write the summary to.
+    :type path: string
+    :rtype: void
+    """
+    with open(path, "w") as f:
+      f.write(json.dumps(self.get_summary(),indent=2))
+
+  def dump_profile(self):
+    """Write the mxnet.profiler trace recorded around forward passes to profile_fname.
+
+    :rtype: void
+    """
+    if not self.profile:
+      raise ValueError("Profiling was not enabled for this instrumentation.")
+    mxnet.profiler.dump()
+
+  def reset(self):
+    """Clear every recorded stage timing and counter.
+
+    :rtype: void
+    """
+    with self._lock:
+      self.stage_times.clear()
+      self.counters.clear()
+
+
+class Instrument:
+  """Utility class centered around the process-wide instrumentation of the comp_viz package. While no
+  instrumentation is enabled, stage() and count() do no work beyond a single check.
+  """
+
+  def enable(instrumentation=None) -> Instrumentation:
+    """Start recording stage timings and counters process-wide.
+
+    :param instrumentation: Instrumentation to record to. Defaults to a new Instrumentation().
+    :type instrumentation: Instrumentation
+    :rtype: Instrumentation
+    """
+    global _active
+    _active = instrumentation or Instrumentation()
+    return _active
+
+  def disable():
+    """Stop recording stage timings and counters.
+
+    :rtype: void
+    """
+    global _active
+    _active = None
+
+  def get() -> Instrumentation:
+    """Get the enabled instrumentation, or None if instrumentation is disabled.
+
+    :rtype: Instrumentation
+    """
+    return _active
+
+  def stage(name: str):
+    """Context manager timing the code run inside it as a run of the named stage, if instrumentation is enabled.
+
+    :param name: Name of the stage.
+    :type name: string
+    """
+    if _active is None:
+      return _null_stage
+    return _active.stage(name)
+
+  def count(name: str, value=1):
+    """Add to the named counter, if instrumentation is enabled.
+
+    :param name: Name of the counter.
+    :type name: string
+    :param value: Amount to add.
+    :type value: int
+    :rtype: void
+    """
+    if _active is not None:
+      _active.count(name, value)
+
+_active = None
+_null_stage = contextlib.nullcontext()
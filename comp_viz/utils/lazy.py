@@ -0,0 +1,46 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+import sys
+import types
+import importlib
+import threading
+
+# Serializes the first use of lazily imported modules, so threads using one at once import it exactly once.
+_import_lock = threading.RLock()
+
+def lazy_import(name: str):
+  """Get a top-level module that is only imported once one of its attributes is first used, so heavy
+  dependencies such as mxnet, gluoncv and cv2 cost nothing to processes that never use them. A module that is
+  already imported is returned as is. If the module is not installed, ModuleNotFoundError is raised on first use
+  rather than here. The import happens under a lock, so threads may first use a module at the same time.
+
+  :param name: Name of the module. Ex. "mxnet"
+  :type name: string
+  :rtype: module
+  """
+  module = sys.modules.get(name)
+  if module is not None:
+    return module
+  return _LazyModule(name)
+
+class _LazyModule(types.ModuleType):
+  """Stand-in for a module that is imported on first use, forwarding attribute lookups to it from then on and
+  keeping the attributes looked up so later lookups cost no more than on the module itself. The module is
+  imported with importlib under a lock, rather than with importlib.util.LazyLoader, which is not safe to first
+  use from several threads before Python 3.12.
+  """
+
+  def __getattr__(self,attr):
+    if attr.startswith("__"):
+      raise AttributeError(attr)
+    module = self.__dict__.get("_module")
+    if module is None:
+      with _import_lock:
+        module = self.__dict__.get("_module")
+        if module is None:
+          module = importlib.import_module(self.__name__)
+          self.__dict__["_module"] = module
+    value = getattr(module, attr)
+    self.__dict__[attr] = value
+    return value
\ No newline at end of file
@@ -0,0 +1,206 @@
+# Author(s): Lucas Hirt
+# Date Modified: 11/27/2022
+
+from __future__ import annotations
+
+import os
+import threading
+import concurrent.futures
+
+from ..config import Render as render_config
+from .instrumentation import Instrument
+from .lazy import lazy_import
+
+numpy = lazy_import("numpy")
+mxnet = lazy_import("mxnet")
+cv2 = lazy_import("cv2")
+
+class Renderer:
+  """Draws bounding box detections onto decoded images and saves them on a pool of threads. Class colors
+  and class name labels are computed once and reused for every image.
+
+  :param class_names: List of object classes that class ids index into.
+  :type class_names: List[string]
+  :param workers: Number of threads encoding and saving images.
+  :type workers: int
+  :param jpeg_quality: JPEG quality (0-100) of saved images.
+  :type jpeg_quality: int
+  :param png_compression: PNG compression level (0-9) of saved images.
+  :type png_compression: int
+  :param preview_size: Longest side in pixels of a downscaled preview saved as "<name>_preview.jpg" next to each image. 0 disables previews.
+  :type preview_size: int
+  :param thickness: Line thickness in pixels of bounding boxes.
+  :type thickness: int
+  :param font_scale: Scale of the label text drawn above bounding boxes.
+  :type font_scale: float
+  """
+
+  def __init__(self,class_names: list,workers=render_config.workers,jpeg_quality=render_config.jpeg_quality,
+               png_compression=render_config.png_compression,preview_size=render_config.preview_size,
+               thickness=render_config.thickness,font_scale=render_config.font_scale):
+    """Constructor method
+    """
+    if workers < 1:
+      raise ValueError(f"{workers} is an invalid number of workers.")
+    self._class_names = list(class_names)
+    self._colors = _get_class_colors(len(self._class_names))
+    self._labels = {}
+    self._jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    self._png_params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    self._preview_size = preview_size
+    self._thickness = thickness
+    self._font_scale = font_scale
+    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    # bounds the number of frames waiting to be saved so memory stays flat when saving falls behind
+    self._slots = threading.BoundedSemaphore(workers * 4)
+    self._futures = []
+
+  def draw(self,img,bboxes,class_ids,scores=None,thresh=0.) -> numpy.ndarray:
+    """Draw bounding boxes and labels onto an image. Numpy images are drawn onto in place.
+
+    :param img: RGB image of shape (height, width, 3).
+    :type img: numpy.ndarray or mxnet.ndarray.ndarray.NDArray
+    :param bboxes: Bounding boxes of form [[x_min,y_min,x_max,y_max],...].
+    :type bboxes: numpy.ndarray or List[List]
+    :param class_ids: Class id of each bounding box.
+    :type class_ids: numpy.ndarray or List[int]
+    :param scores: Confidence score of each bounding box, drawn next to the class name if given.
+    :type scores: numpy.ndarray or List[float]
+    :param thresh: Minimum confidence score of the bounding boxes drawn.
+    :type thresh: float
+    :rtype: numpy.ndarray
+    """
+    if isinstance(img, mxnet.nd.NDArray):
+      img = img.asnumpy()
+    with Instrument.stage("draw"):
+      bboxes = numpy.asarray(bboxes, dtype=numpy.float64).reshape(-1, 4)
+      class_ids = numpy.asarray(class_ids, dtype=numpy.int64).reshape(-1)
+      if scores is not None:
+        scores = numpy.asarray(scores, dtype=numpy.float64).reshape(-1)
+        keep = scores >= thresh
+        bboxes, class_ids, scores = bboxes[keep], class_ids[keep], scores[keep]
+      height, width = img.shape[:2]
+      corners = numpy.round(bboxes).astype(numpy.int64)
+      corners[:, [0, 2]] = numpy.clip(corners[:, [0, 2]], 0, width - 1)
+      corners[:, [1, 3]] = numpy.clip(corners[:, [1, 3]], 0, height - 1)
+      for i, (x_min, y_min, x_max, y_max) in enumerate(corners.tolist()):
+        class_id = int(class_ids[i])
+        color = self._colors[class_id % len(self._colors)]
+        cv2.rectangle(img, (x_min, y_min), (x_max, y_max), color, self._thickness)
+        label, text_y = self._get_label(class_id)
+        right, top = self._blit(img, label, x_min, y_min)
+        if scores is not None:
+          cv2.putText(img, f"{scores[i]:.2f}", (right + 2, top + text_y),
+                      cv2.FONT_HERSHEY_SIMPLEX, self._font_scale, color, 1, cv2.LINE_AA)
+    return img
+
+  def save(self,img,bboxes,class_ids,scores,path: str,thresh=0.):
+    """Draw bounding boxes onto an image and save it to the path specified on the renderer's threads. The
+    image format follows the path's extension. The image must not be used by the caller afterwards.
+
+    :param img: RGB image of shape (height, width, 3).
+    :type img: numpy.ndarray or mxnet.ndarray.ndarray.NDArray
+    :param bboxes: Bounding boxes of form [[x_min,y_min,x_max,y_max],...].
+    :type bboxes: numpy.ndarray or List[List]
+    :param class_ids: Class id of each bounding box.
+    :type class_ids: numpy.ndarray or List[int]
+    :param scores: Confidence score of each bounding box.
+    :type scores: numpy.ndarray or List[float]
+    :param path: Path to save image to. The directory it is in must already exist.
+    :type path: string
+    :param thresh: Minimum confidence score of the bounding boxes drawn.
+    :type thresh: float
+    :return: Future that completes once the image is saved.
+    :rtype: concurrent.futures.Future
+    """
+    self._slots.acquire()
+    try:
+      future = self._executor.submit(self._draw_and_save, img, bboxes, class_ids, scores, path, thresh)
+    except Exception:
+      self._slots.release()
+      raise
+    future.add_done_callback(lambda _: self._slots.release())
+    self._futures = [f for f in self._futures if not f.done() or f.exception() is not None]
+    self._futures.append(future)
+    return future
+
+  def wait(self):
+    """Wait for every image handed to save() to be saved, raising the first error hit while saving.
+
+    :rtype: void
+    """
+    futures, self._futures = self._futures, []
+    for future in futures:
+      future.result()
+
+  def close(self):
+    """Wait for every image to be saved and stop the renderer's threads.
+
+    :rtype: void
+    """
+    try:
+      self.wait()
+    finally:
+      self._executor.shutdown(wait=True)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,exc_type,exc_value,traceback):
+    self.close()
+
+  # Draw onto an image, convert it to BGR in place and encode and write it. Runs on the worker threads.
+  def _draw_and_save(self,img,bboxes,class_ids,scores,path,thresh):
+    img = self.draw(img,bboxes,class_ids,scores,thresh)
+    with Instrument.stage("write"):
+      img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR, dst=img)
+      self._write(img, path)
+      if self._preview_size:
+        height, width = img.shape[:2]
+        scale = self._preview_size / max(height, width)
+        if scale < 1:
+          img = cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        self._write(img, f"{os.path.splitext(path)[0]}_preview.jpg")
+
+  # Encode a BGR image with the configured quality for the path's extension and write it.
+  def _write(self,img,path):
+    ext = os.path.splitext(path)[1].lower()
+    params = self._png_params if ext == ".png" else self._jpeg_params
+    ok, buf = cv2.imencode(ext or ".jpg", img, params)
+    if not ok:
+      raise OSError(f"Image could not be encoded for \"{path}\".")
+    with open(path, "wb") as f:
+      f.write(buf.tobytes())
+
+  # Get the label patch for a class and the y coordinate of its text baseline, rendering it the first
+  # time the class is drawn.
+  def _get_label(self,class_id) -> tuple:
+    label = self._labels.get(class_id)
+    if label is None:
+      name = self._class_names[class_id] if 0 <= class_id < len(self._class_names) else str(class_id)
+      (text_width, text_height), baseline = cv2.getTextSize(name, cv2.FONT_HERSHEY_SIMPLEX, self._font_scale, 1)
+      label = numpy.empty((text_height + baseline + 4, text_width + 4, 3), dtype=numpy.uint8)
+      label[:] = self._colors[class_id % len(self._colors)]
+      cv2.putText(label, name, (2, text_height + 2), cv2.FONT_HERSHEY_SIMPLEX, self._font_scale, (255, 255, 255), 1, cv2.LINE_AA)
+      label = (label, text_height + 2)
+      self._labels[class_id] = label
+    return label
+
+  # Copy a label patch onto an image just above a box corner, clipped to the image. Returns the x
+  # coordinate just right of the patch and the y coordinate of its top.
+  def _blit(self,img,label,x,y):
+    height, width = img.shape[:2]
+    top = max(y - label.shape[0], 0)
+    bottom = min(top + label.shape[0], height)
+    right = min(x + label.shape[1], width)
+    if bottom > top and right > x:
+      img[top:bottom, x:right] = label[:bottom - top, :right - x]
+    return right, top
+
+# Get a list of distinct RGB colors, one per class, that stay the same between runs.
+def _get_class_colors(count: int) -> list:
+  count = max(count, 1)
+  hues = (numpy.arange(count) * 180 * 0.618033988749895) % 180
+  hsv = numpy.stack([hues, numpy.full(count, 200), numpy.full(count, 230)], axis=1).astype(numpy.uint8).reshape(-1, 1, 3)
+  rgb = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB).reshape(-1, 3)
+  return [tuple(int(c) for c in color) for color in rgb]
@@ -1,14 +1,26 @@
 # Author(s): Lucas Hirt
 # Date Modified: 11/27/2022
 
+from __future__ import annotations
+
 import os
-import mxnet
-import gluoncv
-import numpy
-import cv2
+import zlib
+import fnmatch
 
 from ..config import Models as models_config
 from ..config import ObjectDetection as obj_det_config
+from .instrumentation import Instrument
+from .lazy import lazy_import
+
+numpy = lazy_import("numpy")
+mxnet = lazy_import("mxnet")
+gluoncv = lazy_import("gluoncv")
+cv2 = lazy_import("cv2")
+
+image_extensions = ["jpg","png","jpeg"]
+# OpenCV decode flags downscaling JPEG images by each factor while decoding them.
+_reduced_decode_flags = {2: "IMREAD_REDUCED_COLOR_2", 4: "IMREAD_REDUCED_COLOR_4", 8: "IMREAD_REDUCED_COLOR_8"}
+video_extensions = ["mp4","avi","mov","mkv","webm"]
 
 class Models:
   """Utility class centered around conveying available functionality for the comp_viz package. 
@@ -86,13 +98,43 @@ class ObjectDetection:
     :type dest: Tuple or ndarray.shape
     :rtype: list
     """
-    x_min, y_min, x_max, y_max = bbox[0], bbox[1], bbox[2], bbox[3]
+    return [float(corner) for corner in ObjectDetection.resize_bboxes(numpy.asarray(bbox, dtype=numpy.float64),orig,dest)]
+
+  def resize_bboxes(bboxes: numpy.ndarray, orig: tuple, dest: tuple) -> numpy.ndarray:
+    """Given an array of bounding boxes of the format [[x_min, y_min, x_max, y_max],...] and the original image resolution, return a new array of bounding boxes resized to the desired image size.
+
+    :param bboxes: Array of bounding boxes of shape (N,4), or a single bounding box of shape (4,).
+    :type bboxes: numpy.ndarray
+    :param orig: Original image resolution of form (height, width, shape). Ex. (500,800,3)
+    :type orig: Tuple or ndarray.shape
+    :param dest: Image to resize resolution of form (height, width, shape). Ex. (600,900,3)
+    :type dest: Tuple or ndarray.shape
+    :rtype: numpy.ndarray
+    """
     x_scale = dest[1] / orig[1]
     y_scale = dest[0] / orig[0]
-    return [float(numpy.round(x_min*x_scale)), 
-            float(numpy.round(y_min*y_scale)),
-            float(numpy.round(x_max*x_scale)),
-            float(numpy.round(y_max*y_scale))]
+    scale = numpy.array([x_scale, y_scale, x_scale, y_scale], dtype=bboxes.dtype)
+    return numpy.round(bboxes * scale)
+
+  def get_iou_matrix(bboxes_a: numpy.ndarray, bboxes_b: numpy.ndarray) -> numpy.ndarray:
+    """Given two arrays of bounding boxes of the format [[x_min, y_min, x_max, y_max],...], return the intersection over union of every pair of boxes.
+
+    :param bboxes_a: Array of bounding boxes of shape (N,4).
+    :type bboxes_a: numpy.ndarray
+    :param bboxes_b: Array of bounding boxes of shape (M,4).
+    :type bboxes_b: numpy.ndarray
+    :return: Array of shape (N,M), where element [i,j] is the intersection over union of bboxes_a[i] and bboxes_b[j].
+    :rtype: numpy.ndarray
+    """
+    a = numpy.asarray(bboxes_a, dtype=numpy.float64).reshape(-1, 4)[:, None, :]
+    b = numpy.asarray(bboxes_b, dtype=numpy.float64).reshape(-1, 4)[None, :, :]
+    width = numpy.clip(numpy.minimum(a[..., 2], b[..., 2]) - numpy.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = numpy.clip(numpy.minimum(a[..., 3], b[..., 3]) - numpy.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - intersection
+    return numpy.divide(intersection, union, out=numpy.zeros_like(intersection), where=union > 0)
 
   def show_pred_bboxes_image(img_fname: str, bboxes: list, labels = [], class_names = [], scores = []):
     """Given an image and detection bounding box features, plot the bounding box to the image and show it.
@@ -115,8 +157,8 @@ class ObjectDetection:
   def get_pred_bboxes_image(img_fname: str, bboxes: list, labels = [], class_names = [], scores = []):
     """Given an image and detection bounding box features, plot the bounding box to the image and return it.
 
-    :param img_fname: Path to image to plot bounding box to.
-    :type img_fname: string
+    :param img_fname: Path to image, encoded image file bytes, or already decoded RGB image to plot bounding box to.
+    :type img_fname: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
     :param bboxes: Bounding boxes of form [[x_min,y_min,x_max,y_max],...] to plot to the image/
     :type bboxes: List[List]
     :param labels: Class id values to mape to each bounding box and class name.
@@ -127,8 +169,49 @@ class ObjectDetection:
     :type scores: List[float]
     :rtype: numpy.ndarray
     """
-    img = Tools.get_mxnet_image(img_fname)
-    return gluoncv.utils.viz.cv_plot_bbox(img,numpy.array(bboxes),labels=numpy.array(labels),scores=numpy.array(scores),class_names=class_names,thresh=0.)
+    img = Tools.load_image(img_fname)
+    with Instrument.stage("draw"):
+      return gluoncv.utils.viz.cv_plot_bbox(img,numpy.array(bboxes),labels=numpy.array(labels),scores=numpy.array(scores),class_names=class_names,thresh=0.)
+
+  def get_shape_buckets(resolution: int) -> list:
+    """Get the input shape buckets a compiled network letterboxes images into for an inference resolution, derived from the aspect ratios in config.py.
+
+    :param resolution: Inference resolution (short side) of the network.
+    :type resolution: int
+    :return: List of (height, width) tuples, sorted from smallest to largest area.
+    :rtype: List[Tuple]
+    """
+    multiple = obj_det_config.bucket_multiple
+    short = int(numpy.ceil(resolution / multiple) * multiple)
+    buckets = set()
+    for ratio in obj_det_config.bucket_aspect_ratios:
+      long = int(numpy.ceil(resolution * ratio / multiple) * multiple)
+      buckets.add((short, long))
+      buckets.add((long, short))
+    return sorted(buckets, key=lambda bucket: (bucket[0] * bucket[1], bucket))
+
+  def get_tiles(shape: tuple, tile_size: int, overlap: float) -> numpy.ndarray:
+    """Get the overlapping square tiles covering an image, in row-major order. Tiles are tile_size on a side, or
+    the image's side if it is smaller, and the last tile of each row and column is shifted back to end at the
+    image's edge, so every tile lies fully within the image.
+
+    :param shape: Shape of the image of form (height, width, channels). Ex. (3000,4000,3)
+    :type shape: Tuple or ndarray.shape
+    :param tile_size: Side length in pixels of the tiles.
+    :type tile_size: int
+    :param overlap: Share of a tile's side overlapping the next tile. Ex. 0.2
+    :type overlap: float
+    :return: Array of shape (N,4) holding the [y_min,x_min,y_max,x_max] pixel bounds of each tile.
+    :rtype: numpy.ndarray
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+    starts = []
+    for length in shape[:2]:
+      last = max(length - tile_size, 0)
+      starts.append(numpy.unique(numpy.minimum(numpy.arange(0, last + stride, stride), last)))
+    ys, xs = numpy.meshgrid(starts[0], starts[1], indexing="ij")
+    mins = numpy.stack([ys.ravel(), xs.ravel()], axis=1)
+    return numpy.concatenate([mins, numpy.minimum(mins + tile_size, shape[:2])], axis=1)
 
   # Get list of networks available for object detection from config.py
   def _get_networks():
@@ -170,6 +253,174 @@ class Tools:
     Tools.verify_exists(fname)
     return mxnet.image.imread(fname)
 
+  def load_image(source, verify=True):
+    """Given a path to an image file, the encoded bytes of an image file, or an already decoded RGB image, return the said image in the form of an mxnet ndarray. Decoded images are passed through without being read again.
+
+    :param source: Path to file, encoded image file bytes, or decoded image of shape (height, width, 3).
+    :type source: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
+    :param verify: Whether to verify that a path exists before reading it.
+    :type verify: boolean
+    :rtype: mxnet.ndarray.ndarray.NDArray
+    """
+    if isinstance(source, mxnet.nd.NDArray):
+      return source
+    if isinstance(source, numpy.ndarray):
+      return mxnet.nd.array(source, dtype=numpy.uint8)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+      Instrument.count("bytes_decoded", len(source))
+      with Instrument.stage("decode"):
+        return mxnet.image.imdecode(bytes(source))
+    if verify:
+      Tools.verify_exists(source)
+    if Instrument.get() is not None:
+      Instrument.count("bytes_decoded", os.path.getsize(source))
+    with Instrument.stage("decode"):
+      return mxnet.image.imread(str(source))
+
+  def load_reduced_image(source, min_side: int, verify=True) -> tuple:
+    """Given a path to an image file, the encoded bytes of an image file, or an already decoded RGB image, return the said image in the form of an mxnet ndarray,
+    decoded at reduced resolution when that still leaves its short side at least min_side. JPEG images are downscaled by 2, 4 or 8 while decoding, in the DCT domain,
+    which decodes large images several times faster and never holds them in memory at full resolution. Other images are decoded as with load_image().
+
+    :param source: Path to file, encoded image file bytes, or decoded image of shape (height, width, 3).
+    :type source: string, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
+    :param min_side: Minimum length in pixels of the short side of the decoded image.
+    :type min_side: int
+    :param verify: Whether to verify that a path exists before reading it.
+    :type verify: boolean
+    :return: A pair of values, the decoded image and the shape it has at full resolution, for mapping bounding boxes back to it.
+    :rtype: (mxnet.ndarray.ndarray.NDArray, tuple)
+    """
+    if not isinstance(source, (bytes, bytearray, memoryview)) and not Tools.is_path(source):
+      image = Tools.load_image(source, verify=verify)
+      return image, image.shape
+    if Tools.is_path(source):
+      if verify:
+        Tools.verify_exists(source)
+      with open(source, "rb") as f:
+        source = f.read()
+    size = Tools._get_jpeg_size(source)
+    factor = 1
+    if size is not None:
+      factor = max([1] + [factor for factor in _reduced_decode_flags if -(-min(size) // factor) >= min_side])
+    if factor == 1:
+      image = Tools.load_image(source, verify=False)
+      return image, image.shape
+    Instrument.count("bytes_decoded", len(source))
+    with Instrument.stage("decode"):
+      image = cv2.imdecode(numpy.frombuffer(source, dtype=numpy.uint8), getattr(cv2, _reduced_decode_flags[factor]))
+      if image is None:
+        raise ValueError("Image could not be decoded.")
+      image = mxnet.nd.array(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), dtype=numpy.uint8)
+    height, width = size
+    # EXIF orientation is applied while decoding, which can swap the sides of the header's size
+    if image.shape[:2] != (-(-height // factor), -(-width // factor)):
+      height, width = width, height
+    return image, (height, width, image.shape[2])
+
+  def is_path(source) -> bool:
+    """Boolean function to determine if an image source is a path to a file rather than image data.
+
+    :param source: Path to file, encoded image file bytes, or decoded image.
+    :type source: string, os.PathLike, bytes, numpy.ndarray or mxnet.ndarray.ndarray.NDArray
+    :rtype: boolean
+    """
+    return isinstance(source, (str, os.PathLike))
+
+  def get_dir_images(dir: str) -> list:
+    """Given path to a directory, return a sorted list of paths to the image files directly inside it. Extensions are matched regardless of case.
+
+    :param dir: Path to directory.
+    :type dir: string
+    :rtype: List[string]
+    """
+    Tools.verify_exists(dir)
+    with os.scandir(dir) as entries:
+      return sorted(entry.path for entry in entries if entry.is_file() and Tools.is_image_fname(entry.name))
+
+  def iter_dir_images(dir: str, recursive=True, include=None, exclude=None, shard=None):
+    """Given path to a directory, lazily yield paths to the image files in it, so inference can start before the
+    whole tree is listed. Each directory is listed with os.scandir and sorted, so paths are yielded in the same
+    order on every run and every host. Extensions are matched regardless of case.
+
+    :param dir: Path to directory.
+    :type dir: string
+    :param recursive: Whether to descend into subdirectories.
+    :type recursive: boolean
+    :param include: Glob patterns, matched against paths relative to dir, of which an image must match at least one. Defaults to every image.
+    :type include: List[string]
+    :param exclude: Glob patterns, matched against paths relative to dir, of images and subdirectories to skip.
+    :type exclude: List[string]
+    :param shard: Pair (i, N) to only yield the i-th of N disjoint shards of the images, see parse_shard(). A
+                  path's shard is picked from a hash of its relative path, so hosts splitting one dataset
+                  need no coordination.
+    :type shard: (int, int)
+    :rtype: Iterator[string]
+    """
+    Tools.verify_exists(dir)
+    if shard is not None:
+      index, count = shard
+      if count < 1 or not 0 <= index < count:
+        raise ValueError(f"{index}/{count} is an invalid shard.")
+    include = list(include or [])
+    exclude = list(exclude or [])
+    stack = [(dir, "")]
+    while stack:
+      path, rel_dir = stack.pop()
+      with os.scandir(path) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+      subdirs = []
+      for entry in entries:
+        rel_path = f"{rel_dir}{entry.name}"
+        if Tools._matches(rel_path, exclude):
+          continue
+        if entry.is_dir():
+          if recursive:
+            subdirs.append((entry.path, f"{rel_path}/"))
+          continue
+        if not entry.is_file() or not Tools.is_image_fname(entry.name):
+          continue
+        if include and not Tools._matches(rel_path, include):
+          continue
+        if shard is not None and zlib.crc32(rel_path.encode()) % shard[1] != shard[0]:
+          continue
+        yield entry.path
+      # visit subdirectories in sorted order once the files of this directory are yielded
+      stack.extend(reversed(subdirs))
+
+  def parse_shard(shard: str) -> tuple:
+    """Given a shard of the form "i/N", return the pair (i, N) for iter_dir_images().
+
+    :param shard: Shard, where 0 <= i < N.
+    :type shard: string
+    :rtype: (int, int)
+    """
+    try:
+      index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+      raise ValueError(f"{shard} is an invalid shard. Expected the form i/N.") from None
+    if count < 1 or not 0 <= index < count:
+      raise ValueError(f"{shard} is an invalid shard. Expected 0 <= i < N.")
+    return index, count
+
+  def is_image_fname(fname: str) -> bool:
+    """Boolean function to determine if a filename has a supported image extension, regardless of case.
+
+    :param fname: Path to file.
+    :type fname: string
+    :rtype: boolean
+    """
+    return os.path.splitext(fname)[1][1:].lower() in image_extensions
+
+  def is_video_fname(fname: str) -> bool:
+    """Boolean function to determine if a filename has a supported video extension, regardless of case.
+
+    :param fname: Path to file.
+    :type fname: string
+    :rtype: boolean
+    """
+    return os.path.splitext(fname)[1][1:].lower() in video_extensions
+
   def get_cv2_image(fname: str):
     """Given path to an image file, return the said image in the form of an numpy ndarray using openCV.
 
@@ -205,13 +456,14 @@ class Tools:
 
     :param img: Image in the form of an ndarray.
     :type img: numpy.ndarray or mxnet.ndarray.ndarray.NDArray
-    :param path: Path to save image to.
+    :param path: Path to save image to. The directory it is in must already exist.
     :type path: string
     :rtype: void
     """
-    Tools.verify_exists(path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    cv2.imwrite(path, img)
+    Tools.verify_exists(os.path.dirname(path) or ".")
+    with Instrument.stage("write"):
+      img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+      cv2.imwrite(path, img)
 
   def filename_resize_image(fname: str, height, width):
     Tools.verify_exists(fname)
@@ -221,6 +473,35 @@ class Tools:
   def resize_image(img: numpy.array, height, width):
     return cv2.resize(img, (width, height))
     
+  # Boolean function to determine if a relative path matches any of a list of glob patterns. Patterns without a
+  # "/" are also matched against the file name alone.
+  def _matches(rel_path: str, patterns: list) -> bool:
+    name = rel_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(rel_path, pattern) or ("/" not in pattern and fnmatch.fnmatch(name, pattern)) for pattern in patterns)
+
+  # Get the (height, width) of a JPEG image from the frame header of its encoded bytes, without decoding it,
+  # or None if the bytes are not a JPEG image.
+  def _get_jpeg_size(data: bytes):
+    data = memoryview(data)
+    if data[:2] != b"\xff\xd8":
+      return None
+    i = 2
+    while i + 9 < len(data):
+      if data[i] != 0xFF:
+        return None
+      marker = data[i + 1]
+      if marker == 0xFF:
+        i += 1
+        continue
+      if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+        i += 2
+        continue
+      # start of frame markers, leaving out those for huffman tables, arithmetic coding conditioning and restart intervals
+      if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+        return (data[i + 5] << 8 | data[i + 6], data[i + 7] << 8 | data[i + 8])
+      i += 2 + (data[i + 2] << 8 | data[i + 3])
+    return None
+
   def _exists(fname: str) -> bool:
     if os.path.exists(fname):
       return True